@@ -0,0 +1,143 @@
+"""
+Benchmarks of the point functions getM, getF and jac, and of their vectorized counterparts,
+on the two cylinders of the README, on collections of a growing number of Box magnets, rings and matrices,
+with and without a SourceTree, and on the magforce sources
+
+classes follow the asv conventions (params, setup, time_* methods) and are run by benchmarks/run.py
+"""
+from numpy import linspace, pi, stack, zeros_like, meshgrid, full, random
+from magpylib import Collection
+from magpylib.source.magnet import Box, Cylinder
+
+from magforce import getM, getF, jac, getB_batch, gradB_batch, getF_batch, SourceTree, Dipole, Sphere, Circular, \
+    Coil
+
+
+SAMPLE = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+
+def ring(magnets):
+    """
+    Collection of Box magnets, as many as magnets, on a ring of radius 30 mm around the z axis
+    """
+    angles = linspace(0, 360, magnets, endpoint=False)
+    boxes = []
+    for angle in angles:
+        box = Box(mag=[0, 0, 1000], dim=[5, 5, 10], pos=[30, 0, 0])
+        box.rotate(angle, [0, 0, 1], anchor=[0, 0, 0])
+        boxes.append(box)
+
+    return Collection(*boxes)
+
+
+def matrix(magnets):
+    """
+    Collection of 2 mm cube magnets, as many as magnets, on a square grid of pitch 3 mm in the z = 0 plane
+    magnetized as a Halbach array along x
+    """
+    side = int(magnets ** 0.5)
+    magnetizations = [[0, 0, 1000], [1000, 0, 0], [0, 0, -1000], [-1000, 0, 0]]
+
+    return Collection(*[Box(mag=magnetizations[i % 4], dim=[2, 2, 2], pos=[3 * i, 3 * j, 0])
+                        for i in range(side) for j in range(side)])
+
+
+class TimePoint:
+    """
+    getM, getF and jac on a single point
+    """
+    params = [1, 8, 64]
+    param_names = ['magnets']
+
+    def setup(self, magnets):
+        self.collection = ring(magnets)
+        self.point = (1, 2, 3)
+
+    def time_getM(self, magnets):
+        getM(self.point, self.collection, SAMPLE)
+
+    def time_getF(self, magnets):
+        getF(self.point, self.collection, SAMPLE)
+
+    def time_jac(self, magnets):
+        jac(self.collection.getB, *self.point)
+
+
+class TimeCylinders:
+    """
+    getF on a single point of the two cylinders of the README, with numeric and analytic gradients
+    """
+    params = ['numeric', 'analytic']
+    param_names = ['gradient']
+
+    def setup(self, gradient):
+        self.collection = Collection(Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20]),
+                                     Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, 20]))
+        self.point = (0, 0, 1)
+
+    def time_getF(self, gradient):
+        getF(self.point, self.collection, SAMPLE, gradient)
+
+
+class TimeBatch:
+    """
+    getF_batch on 1000 points along z, with numeric and analytic gradients
+    """
+    params = [[1, 8, 64], ['numeric', 'analytic']]
+    param_names = ['magnets', 'gradient']
+
+    def setup(self, magnets, gradient):
+        self.collection = ring(magnets)
+        zs = linspace(-5, 5, 1000)
+        self.points = stack((zeros_like(zs) + 1, zeros_like(zs), zs), axis=1)
+
+    def time_getF_batch(self, magnets, gradient):
+        getF_batch(self.points, self.collection, SAMPLE, gradient)
+
+
+class TimeMatrix:
+    """
+    getF_batch with analytic gradients on 1000 points 3 mm above a matrix of magnets, exact (theta None)
+    and inside a SourceTree of opening angle theta
+    """
+    params = [[64, 256, 1024], [None, 0.3]]
+    param_names = ['magnets', 'theta']
+
+    def setup(self, magnets, theta):
+        self.collection = matrix(magnets)
+        side = 3 * int(magnets ** 0.5)
+        xs, ys = meshgrid(linspace(0.5, side - 0.5, 40), linspace(0.5, side - 0.5, 25))
+        self.points = stack((xs.ravel(), ys.ravel(), full(xs.size, 3.)), axis=1)
+
+        # tree built once, as in a map evaluated chunk after chunk
+        self.tree = None if theta is None else SourceTree(theta)
+        if self.tree is not None:
+            self.tree.tree(self.collection.sources)
+
+    def time_getF_batch(self, magnets, theta):
+        if self.tree is None:
+            getF_batch(self.points, self.collection, SAMPLE, 'analytic')
+        else:
+            with self.tree:
+                getF_batch(self.points, self.collection, SAMPLE, 'analytic')
+
+
+class TimeSources:
+    """
+    getB_batch and gradB_batch of one magforce source, rotated, on a million points around it
+    """
+    params = ['dipole', 'sphere', 'circular', 'coil']
+    param_names = ['source']
+
+    def setup(self, source):
+        self.source = {'dipole': Dipole(moment=[0, 0, 1e6], angle=30, axis=[1, 0, 0]),
+                       'sphere': Sphere(mag=[0, 0, 1000], dim=4, angle=30, axis=[1, 0, 0]),
+                       'circular': Circular(curr=100, dim=10, angle=30, axis=[1, 0, 0]),
+                       'coil': Coil(curr=1, turns=500, inner=5, outer=10, length=20, angle=30, axis=[1, 0, 0])}[source]
+        self.points = random.default_rng(0).uniform(-20, 20, (1000000, 3))
+
+    def time_getB_batch(self, source):
+        getB_batch(self.points, self.source)
+
+    def time_gradB_batch(self, source):
+        gradB_batch(self.points, self.source)
@@ -0,0 +1,76 @@
+"""
+Benchmarks of the compute phase of the plot functions, B and F of the collections of the README example
+on lines, planes and volumes of growing resolution, without matplotlib
+
+plot_1D_along_* run compute_line, plot_2D_plane_* compute_plane and plot_3D compute_volume
+classes follow the asv conventions (params, setup, time_* methods) and are run by benchmarks/run.py
+"""
+from numpy import linspace, pi
+from magpylib import Collection
+from magpylib.source.magnet import Cylinder
+
+from magforce import compute_line, compute_plane, compute_volume
+
+
+SAMPLE = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+
+def collections():
+    """
+    Two cylinders on the z axis and their collection, as in the README example
+    """
+    m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+    m2 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, 20])
+
+    return {'z-20': m1, 'z+20': m2, 'both': Collection(m1, m2)}
+
+
+class TimeLine:
+    """
+    compute phase of plot_1D_along_x, y and z, resolution points on the line
+    """
+    params = [['x', 'y', 'z'], [100, 1000, 10000]]
+    param_names = ['axis', 'resolution']
+
+    def setup(self, axis, resolution):
+        self.collections = collections()
+        self.values = linspace(-5, 5, resolution)
+
+    def time_compute_line(self, axis, resolution):
+        compute_line(axis, self.values, (0, 0, 0), self.collections, SAMPLE)
+
+
+class TimePlane:
+    """
+    compute phase of plot_2D_plane_x, y and z, resolution x resolution points on the plane
+    """
+    params = [['x', 'y', 'z'], [10, 30, 100]]
+    param_names = ['axis', 'resolution']
+
+    def setup(self, axis, resolution):
+        self.collections = collections()
+        self.values = linspace(-5, 5, resolution)
+
+    def time_compute_plane(self, axis, resolution):
+        compute_plane(axis, 1, self.values, self.values, self.collections, SAMPLE)
+
+    def time_compute_plane_grid(self, axis, resolution):
+        compute_plane(axis, 1, self.values, self.values, self.collections, SAMPLE, grid=True)
+
+
+class TimeVolume:
+    """
+    compute phase of plot_3D, resolution ** 3 points in the volume
+    """
+    params = [5, 10, 20]
+    param_names = ['resolution']
+
+    def setup(self, resolution):
+        self.collections = collections()
+        self.values = linspace(-5, 5, resolution)
+
+    def time_compute_volume(self, resolution):
+        compute_volume(self.values, self.values, self.values, self.collections, SAMPLE)
+
+    def time_compute_volume_grid(self, resolution):
+        compute_volume(self.values, self.values, self.values, self.collections, SAMPLE, grid=True)
@@ -0,0 +1,48 @@
+"""
+Benchmarks of the CSV export of the plot functions (CSVWriter) and of reading those files back with numpy
+
+classes follow the asv conventions (params, setup, teardown, time_* methods) and are run by benchmarks/run.py
+"""
+from os import path
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from numpy import loadtxt
+from numpy.random import default_rng
+
+from magforce import CSVWriter
+
+
+NAMES = ['z-20', 'z+20', 'both']
+
+
+class TimeCSV:
+    """
+    rows points with B and F of three collections, 21 columns
+    """
+    params = [1000, 100000]
+    param_names = ['rows']
+
+    def setup(self, rows):
+        random = default_rng(0)
+        self.positions = random.uniform(-10, 10, (rows, 3))
+        self.B = {name: random.normal(0, 100, (rows, 3)) for name in NAMES}
+        self.F = {name: random.normal(0, 1, (rows, 3)) for name in NAMES}
+
+        self.directory = mkdtemp()
+        self.written = path.join(self.directory, 'written.csv')
+        self.read = path.join(self.directory, 'read.csv')
+        self.export(self.read)
+
+    def teardown(self, rows):
+        rmtree(self.directory, ignore_errors=True)
+
+    def export(self, filename):
+        with CSVWriter(filename, 'Simulation 3D', NAMES, 'BF') as writer:
+            writer.write(self.positions, self.B, self.F)
+
+    def time_export(self, rows):
+        self.export(self.written)
+
+    def time_import(self, rows):
+        loadtxt(self.read, delimiter=';', skiprows=3)
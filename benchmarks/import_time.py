@@ -0,0 +1,61 @@
+"""
+Import time of magforce, measured in fresh python processes
+
+    python benchmarks/import_time.py [repeat]
+
+times 'import magforce' followed by the access of a calculation function and of a plotting function,
+in total and on top of numpy and magpylib, and lists which of the heavy modules were loaded in each case
+'import magforce; magforce.getF' has to load nothing else than numpy and magpylib: the modules it loads besides them
+and magforce's own are listed, and the script exits with an error when there are any
+"""
+from subprocess import run
+from sys import argv, executable, exit
+from json import loads
+
+
+_HEAVY = ['magforce.plotting', 'matplotlib.pyplot', 'mpl_toolkits.mplot3d', 'magforce.parallel', 'multiprocessing',
+          'concurrent.futures']
+
+_SCRIPT = '''
+import sys, json
+from time import perf_counter
+start = perf_counter()
+import numpy, magpylib
+base = perf_counter()
+before = set(sys.modules)
+import magforce
+magforce.{name}
+end = perf_counter()
+extra = sorted(m for m in set(sys.modules) - before if m.split('.')[0] not in ('magforce', 'numpy', 'magpylib'))
+print(json.dumps({{'time': end - start, 'own': end - base, 'loaded': [m for m in {heavy!r} if m in sys.modules],
+                  'extra': extra}}))
+'''
+
+
+def time_import(name, repeat=5):
+    """
+    Best times over repeat fresh processes of importing magforce and accessing magforce.name [s],
+    in total and on top of numpy and magpylib, the heavy modules loaded by it and the modules
+    loaded besides numpy, magpylib and magforce
+    """
+    results = []
+    for _ in range(repeat):
+        output = run([executable, '-W', 'ignore', '-c', _SCRIPT.format(name=name, heavy=_HEAVY)],
+                     capture_output=True, text=True, check=True).stdout
+        results.append(loads(output))
+
+    return (min(result['time'] for result in results), min(result['own'] for result in results),
+            results[0]['loaded'], results[0]['extra'])
+
+
+if __name__ == '__main__':
+    repeat = int(argv[1]) if len(argv) > 1 else 5
+
+    for name in ['getF', 'plot_3D']:
+        elapsed, own, loaded, extra = time_import(name, repeat)
+        print(f"import magforce; magforce.{name:<8} {elapsed * 1000:8.1f} ms ({own * 1000:6.1f} ms without numpy "
+              f"and magpylib)   loaded: {', '.join(loaded) or '-'}")
+
+        if name == 'getF' and extra:
+            print(f"import magforce; magforce.getF should only load numpy and magpylib, also loaded: {', '.join(extra)}")
+            exit(1)
@@ -0,0 +1,152 @@
+"""
+Runs the benchmarks of the bench_*.py modules and stores the timings as JSON
+
+    python benchmarks/run.py [--filter text] [--repeat n] [--output file.json] [--compare previous.json]
+
+each time_* method of the Time* classes is timed for every combination of the class params, after its setup,
+keeping the best time per call over repeat runs. Results go to benchmarks/results/<date>.json by default,
+with the versions of python, numpy and magpylib, the machine and the git commit, so that runs on the same
+hardware can be compared: --compare prints the ratio to a previous file and flags the benchmarks slower
+than --threshold times
+
+the classes follow the asv conventions, so the same modules can also be run with asv
+"""
+from argparse import ArgumentParser
+from datetime import datetime
+from importlib import import_module
+from itertools import product
+from json import dump, load
+from os import listdir, makedirs, path
+from platform import machine, node, processor, python_version
+from subprocess import run
+from sys import path as sys_path
+from timeit import Timer
+
+
+_DIRECTORY = path.dirname(path.abspath(__file__))
+
+
+def _version(package):
+    """
+    Installed version of package, None when it can not be found
+    """
+    try:
+        from importlib.metadata import version
+        return version(package)
+    except Exception:
+        return None
+
+
+def _commit():
+    """
+    Git commit of the repository, None outside of git
+    """
+    try:
+        return run(['git', 'rev-parse', 'HEAD'], cwd=_DIRECTORY, capture_output=True, text=True,
+                   check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _combinations(cls):
+    """
+    Combinations of the params of an asv style class, as tuples of arguments
+    """
+    params = getattr(cls, 'params', None)
+    if params is None:
+        return [()]
+    if len(getattr(cls, 'param_names', [])) == 1:
+        return [(value,) for value in params]
+    return list(product(*params))
+
+
+def benchmarks(text=''):
+    """
+    Yields (name, class, method name, param names, arguments) of the benchmarks whose name contains text
+    """
+    # the benchmark modules, and the magforce of this checkout before an installed one
+    sys_path[:0] = [_DIRECTORY, path.dirname(_DIRECTORY)]
+
+    for filename in sorted(listdir(_DIRECTORY)):
+        if not (filename.startswith('bench_') and filename.endswith('.py')):
+            continue
+        module = import_module(filename[:-3])
+
+        for cls_name in sorted(vars(module)):
+            cls = getattr(module, cls_name)
+            if not (cls_name.startswith('Time') and isinstance(cls, type)):
+                continue
+
+            for method in sorted(name for name in vars(cls) if name.startswith('time_')):
+                name = f'{module.__name__}.{cls_name}.{method}'
+                for arguments in _combinations(cls):
+                    if text in name:
+                        yield name, cls, method, getattr(cls, 'param_names', []), arguments
+
+
+def measure(cls, method, arguments, repeat=3):
+    """
+    Best time of one call of cls().method(*arguments) over repeat runs, setup and teardown being done around them [s]
+    and the number of calls per run
+    """
+    instance = cls()
+    if hasattr(instance, 'setup'):
+        instance.setup(*arguments)
+    try:
+        timer = Timer(lambda: getattr(instance, method)(*arguments))
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=repeat, number=number)) / number
+    finally:
+        if hasattr(instance, 'teardown'):
+            instance.teardown(*arguments)
+
+    return best, number
+
+
+def compare(results, previous, threshold=1.2):
+    """
+    Prints the ratio of each time of results to the one of previous, flagging ratios above threshold
+    """
+    before = {(entry['benchmark'], str(entry['params'])): entry['time'] for entry in previous['results']}
+
+    for entry in results['results']:
+        reference = before.get((entry['benchmark'], str(entry['params'])))
+        if reference is None:
+            continue
+        ratio = entry['time'] / reference
+        flag = '  SLOWER' if ratio > threshold else ''
+        print(f"{entry['benchmark']} {entry['params']}: {reference * 1000:10.3f} ms -> "
+              f"{entry['time'] * 1000:10.3f} ms  x{ratio:.2f}{flag}")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='runs the magforce benchmarks and stores the timings as JSON')
+    parser.add_argument('--filter', default='', help='only benchmarks whose name contains this text')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each benchmark, the best one being kept')
+    parser.add_argument('--output', default=None, help='JSON file of the results')
+    parser.add_argument('--compare', default=None, help='JSON file of previous results to compare to')
+    parser.add_argument('--threshold', type=float, default=1.2, help='ratio above which a benchmark is flagged')
+    options = parser.parse_args()
+
+    date = datetime.now()
+    results = {'date': str(date),
+               'commit': _commit(),
+               'machine': {'node': node(), 'machine': machine(), 'processor': processor()},
+               'versions': {'python': python_version(), 'numpy': _version('numpy'), 'magpylib': _version('magpylib')},
+               'results': []}
+
+    for name, cls, method, param_names, arguments in benchmarks(options.filter):
+        best, number = measure(cls, method, arguments, options.repeat)
+        params = dict(zip(param_names, arguments))
+        results['results'].append({'benchmark': name, 'params': params, 'time': best, 'number': number})
+        print(f'{name} {params}: {best * 1000:.3f} ms')
+
+    output = options.output or path.join(_DIRECTORY, 'results', date.strftime('%Y-%m-%d_%H-%M-%S') + '.json')
+    makedirs(path.dirname(path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        dump(results, file, indent=2)
+    print(f'results saved in {output}')
+
+    if options.compare is not None:
+        with open(options.compare) as file:
+            compare(results, load(file), options.threshold)
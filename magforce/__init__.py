@@ -1,6 +1,55 @@
+from sys import version_info
+
 from magforce.calculation import normalize, jac, getM, getF
-from magforce.plotting import plot_1D_along_x, plot_1D_along_y, plot_1D_along_z
-from magforce.plotting import plot_2D_plane_x, plot_2D_plane_y, plot_2D_plane_z
-from magforce.plotting import plot_3D
+from magforce.calculation import getB_batch, jac_batch, gradB_batch, getM_batch, getM_from_B, getF_batch, getF_from_B
+from magforce.calculation import gradB_grid, getF_grid
+from magforce.calculation import getB_collections, getF_collections, getF_grid_collections
+from magforce.calculation import getM_samples_from_B, getF_samples_from_B, getF_samples
+
+# other functions and classes are imported on first use, so that 'import magforce' only loads numpy and magpylib
+# (matplotlib for the plotting functions, multiprocessing and concurrent.futures for the parallel ones)
+_lazy = {'FieldMap': 'fieldmap',
+         'FrozenCollection': 'frozen', 'freeze': 'frozen',
+         'Dipole': 'sources', 'Sphere': 'sources', 'Circular': 'sources', 'Coil': 'sources',
+         'getBF_parallel': 'parallel', 'getF_grid_parallel': 'parallel',
+         'FieldResult': 'compute', 'compute_line': 'compute', 'compute_plane': 'compute',
+         'compute_volume': 'compute', 'compute_volume_chunks': 'compute',
+         'save_result': 'output', 'load_result': 'output', 'CSVWriter': 'output',
+         'DiskCache': 'cache',
+         'FieldMemo': 'memo',
+         'FarField': 'multipole',
+         'SourceTree': 'tree',
+         'profile': 'profiling',
+         'plot_1D_along_x': 'plotting', 'plot_1D_along_y': 'plotting', 'plot_1D_along_z': 'plotting',
+         'plot_2D_plane_x': 'plotting', 'plot_2D_plane_y': 'plotting', 'plot_2D_plane_z': 'plotting',
+         'plot_3D': 'plotting'}
+
+if version_info < (3, 7):
+    # no module __getattr__ before python 3.7
+    from magforce.fieldmap import FieldMap
+    from magforce.frozen import FrozenCollection, freeze
+    from magforce.sources import Dipole, Sphere, Circular, Coil
+    from magforce.parallel import getBF_parallel, getF_grid_parallel
+    from magforce.compute import FieldResult, compute_line, compute_plane, compute_volume, compute_volume_chunks
+    from magforce.output import save_result, load_result, CSVWriter
+    from magforce.cache import DiskCache
+    from magforce.memo import FieldMemo
+    from magforce.multipole import FarField
+    from magforce.tree import SourceTree
+    from magforce.profiling import profile
+    from magforce.plotting import plot_1D_along_x, plot_1D_along_y, plot_1D_along_z
+    from magforce.plotting import plot_2D_plane_x, plot_2D_plane_y, plot_2D_plane_z
+    from magforce.plotting import plot_3D
+
+
+def __getattr__(name):
+    if name in _lazy:
+        from importlib import import_module
+        return getattr(import_module(f'magforce.{_lazy[name]}'), name)
+    raise AttributeError(f"module 'magforce' has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_lazy))
 
-# [GitHub](https://github.com/MateusRodolfo/magforce) for more information on the package
\ No newline at end of file
+# [GitHub](https://github.com/MateusRodolfo/magforce) for more information on the package
@@ -0,0 +1,178 @@
+from hashlib import sha256
+from json import dumps
+from os import listdir, makedirs, path as os_path, replace, utime, walk
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from numpy import ndarray
+
+from magforce.output import save_result, load_result, _describe
+
+
+def _canonical(value):
+    """
+    Value turned into lists, dicts, strings and floats, so that its JSON text does not depend on its python types
+    """
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, ndarray)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, str) or value is None or isinstance(value, bool):
+        return value
+    return float(value)
+
+
+def _size(directory):
+    """
+    Total size of the files of a directory [bytes]
+    """
+    return sum(os_path.getsize(os_path.join(root, name)) for root, _, names in walk(directory) for name in names)
+
+
+class DiskCache:
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Persistent cache of the results of compute_line, compute_plane, compute_volume and of the plot functions,
+    given to them with cache=DiskCache()
+
+    Results are stored in directory, one sub directory per result in the 'npy' format of save_result,
+    named by a hash of everything they depend on: type, magnetization, dimension, position and orientation
+    of each source of each collection, the sample (when F is asked), the points (axes values) and the options
+    Hits are loaded as memory-mapped arrays. When the cache grows over max_size, the results used least recently
+    are removed first
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param directory: str | directory of the cache, by default ~/.cache/magforce
+    :param max_size: float | size of the cache above which results are evicted [MB]
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from tempfile import mkdtemp
+        >>> from numpy import linspace, pi
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magforce.compute import compute_plane
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # the second call is loaded from the cache
+        >>> cache = DiskCache(mkdtemp())
+        >>> collections = {'z-20': Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])}
+        >>> first = compute_plane('x', 0, linspace(-10, 10, 5), linspace(-5, 5, 3), collections, sample, cache=cache)
+        >>> second = compute_plane('x', 0, linspace(-10, 10, 5), linspace(-5, 5, 3), collections, sample, cache=cache)
+        >>> cache.hits, cache.misses, (first.F['z-20'] == second.F['z-20']).all()
+        (1, 1, True)
+
+    # moving the magnet changes the key
+        >>> collections['z-20'].move([0, 0, 1])
+        >>> third = compute_plane('x', 0, linspace(-10, 10, 5), linspace(-5, 5, 3), collections, sample, cache=cache)
+        >>> cache.hits, cache.misses
+        (1, 2)
+    """
+
+    def __init__(self, directory=None, max_size=1024):
+        if directory is None:
+            directory = os_path.join(os_path.expanduser('~'), '.cache', 'magforce')
+
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        makedirs(directory, exist_ok=True)
+
+    def key(self, kind, collections, sample, **parameters):
+        """
+        Hash of a computation: kind ('line', 'plane' or 'volume'), sources of the collections, sample when F is asked
+        and the other parameters of the computation (points, BF, options)
+
+        :return: str
+        """
+        F = 'F' in parameters.get('BF', 'BF').upper()
+
+        description = {'kind': kind,
+                       'collections': [[name, _describe(collection)] for name, collection in collections.items()],
+                       'sample': sample if F else None,
+                       'parameters': parameters}
+
+        return sha256(dumps(_canonical(description), sort_keys=True).encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Loads the result of key, memory-mapped, or returns None when it is not in the cache
+
+        :param key: str
+        :return: FieldResult
+        """
+        entry = os_path.join(self.directory, key)
+
+        if not os_path.isdir(entry):
+            self.misses += 1
+            return None
+
+        result = load_result(entry, format='npy', mmap=True)
+        utime(entry)                                        # last use, for the eviction
+        self.hits += 1
+
+        return result
+
+    def put(self, key, result, collections=None, sample=None):
+        """
+        Stores the result of key, then evicts the results used least recently while the cache is over max_size
+
+        :param key: str
+        :param result: FieldResult
+        :param collections: dict | collections of the result, kept as provenance
+        :param sample: dict | sample of the result, kept as provenance
+        """
+        entry = os_path.join(self.directory, key)
+
+        # written aside then renamed, so that an entry is always complete
+        temporary = mkdtemp(dir=self.directory, prefix='.')
+        save_result(result, temporary, format='npy', collections=collections, sample=sample)
+        try:
+            replace(temporary, entry)
+        except OSError:
+            rmtree(temporary, ignore_errors=True)           # written meanwhile by another process
+
+        self._evict()
+
+    def _evict(self):
+        """
+        Removes the results used least recently while the cache is over max_size
+        """
+        entries = []
+        for name in listdir(self.directory):
+            entry = os_path.join(self.directory, name)
+            if not name.startswith('.') and os_path.isdir(entry):
+                entries.append((os_path.getmtime(entry), _size(entry), entry))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self.max_size * 1e6:
+                break
+            rmtree(entry, ignore_errors=True)
+            total -= size
+
+    @property
+    def size(self):
+        """
+        Size of the cache [MB]
+        """
+        return _size(self.directory) / 1e6
+
+    def clear(self):
+        """
+        Removes all the results of the cache
+        """
+        for name in listdir(self.directory):
+            rmtree(os_path.join(self.directory, name), ignore_errors=True)
@@ -1,4 +1,14 @@
-from numpy import array, round, zeros, pi, linalg
+from functools import partial
+from warnings import warn
+
+from numpy import array, asarray, round, zeros, ones, tile, einsum, newaxis, concatenate, stack, meshgrid, \
+    gradient, diff, abs, pi, linalg, broadcast_arrays, broadcast_to, where, nan, float64
+from magpylib import Collection
+from magpylib.source.magnet import Box, Cylinder, Sphere
+from magpylib.vector import getBv_magnet
+
+from magforce.kernels import rotation_matrix, gradB_box, gradB_cylinder, _on_cylinder
+from magforce import memo, multipole, profiling, tree
 
 
 def normalize(vector):
@@ -184,7 +194,7 @@ def getM(point, collection, sample):
     return M                                   # returns (Mx, My, Mz) in [A/m]
 
 
-def getF(point, collection, sample):
+def getF(point, collection, sample, gradient='numeric'):
     """
     -----------
     DESCRIPTION
@@ -199,6 +209,7 @@ def getF(point, collection, sample):
     :param point: numpy.array
     :param collection: magpylib.Collection
     :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
+    :param gradient: str | 'numeric' for central differences, 'analytic' for closed form gradients (see gradB_batch)
     :return: numpy.array [N]
 
     -------
@@ -235,13 +246,12 @@ def getF(point, collection, sample):
         >>> getF(point,both,sample)
         array([0.        , 0.        , 0.43570416])
     """
-    x, y, z = point
-
     V = sample['volume']                           # sample volume [m3]
 
-    Mx, My, Mz = getM(point, collection, sample)   # sample magnetization [A/m]
+    dd, B = _jacB([point], collection, gradient)  # jacobian of B field and B field in given point
+    dd = dd[0]
 
-    dd = jac(collection.getB, x, y, z)             # jacobian of B field in given point
+    Mx, My, Mz = getM_from_B(B, sample)[0]         # sample magnetization [A/m]
 
     dUdx = dd[0, 0]
     dUdy = dd[0, 1]
@@ -262,3 +272,1000 @@ def getF(point, collection, sample):
     result = round(array([Fx, Fy, Fz]) * V, 10)
 
     return result                                 # returns (Fx, Fy, Fz) in N
+
+
+# vectorized functions, working on (N,3) arrays of points
+
+_DELTA = 0.0000001                                   # infinitesimal used by jac_batch
+
+# number of points from which magnets are evaluated with the vectorized magpylib functions: below it, their fixed
+# cost per call (about 1.5 ms for a Cylinder) is higher than evaluating the points one by one with the scalar getB
+# (about 0.1 ms a point), as for the 7 points of the stencil of getF on a single point
+_VECTORIZED = 12
+
+
+def _sources(collection):
+    """
+    Returns the list of sources of a collection, a single source being returned as a list of one element
+    """
+    if isinstance(collection, Collection):
+        return list(collection.sources)
+    else:
+        return [collection]
+
+
+def _getB_source(POS, source):
+    """
+    Gets the field of a single source on (N,3) points POS [mT]
+    """
+    N = len(POS)
+
+    if hasattr(source, 'gradB'):
+        # magforce sources and snapshots, vectorized on their own
+        return source.getB(POS)
+    elif isinstance(source, (Box, Cylinder, Sphere)):
+        if N < _VECTORIZED:
+            return array([source.getB(point) for point in POS]).reshape(N, 3)
+
+        # magnet parameters repeated for every point, as asked by magpylib vector functions
+        MAG = tile(source.magnetization, (N, 1))
+        POSm = tile(source.position, (N, 1))
+        ANG = ones(N) * source.angle
+        AX = tile(source.axis, (N, 1))
+
+        if isinstance(source, Box):
+            return getBv_magnet('box', MAG, tile(source.dimension, (N, 1)), POSm, POS, [ANG], [AX], [POSm])
+        elif isinstance(source, Cylinder):
+            # points on the surface of the magnet, NaN like with its own getB, are evaluated at its center instead
+            surface = _on_cylinder((POS - source.position) @ rotation_matrix(source.angle, source.axis),
+                                   source.dimension)
+            if surface.any():
+                warn('Warning: getB Position directly on magnet surface', RuntimeWarning)
+                POS = where(surface[:, newaxis], source.position, POS)
+
+            B = getBv_magnet('cylinder', MAG, tile(source.dimension, (N, 1)), POSm, POS, [ANG], [AX], [POSm],
+                             Nphi0=source.iterDia)
+            B[surface] = nan
+            return B
+        else:
+            return getBv_magnet('sphere', MAG, ones(N) * source.dimension, POSm, POS, [ANG], [AX], [POSm])
+    else:
+        return source.getB(POS)
+
+
+def getB_batch(points, collection):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the magnetic field of a collection of magnets on N points at once
+    Box, Cylinder and Sphere magnets are evaluated with magpylib.vector.getBv_magnet (one point at a time
+    with their own getB for a few points, cheaper then), magforce sources and other sources with their own getB on the whole array of points
+    inside the with statement of a FieldMemo, the field of each source is taken from it when already calculated
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param collection: magpylib.Collection or magpylib source
+    :return: numpy.array (N,3) [mT]
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import array
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magpylib import Collection
+
+    # magnet collection definition
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> m2 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, 20])
+        >>> both = Collection(m1, m2)
+
+    # calculation
+        >>> getB_batch(array([(0, 0, 1), (0, 0, -1)]), both).round(5)
+        array([[  0.     ,   0.     , 122.31536],
+               [  0.     ,   0.     , 122.31536]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)   # observer positions [mm]
+
+    B = zeros((len(POS), 3))
+
+    # evaluation of a source, counted and timed inside a profile, from its dipole far from it inside a FarField
+    evaluate = _getB_source if profiling._active is None else partial(profiling._active.evaluate, _getB_source)
+    if multipole._active is not None:
+        evaluate = partial(multipole._active.getB, evaluate=evaluate)
+    if memo._active is not None:
+        mode = None if multipole._active is None else ('far', multipole._active.error)
+        evaluate = partial(memo._active.getB, evaluate=evaluate, mode=mode)
+
+    if tree._active is not None:
+        # groups of magnets far from the points by their expansion inside a SourceTree
+        return tree._active.getB(POS, _sources(collection), evaluate)
+
+    for source in _sources(collection):
+        B += evaluate(POS, source)
+
+    return B                                   # returns (N,3) array of (Bx, By, Bz) in [mT]
+
+
+def jac_batch(foo, points):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    From N points and a vectorized function returns a (N,3,3) array of jacobian matrices of that function on those points
+    together with the function values on the points themselves
+    works like jac, with 6 auxiliar points per point, in x,y,z +- infinitesimal, but all the 7*N points
+    (the N centers followed by the 6 auxiliar points of each center) are evaluated with a single call to foo
+    function foo takes as argument a (N,3) array of points and returns a (N,3) array
+
+    jac_batch uses central difference derivatives
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param foo: function | takes (N,3) array and returns (N,3) array
+    :param points: numpy.array (N,3)
+    :return: tuple | (N,3,3) array, one jacobian for each point like
+                        [[dUdx, dUdy, dUdz]
+                        [dVdx, dVdy, dVdz]
+                        [dWdx, dWdy, dWdz]]
+                     and (N,3) array of foo evaluated on the points
+
+    -------
+    EXAMPLE
+    -------
+
+    >>> from numpy import array, stack
+
+    >>> def foo(points):
+    ...     x, y, z = points[:, 0], points[:, 1], points[:, 2]
+    ...     u = x*y*z
+    ...     v = y**2 - x**2
+    ...     w = z**2 - x*y
+    ...     return stack((u, v, w), axis=1)
+    ...
+
+    >>> dd, f = jac_batch(foo, array([(1, -2, 3), (0, 0, 1)]))
+
+    >>> dd
+    array([[[-6.,  3., -2.],
+            [-2., -4.,  0.],
+            [ 2., -1.,  6.]],
+    <BLANKLINE>
+           [[ 0.,  0.,  0.],
+            [ 0.,  0.,  0.],
+            [ 0.,  0.,  2.]]])
+
+    >>> f
+    array([[-6.,  3., 11.],
+           [ 0.,  0.,  1.]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+
+    f = asarray(foo(_stencil(POS)))                 # one single evaluation of foo
+
+    return _central_difference(f, len(POS))
+
+
+def _stencil(POS):
+    """
+    Gets the 7*N points used by jac_batch: center, x - delta, x + delta, y - delta, y + delta, z - delta, z + delta
+    grouped by offset
+    """
+    offsets = zeros((7, 3))
+    for j in range(3):
+        offsets[1 + 2*j, j] = -_DELTA
+        offsets[2 + 2*j, j] = _DELTA
+
+    return (offsets[:, newaxis, :] + POS).reshape(7 * len(POS), 3)
+
+
+def _central_difference(f, N):
+    """
+    Gets the (N,3,3) jacobian and the (N,3) center values from the (7*N,3) values of a function on the _stencil points
+    """
+    f = f.reshape(7, N, 3)
+
+    # derivative using central difference formula
+
+    double_delta = 2 * _DELTA
+
+    dd = (f[2::2] - f[1::2]) / double_delta         # (3,N,3) like [j, n, i] for dIdj
+    dd = dd.transpose(1, 2, 0)                       # (N,3,3) like [n, i, j]
+
+    dd = round(dd, 5)                                # rounding result
+
+    return dd, f[0]
+
+
+def gradB_batch(points, collection):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the jacobian of the magnetic field of a collection of magnets on N points, together with the field itself
+    Box and axially magnetized Cylinder magnets use the closed form gradients of magforce.kernels,
+    magforce sources (Dipole, Sphere, Circular, Coil) and FrozenCollection their own gradB,
+    other sources fall back to central differences with jac_batch
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param collection: magpylib.Collection or magpylib source
+    :return: tuple | (N,3,3) array of jacobians [mT/mm] like jac_batch and (N,3) array of B [mT]
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import array
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magpylib import Collection
+
+    # magnet collection definition
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> m2 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, 20])
+        >>> both = Collection(m1, m2)
+
+    # calculation
+        >>> dd, B = gradB_batch(array([(0, 0, 1)]), both)
+        >>> dd.round(5)
+        array([[[-2.78292,  0.     ,  0.     ],
+                [ 0.     , -2.78292,  0.     ],
+                [ 0.     ,  0.     ,  5.56584]]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+
+    dd = zeros((len(POS), 3, 3))
+    B = zeros((len(POS), 3))
+
+    # evaluation of a source, counted and timed inside a profile, from its dipole far from it inside a FarField
+    evaluate = _gradB_source if profiling._active is None else partial(profiling._active.evaluate, _gradB_source)
+    if multipole._active is not None:
+        evaluate = partial(multipole._active.gradB, evaluate=evaluate)
+
+    if tree._active is not None:
+        # groups of magnets far from the points by their expansion inside a SourceTree
+        return tree._active.gradB(POS, _sources(collection), evaluate)
+
+    for source in _sources(collection):
+        dd_source, B_source = evaluate(POS, source)
+        dd += dd_source
+        B += B_source
+
+    return dd, B
+
+
+def _gradB_source(POS, source):
+    """
+    Gets the jacobian [mT/mm] and the field [mT] of a single source on (N,3) points POS, like gradB_batch
+    """
+    if hasattr(source, 'gradB'):
+        # magforce sources and snapshots, with their own closed form jacobian
+        return source.gradB(POS)
+
+    axial = isinstance(source, Cylinder) and source.magnetization[0] == 0 and source.magnetization[1] == 0
+
+    if isinstance(source, Box) or axial:
+        B_source = getB_batch(POS, source)
+
+        # points and field in the coordinate system of the source
+        R = rotation_matrix(source.angle, source.axis)
+        POS_local = (POS - source.position) @ R
+        B_local = B_source @ R
+
+        if isinstance(source, Box):
+            dd_local = gradB_box(POS_local, source.magnetization, source.dimension)
+        else:
+            dd_local = gradB_cylinder(POS_local, source.magnetization, source.dimension, B_local)
+
+        return R @ dd_local @ R.T, B_source    # back to the global coordinate system
+    else:
+        return jac_batch(lambda P: getB_batch(P, source), POS)
+
+
+def _jacB(points, collection, gradient):
+    """
+    Gets the jacobian of B and B on (N,3) points with the gradient method asked by the user, 'numeric' or 'analytic'
+    """
+    if gradient == 'numeric':
+        return jac_batch(lambda P: getB_batch(P, collection), points)
+    elif gradient == 'analytic':
+        return gradB_batch(points, collection)
+    else:
+        raise ValueError(f"gradient must be 'numeric' or 'analytic', not {gradient!r}")
+
+
+def getM_batch(points, collection, sample):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the magnetization of a sample if it would to be put on each of N points around a collection of magnets
+    vectorized version of getM
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param collection: magpylib.Collection
+    :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
+    :return: numpy.array (N,3) [A/m]
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import array, pi
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magpylib import Collection
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # magnet collection definition
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> m2 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, 20])
+        >>> both = Collection(m1, m2)
+
+    # calculation
+        >>> getM_batch(array([(0, 0, 1), (0, 0, 15)]), both, sample).round(2)
+        array([[      0.  ,       0.  ,  292006.42],
+               [      0.  ,       0.  , 1400000.  ]])
+    """
+    B = getB_batch(points, collection)         # sample field in [mT]
+
+    return getM_from_B(B, sample)              # returns (N,3) array of (Mx, My, Mz) in [A/m]
+
+
+def getM_from_B(B, sample):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the magnetization of a sample from the magnetic field B it is put into
+    used by getM_batch and getF_batch once B is known, so that it is not evaluated again
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param B: numpy.array (N,3) [mT]
+    :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
+    :return: numpy.array (N,3) [A/m]
+
+    -------
+    EXAMPLE
+    -------
+
+    # sample Definition
+        >>> from numpy import array, pi
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # calculation
+        >>> getM_from_B(array([(0, 0, 122.31536387), (0, 0, 1000)]), sample).round(2)
+        array([[      0.  ,       0.  ,  292006.42],
+               [      0.  ,       0.  , 1400000.  ]])
+    """
+    mu0 = 4*pi*(10**(-7))                      # vacuum permeability in H/m
+
+    n = sample['demagnetizing_factor']         # demagnetizing factor
+    M_saturation = sample['M_saturation']      # Ms in A/m
+
+    B = asarray(B, dtype=float64).reshape(-1, 3) / 1000   # B given in mT, /1000 for T
+
+    H = B / mu0                                # transform B[T] in H[A/m]
+    M = H / n                                  # simplification for getting M out of H in ferromagnetic
+
+    norm = linalg.norm(M, axis=1)              # check which M surpass the saturation
+    saturated = norm > M_saturation
+    M[saturated] = M[saturated] / norm[saturated, newaxis] * M_saturation
+
+    return M                                   # returns (N,3) array of (Mx, My, Mz) in [A/m]
+
+
+def getF_batch(points, collection, sample, gradient='numeric'):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the magnetic force on each of N points xyz given in mm for a ferromagnetic sphere
+    vectorized version of getF
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param collection: magpylib.Collection
+    :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
+    :param gradient: str | 'numeric' for central differences, 'analytic' for closed form gradients (see gradB_batch)
+    :return: numpy.array (N,3) [N]
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import array, pi
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magpylib import Collection
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # magnet collection definition
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> m2 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, 20])
+        >>> both = Collection(m1, m2)
+
+    # calculation
+        >>> getF_batch(array([(0, 0, 1), (0, 0, -1)]), both, sample)
+        array([[ 0.        ,  0.        ,  0.43570416],
+               [ 0.        ,  0.        , -0.43570416]])
+
+    # calculation with closed form gradients
+        >>> getF_batch(array([(0, 0, 1), (0, 0, -1)]), both, sample, gradient='analytic')
+        array([[ 0.       ,  0.       ,  0.4357042],
+               [ 0.       ,  0.       , -0.4357042]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+
+    dd, B = _jacB(POS, collection, gradient)                         # jacobians of B field and B field in given points
+
+    return getF_from_B(B, dd, sample)                                # returns (N,3) array of (Fx, Fy, Fz) in N
+
+
+def getF_from_B(B, dd, sample):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the magnetic force on a ferromagnetic sphere from the magnetic field B it is put into and the jacobian of B
+    used by getF_batch once B and its jacobian are known, so that they are not evaluated again
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param B: numpy.array (N,3) [mT]
+    :param dd: numpy.array (N,3,3) [mT/mm] | jacobians like jac_batch
+    :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
+    :return: numpy.array (N,3) [N]
+
+    -------
+    EXAMPLE
+    -------
+
+    # sample Definition
+        >>> from numpy import array, pi, diag
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # calculation
+        >>> getF_from_B(array([(0, 0, 122.31536387)]), array([diag([-2.78292, -2.78292, 5.56584])]), sample)
+        array([[0.        , 0.        , 0.43570416]])
+    """
+    V = sample['volume']                                             # sample volume [m3]
+
+    M = getM_from_B(B, sample)                                       # sample magnetization [A/m]
+
+    F = einsum('ni,nij->nj', M, asarray(dd, dtype=float64).reshape(-1, 3, 3))   # Fj = Mx * dUdj + My * dVdj + Mz * dWdj
+
+    result = round(F * V, 10)
+
+    return result                                                    # returns (N,3) array of (Fx, Fy, Fz) in N
+
+
+# functions working on regular grids, points given by their x, y, z values
+
+def _halo(values, step):
+    """
+    Returns the values of one grid axis with one more value on each side, step being used for an axis of one value
+    """
+    values = asarray(values, dtype=float64).ravel()
+
+    if len(values) == 1:
+        before, after = step, step
+    else:
+        before, after = values[1] - values[0], values[-1] - values[-2]
+
+    return concatenate(([values[0] - before], values, [values[-1] + after]))
+
+
+def gradB_grid(xs, ys, zs, collection, step=None):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the magnetic field of a collection of magnets and its jacobian on all the points of a grid
+    B is evaluated once on the grid extended by one node on each side (halo), and the jacobian is obtained
+    with numpy.gradient from the neighbouring nodes, shared between points, instead of 6 auxiliar points for each point
+    xs, ys and zs may be a single value (planes and lines), the halo then uses the smallest step of the other axes
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param xs: numpy.array | x values of the grid [mm]
+    :param ys: numpy.array | y values of the grid [mm]
+    :param zs: numpy.array | z values of the grid [mm]
+    :param collection: magpylib.Collection
+    :param step: float | step of the halo of axes of a single value, None for the smallest step of the other axes [mm]
+    :return: tuple | (len(xs),len(ys),len(zs),3,3) array of jacobians [mT/mm] like jac_batch
+                     and (len(xs),len(ys),len(zs),3) array of B [mT]
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import linspace
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magpylib import Collection
+
+    # magnet collection definition
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> m2 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, 20])
+        >>> both = Collection(m1, m2)
+
+    # calculation on the plane x = 0
+        >>> dd, B = gradB_grid([0], linspace(-2, 2, 41), linspace(-2, 2, 41), both)
+        >>> dd.shape, B.shape
+        ((1, 41, 41, 3, 3), (1, 41, 41, 3))
+        >>> dd[0, 20, 30].round(2) + 0
+        array([[-2.78,  0.  ,  0.  ],
+               [ 0.  , -2.78,  0.  ],
+               [ 0.  ,  0.  ,  5.57]])
+    """
+    axes = [asarray(values, dtype=float64).ravel() for values in (xs, ys, zs)]
+
+    # step used around axes of a single value
+    if step is None:
+        steps = [abs(diff(values)).min() for values in axes if len(values) > 1]
+        step = min(steps) if steps else 0.0000001
+
+    axes_halo = [_halo(values, step) for values in axes]
+
+    # B evaluated once on all the nodes, x slowest like plot_3D
+    X, Y, Z = meshgrid(*axes_halo, indexing='ij')
+    nodes = stack((X.ravel(), Y.ravel(), Z.ravel()), axis=1)
+    B_halo = getB_batch(nodes, collection).reshape(X.shape + (3,))
+
+    # dBi/dj with second order differences on neighbouring nodes
+    dd_halo = stack(gradient(B_halo, *axes_halo, axis=(0, 1, 2)), axis=-1)
+
+    core = (slice(1, -1), slice(1, -1), slice(1, -1))
+
+    return dd_halo[core], B_halo[core]
+
+
+def getF_grid(xs, ys, zs, collection, sample):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the magnetic force on a ferromagnetic sphere on all the points of a grid, with the jacobians of gradB_grid
+    costs about one field evaluation per point for 3D grids, and three for planes
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param xs: numpy.array | x values of the grid [mm]
+    :param ys: numpy.array | y values of the grid [mm]
+    :param zs: numpy.array | z values of the grid [mm]
+    :param collection: magpylib.Collection
+    :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
+    :return: numpy.array (len(xs),len(ys),len(zs),3) [N]
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import linspace, pi
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magpylib import Collection
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # magnet collection definition
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> m2 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, 20])
+        >>> both = Collection(m1, m2)
+
+    # calculation on the z axis
+        >>> getF_grid([0], [0], linspace(-1, 1, 21), both, sample)[0, 0, [0, 20]]
+        array([[ 0.        ,  0.        , -0.43578136],
+               [ 0.        ,  0.        ,  0.43578136]])
+    """
+    dd, B = gradB_grid(xs, ys, zs, collection)
+
+    F = getF_from_B(B.reshape(-1, 3), dd.reshape(-1, 3, 3), sample)
+
+    return F.reshape(B.shape)                  # returns (Fx, Fy, Fz) in N on each point of the grid
+
+
+# functions working on several collections at once, sharing magnets
+
+def _superpose(collections, evaluate):
+    """
+    Evaluates each distinct source of a dict of collections once with evaluate(source), which returns an array
+    or a tuple of arrays, and returns {name: sum of the results of the sources of collection name}
+    B and its jacobian being linear in the sources, this gives the results of the collections themselves
+    inside a SourceTree, each collection is evaluated as a whole instead, for its magnets to be grouped
+    """
+    if tree._active is not None:
+        return {name: evaluate(collection) for name, collection in collections.items()}
+
+    # distinct sources, by identity, in order of first appearance
+    distinct = {}
+    for collection in collections.values():
+        for source in _sources(collection):
+            distinct.setdefault(id(source), source)
+
+    results = {key: evaluate(source) for key, source in distinct.items()}
+
+    summed = {}
+    for name, collection in collections.items():
+        contributions = [results[id(source)] for source in _sources(collection)]
+        if not contributions:
+            summed[name] = evaluate(collection)   # empty collection, zeros of the right shape
+        elif isinstance(contributions[0], tuple):
+            summed[name] = tuple(sum(parts) for parts in zip(*contributions))
+        else:
+            summed[name] = sum(contributions)
+
+    return summed
+
+
+def getB_collections(points, collections):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the magnetic field of several collections of magnets on N points, like getB_batch for each of them
+    magnets shared between collections are evaluated only once, the field of each collection being the sum
+    of the fields of its magnets
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param collections: dict | the magnets setups arranged like {'name':magpylib.Collection}
+    :return: dict | {'name': numpy.array (N,3) [mT]}
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import array
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magpylib import Collection
+
+    # magnet collection definition
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> m2 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, 20])
+
+    # calculation, m1 and m2 are evaluated once each
+        >>> B = getB_collections(array([(0, 0, 1)]), {'z-20': m1, 'z+20': m2, 'both': Collection(m1, m2)})
+        >>> B['both'].round(5)
+        array([[  0.     ,   0.     , 122.31536]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+
+    return _superpose(collections, lambda source: getB_batch(POS, source))
+
+
+def getF_collections(points, collections, sample, gradient='numeric', B=None):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the magnetic force on a ferromagnetic sphere on N points for several collections of magnets,
+    like getF_batch for each of them
+    B and its jacobian are evaluated only once for magnets shared between collections and summed for each collection,
+    M and F being computed afterwards from those sums
+    B already calculated on the points, as by getB_collections when both B and F are asked, can be given
+    so that only the points around them needed by the central differences are evaluated
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param collections: dict | the magnets setups arranged like {'name':magpylib.Collection}
+    :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
+    :param gradient: str | 'numeric' for central differences, 'analytic' for closed form gradients (see gradB_batch)
+    :param B: dict | {'name': numpy.array (N,3) [mT]} B of each collection on the points, evaluated if not given
+    :return: dict | {'name': numpy.array (N,3) [N]}
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import array, pi
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magpylib import Collection
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # magnet collection definition
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> m2 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, 20])
+
+    # calculation, m1 and m2 are evaluated once each
+        >>> collections = {'z-20': m1, 'z+20': m2, 'both': Collection(m1, m2)}
+        >>> F = getF_collections(array([(0, 0, 1)]), collections, sample)
+        >>> F['both']
+        array([[0.        , 0.        , 0.43570416]])
+
+    # F reusing B calculated before on the same points
+        >>> B = getB_collections(array([(0, 0, 1)]), collections)
+        >>> getF_collections(array([(0, 0, 1)]), collections, sample, B=B)['both']
+        array([[0.        , 0.        , 0.43570416]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+
+    if gradient == 'numeric':
+        # central differences of the summed fields, to get the same rounding as getF_batch
+        # the center points evaluated apart, so that a FieldMemo can give back B calculated on them before
+        B_center = getB_collections(POS, collections) if B is None else B
+        B_around = getB_collections(_stencil(POS)[len(POS):], collections)
+        fields = {name: _central_difference(concatenate((B_center[name], B_around[name])), len(POS))
+                  for name in collections}
+    else:
+        fields = _superpose(collections, lambda source: _jacB(POS, source, gradient))
+        if B is not None:
+            fields = {name: (dd, B[name]) for name, (dd, _) in fields.items()}
+
+    return {name: getF_from_B(B, dd, sample) for name, (dd, B) in fields.items()}
+
+
+def getF_grid_collections(xs, ys, zs, collections, sample, step=None):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the magnetic force on a ferromagnetic sphere on all the points of a grid for several collections of magnets,
+    like getF_grid for each of them, magnets shared between collections being evaluated only once
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param xs: numpy.array | x values of the grid [mm]
+    :param ys: numpy.array | y values of the grid [mm]
+    :param zs: numpy.array | z values of the grid [mm]
+    :param collections: dict | the magnets setups arranged like {'name':magpylib.Collection}
+    :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
+    :param step: float | step of the halo of axes of a single value (see gradB_grid) [mm]
+    :return: dict | {'name': numpy.array (len(xs),len(ys),len(zs),3) [N]}
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import linspace, pi
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magpylib import Collection
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # magnet collection definition
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> m2 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, 20])
+
+    # calculation on the z axis
+        >>> F = getF_grid_collections([0], [0], linspace(-1, 1, 21), {'z-20': m1, 'both': Collection(m1, m2)}, sample)
+        >>> F['both'][0, 0, [0, 20]]
+        array([[ 0.        ,  0.        , -0.43578136],
+               [ 0.        ,  0.        ,  0.43578136]])
+    """
+    fields = _superpose(collections, lambda source: gradB_grid(xs, ys, zs, source, step))
+
+    F = {}
+    for name, (dd, B) in fields.items():
+        F[name] = getF_from_B(B.reshape(-1, 3), dd.reshape(-1, 3, 3), sample).reshape(B.shape)
+
+    return F
+
+
+# functions working on several samples at once, B and its jacobian being evaluated once
+
+def _samples(samples):
+    """
+    Returns the (S,) arrays of demagnetizing factors, volumes and saturation magnetizations of samples,
+    given as a list of sample dicts or as one sample dict of values and arrays, broadcasted together
+    """
+    keys = ('demagnetizing_factor', 'volume', 'M_saturation')
+
+    if isinstance(samples, dict):
+        values = [asarray(samples[key], dtype=float64).ravel() for key in keys]
+    else:
+        values = [array([sample[key] for sample in samples], dtype=float64) for key in keys]
+
+    return broadcast_arrays(*values)
+
+
+def getM_samples_from_B(B, samples):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the magnetization of S samples from the magnetic field B on N points, like getM_from_B for each sample
+    the saturation is applied to all samples and points at once
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param B: numpy.array (N,3) [mT]
+    :param samples: list | sample dicts with keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m],
+                    or a single dict whose values are arrays of S values (or single values, used for all samples)
+    :return: numpy.array (S,N,3) [A/m]
+
+    -------
+    EXAMPLE
+    -------
+
+    # samples Definition, Co spheres with radius 2, 4 and 8mm
+        >>> from numpy import array, pi
+        >>> samples = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (array([2, 4, 8]) / 1000) ** 3,
+        ...            'M_saturation': 1.400e6}
+
+    # calculation
+        >>> getM_samples_from_B(array([(0, 0, 122.31536387)]), samples).round(2)
+        array([[[     0.  ,      0.  , 292006.42]],
+        <BLANKLINE>
+               [[     0.  ,      0.  , 292006.42]],
+        <BLANKLINE>
+               [[     0.  ,      0.  , 292006.42]]])
+    """
+    mu0 = 4*pi*(10**(-7))                      # vacuum permeability in H/m
+
+    n, V, M_saturation = _samples(samples)     # demagnetizing factors and Ms in A/m
+
+    B = asarray(B, dtype=float64).reshape(-1, 3) / 1000   # B given in mT, /1000 for T
+
+    H = B / mu0                                # transform B[T] in H[A/m]
+    M = H / n[:, newaxis, newaxis]             # (S,N,3), simplification for getting M out of H in ferromagnetic
+
+    norm = linalg.norm(M, axis=2)              # check which M surpass the saturation
+    M_saturation = broadcast_to(M_saturation[:, newaxis], norm.shape)
+    saturated = norm > M_saturation
+    M[saturated] = M[saturated] / norm[saturated, newaxis] * M_saturation[saturated, newaxis]
+
+    return M                                   # returns (S,N,3) array of (Mx, My, Mz) in [A/m]
+
+
+def getF_samples_from_B(B, dd, samples):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the magnetic force on S ferromagnetic spheres from the magnetic field B on N points and the jacobian of B,
+    like getF_from_B for each sample, without evaluating B again
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param B: numpy.array (N,3) [mT]
+    :param dd: numpy.array (N,3,3) [mT/mm] | jacobians like jac_batch
+    :param samples: list | sample dicts, or a single dict of arrays (see getM_samples_from_B)
+    :return: numpy.array (S,N,3) [N]
+
+    -------
+    EXAMPLE
+    -------
+
+    # samples Definition, spheres of radius 4mm, Co and a material saturating at 0.2e6 A/m
+        >>> from numpy import array, pi, diag
+        >>> samples = [{'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6},
+        ...            {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 0.200e6}]
+
+    # calculation
+        >>> getF_samples_from_B(array([(0, 0, 122.31536387)]), array([diag([-2.78292, -2.78292, 5.56584])]), samples)
+        array([[[0.        , 0.        , 0.43570416]],
+        <BLANKLINE>
+               [[0.        , 0.        , 0.29842094]]])
+    """
+    V = _samples(samples)[1]                                         # samples volumes [m3]
+
+    M = getM_samples_from_B(B, samples)                              # samples magnetizations [A/m]
+
+    F = einsum('sni,nij->snj', M, asarray(dd, dtype=float64).reshape(-1, 3, 3))   # Fj = Mx * dUdj + My * dVdj + Mz * dWdj
+
+    result = round(F * V[:, newaxis, newaxis], 10)
+
+    return result                                                    # returns (S,N,3) array of (Fx, Fy, Fz) in N
+
+
+def getF_samples(points, collection, samples, gradient='numeric'):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the magnetic force on S ferromagnetic spheres on each of N points around a collection of magnets,
+    like getF_batch for each sample
+    B and its jacobian are evaluated once for all the samples, which makes sweeps over sample sizes and materials
+    cost no more magnet evaluations than a single sample
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param collection: magpylib.Collection
+    :param samples: list | sample dicts, or a single dict of arrays (see getM_samples_from_B)
+    :param gradient: str | 'numeric' for central differences, 'analytic' for closed form gradients (see gradB_batch)
+    :return: numpy.array (S,N,3) [N]
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import array, pi
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magpylib import Collection
+
+    # samples Definition, Co spheres with radius 2, 4 and 8mm
+        >>> samples = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (array([2, 4, 8]) / 1000) ** 3,
+        ...            'M_saturation': 1.400e6}
+
+    # magnet collection definition
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> m2 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, 20])
+        >>> both = Collection(m1, m2)
+
+    # calculation
+        >>> getF_samples(array([(0, 0, 1), (0, 0, -1)]), both, samples)
+        array([[[ 0.        ,  0.        ,  0.05446302],
+                [ 0.        ,  0.        , -0.05446302]],
+        <BLANKLINE>
+               [[ 0.        ,  0.        ,  0.43570416],
+                [ 0.        ,  0.        , -0.43570416]],
+        <BLANKLINE>
+               [[ 0.        ,  0.        ,  3.48563325],
+                [ 0.        ,  0.        , -3.48563325]]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+
+    dd, B = _jacB(POS, collection, gradient)                         # jacobians of B field and B field in given points
+
+    return getF_samples_from_B(B, dd, samples)                       # returns (S,N,3) array of (Fx, Fy, Fz) in N
@@ -0,0 +1,580 @@
+from numpy import array, asarray, ascontiguousarray, arange, meshgrid, stack, unravel_index, unique, zeros, where, hypot, \
+    round, abs, float64
+from magpylib.source.magnet import Cylinder
+
+from magforce.kernels import rotation_matrix
+from magforce.calculation import getB_collections, getF_collections, getF_grid_collections, _sources
+from magforce.sources import Coil
+from magforce.parallel import getBF_parallel, getF_grid_parallel
+from magforce.profiling import stage
+
+
+_AXES = ('x', 'y', 'z')
+
+
+class FieldResult:
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Results of compute_line, compute_plane or compute_volume: the evaluated points and B and F of each collection,
+    all as contiguous numpy arrays, so that they can be used without matplotlib
+
+    Points are stored as a (N,3) array in the order of the CSV files of the plot functions,
+    and reshape(values) gives them back in the arrangement of the line, plane or volume (attribute shape)
+
+    ----------
+    ATTRIBUTES
+    ----------
+
+    :attr kind: str | 'line', 'plane' or 'volume'
+    :attr axis: str | 'x', 'y' or 'z', direction of the line or normal of the plane, None for a volume
+    :attr axes: dict | {'x': numpy.array, 'y': numpy.array, 'z': numpy.array} values of each coordinate [mm]
+    :attr shape: tuple | arrangement of the points, (N,) for a line, (len(second axis), len(first axis)) for a plane
+                 like matplotlib meshgrid, (len(xs), len(ys), len(zs)) for a volume
+    :attr positions: numpy.array (N,3) [mm]
+    :attr B: dict | {'name': numpy.array (N,3) [mT]}, empty if B was not asked
+    :attr F: dict | {'name': numpy.array (N,3) [N]}, empty if F was not asked
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import linspace, pi
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magforce.compute import compute_plane
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # calculation on a plane x = 0
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> result = compute_plane('x', 0, linspace(-10, 10, 5), linspace(-5, 5, 3), {'z-20': m1}, sample)
+        >>> result.shape, result.positions.shape, result.F['z-20'].shape
+        ((3, 5), (15, 3), (15, 3))
+
+    # Fz along z for y = 0
+        >>> result.reshape(result.F['z-20'])[:, 2, 2].round(5)
+        array([-5.11731, -0.42275, -0.06426])
+    """
+
+    def __init__(self, kind, axis, axes, shape, positions, B, F):
+        self.kind = kind
+        self.axis = axis
+        self.axes = axes
+        self.shape = shape
+        self.positions = ascontiguousarray(positions)
+        self.B = {name: ascontiguousarray(values) for name, values in B.items()}
+        self.F = {name: ascontiguousarray(values) for name, values in F.items()}
+
+    def reshape(self, values):
+        """
+        Gives (N,3) values, like positions or B and F of a collection, the arrangement of the points: shape + (3,)
+
+        :param values: numpy.array (N,3)
+        :return: numpy.array
+        """
+        return asarray(values).reshape(self.shape + (3,))
+
+
+def _symmetry_axis(collections):
+    """
+    Gets (x, y) of the line parallel to z that all sources of collections have as axis, when they are all Cylinder
+    magnetized along their axis, None otherwise: B and F are then the same on every half plane from that line
+    """
+    center = None
+    for collection in collections.values():
+        for source in _sources(collection):
+            if not isinstance(source, Cylinder) or source.magnetization[0] != 0 or source.magnetization[1] != 0:
+                return None
+            if abs(abs(rotation_matrix(source.angle, source.axis)[2, 2]) - 1) > 1e-12:
+                return None
+            if center is None:
+                center = array(source.position[:2], dtype=float64)
+            elif abs(source.position[:2] - center).max() > 1e-9:
+                return None
+
+    return center
+
+
+def _half_plane(POS, center):
+    """
+    Gets the distinct points (r, z) of the half plane y = center y, x > center x standing for the (N,3) points POS
+    around the axis through center, the index of each point of POS among them and the cosine and sine of its angle
+    """
+    dx, dy = POS[:, 0] - center[0], POS[:, 1] - center[1]
+    r = hypot(dx, dy)
+
+    rz, inverse = unique(stack((round(r, 12), POS[:, 2]), axis=1), axis=0, return_inverse=True)
+    half = stack((center[0] + rz[:, 0], center[1] + zeros(len(rz)), rz[:, 1]), axis=1)
+
+    # points on the axis taken at angle 0
+    on_axis = r == 0
+    r[on_axis] = 1
+    cos, sin = where(on_axis, 1., dx / r), where(on_axis, 0., dy / r)
+
+    return half, inverse.ravel(), cos, sin
+
+
+def _rotate(values, inverse, cos, sin):
+    """
+    Gets (N,3) values on the points from the values on the half plane, rotated by the angle of each point around z
+    """
+    values = values[inverse]
+    x, y = values[:, 0], values[:, 1]
+
+    return stack((cos * x - sin * y, sin * x + cos * y, values[:, 2]), axis=1)
+
+
+def _evaluate(POS, collections, sample, BF, gradient, n_jobs, executor):
+    """
+    Gets the dicts of B and F asked by BF on the (N,3) points POS, on worker processes with n_jobs other than 1
+    or an executor
+    """
+    B_fields, F_fields = {}, {}
+
+    if n_jobs != 1 or executor is not None:
+        with stage(BF):
+            B_fields, F_fields = getBF_parallel(POS, collections, sample, BF, gradient, n_jobs, executor)
+    else:
+        if 'B' in BF:
+            # calculate B in mT
+            with stage('B'):
+                B_fields = getB_collections(POS, collections)
+        if 'F' in BF:
+            # calculate F in N, from B calculated above when there is
+            with stage('F'):
+                F_fields = getF_collections(POS, collections, sample, gradient, B_fields or None)
+
+    return B_fields, F_fields
+
+
+def _fields(POS, collections, sample, BF, gradient, grid=None, n_jobs=1, executor=None, axisymmetric=False):
+    """
+    Gets the dicts of B and F asked by BF on the (N,3) points POS, magnets shared between collections being evaluated once
+    grid is None, or a function getting F on the (N,3) points from getF_grid_collections when F is taken from a grid
+    with n_jobs other than 1 or an executor, points are evaluated on worker processes (see getBF_parallel)
+    for axisymmetric collections, when axisymmetric is None or True, B and F are evaluated once for each distinct (r, z)
+    of the points and rotated back on them
+    """
+    # pass BF to uppercase to avoid BF='bf' not returning anything
+    BF = BF.upper()
+
+    # quantities evaluated on the points, F being taken from the grid otherwise
+    BF_points = BF if grid is None else BF.replace('F', '')
+
+    center = None if axisymmetric is False else _symmetry_axis(collections)
+    if axisymmetric and center is None:
+        raise ValueError('axisymmetric=True needs Cylinder magnets magnetized along their axis, on one axis parallel to z')
+
+    B_fields, F_fields = {}, {}
+
+    if BF_points and center is not None:
+        # evaluate on the half plane, each distinct (r, z) once
+        with stage('points'):
+            half, inverse, cos, sin = _half_plane(POS, center)
+
+        B_half, F_half = _evaluate(half, collections, sample, BF_points, gradient, n_jobs, executor)
+
+        with stage('points'):
+            B_fields = {name: _rotate(B, inverse, cos, sin) for name, B in B_half.items()}
+            F_fields = {name: _rotate(F, inverse, cos, sin) for name, F in F_half.items()}
+    elif BF_points:
+        B_fields, F_fields = _evaluate(POS, collections, sample, BF_points, gradient, n_jobs, executor)
+
+    if grid is not None and 'F' in BF:
+        # calculate F in N from B on the grid
+        with stage('F'):
+            F_fields = grid(collections, sample, n_jobs, executor)
+
+    return B_fields, F_fields
+
+
+def _cached(cache, kind, collections, sample, parameters, compute):
+    """
+    Loads the result of a computation from cache, or computes it with compute() and stores it there
+    parameters holds everything the result depends on besides the collections and the sample
+    """
+    key = cache.key(kind, collections, sample, **parameters)
+
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.put(key, result, collections, sample)
+
+    return result
+
+
+def _F_grid(xs, ys, zs, collections, sample, n_jobs, executor):
+    """
+    F of all collections on a grid, on worker processes with n_jobs other than 1 or an executor
+    """
+    if n_jobs != 1 or executor is not None:
+        return getF_grid_parallel(xs, ys, zs, collections, sample, n_jobs, executor)
+
+    return getF_grid_collections(xs, ys, zs, collections, sample)
+
+
+@stage('compute')
+def compute_line(axis='x', values=array([]), position=(0, 0, 0), collections={}, sample={}, BF='BF', gradient='numeric',
+                 axisymmetric=False, n_jobs=1, executor=None, cache=None):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Calculates B and F generated by collections of magnets into a ferromagnetic sample along a line of direction x, y or z
+    the computation behind plot_1D_along_x, plot_1D_along_y and plot_1D_along_z
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param axis: str | 'x', 'y' or 'z', direction of the line
+    :param values: numpy.array | values along axis where the variables are evaluated [mm]
+    :param position: tuple | (x, y, z) of a point of the line, its coordinate along axis being ignored [mm]
+    :param collections: dict | the magnets setup to be studied arranged like {'name':magpylib.Collection}
+    :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
+    :param BF: str | 'B' to calculate B; 'F' to calculate F; 'BF' for both
+    :param gradient: str | 'numeric' for central differences, 'analytic' for closed form gradients (see gradB_batch)
+    :param axisymmetric: bool | False to evaluate every point, None to evaluate B and F once for each distinct (r, z)
+                         of the points and rotate them back when all magnets are Cylinder magnetized along one axis
+                         parallel to z, True to require it. F then differs slightly from evaluating every point
+                         (about 1e-6 N), its central differences being taken on the half plane
+    :param n_jobs: int | number of worker processes, 1 to evaluate in this process, -1 for all the cores (see getBF_parallel)
+    :param executor: concurrent.futures.Executor | executor to evaluate the points with, instead of n_jobs
+    :param cache: DiskCache | cache to load the result from, or to store it in when it is not there yet
+    :return: FieldResult
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import linspace, pi
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magpylib import Collection
+        >>> from magforce.compute import compute_line
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # magnet collection definition
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> m2 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, 20])
+
+    # calculation along z, for x = y = 0
+        >>> result = compute_line('z', linspace(-1, 1, 3), (0, 0, 0), {'both': Collection(m1, m2)}, sample)
+        >>> result.positions
+        array([[ 0.,  0., -1.],
+               [ 0.,  0.,  0.],
+               [ 0.,  0.,  1.]])
+        >>> result.F['both']
+        array([[ 0.        ,  0.        , -0.43570416],
+               [ 0.        ,  0.        ,  0.        ],
+               [ 0.        ,  0.        ,  0.43570416]])
+    """
+    if cache is not None:
+        parameters = dict(axis=axis, values=values, position=position, BF=BF, gradient=gradient,
+                          axisymmetric=axisymmetric)
+        return _cached(cache, 'line', collections, sample, parameters,
+                       lambda: compute_line(axis, values, position, collections, sample, BF, gradient, axisymmetric,
+                                            n_jobs, executor))
+
+    i = _AXES.index(axis)
+    values = asarray(values, dtype=float64).ravel()
+
+    # generate points for B and F calculation
+    with stage('points'):
+        POS = array([position] * len(values), dtype=float64).reshape(-1, 3)
+        POS[:, i] = values
+
+    axes = {name: array([float(position[j])]) for j, name in enumerate(_AXES)}
+    axes[axis] = values
+
+    B_fields, F_fields = _fields(POS, collections, sample, BF, gradient, None, n_jobs, executor, axisymmetric)
+
+    return FieldResult('line', axis, axes, (len(values),), POS, B_fields, F_fields)
+
+
+@stage('compute')
+def compute_plane(axis='z', value=0, us=array([]), vs=array([]), collections={}, sample={}, BF='BF', grid=False,
+                  gradient='numeric', axisymmetric=False, n_jobs=1, executor=None, cache=None):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Calculates B and F generated by collections of magnets into a ferromagnetic sample on a plane x, y or z
+    the computation behind plot_2D_plane_x, plot_2D_plane_y and plot_2D_plane_z
+
+    Points are ordered with us varying fastest, like the CSV files of the plot functions,
+    for shape (len(vs), len(us))
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param axis: str | 'x', 'y' or 'z', normal of the plane
+    :param value: float | coordinate of the plane along axis [mm]
+    :param us: numpy.array | values of the first axis of the plane: y for a plane x, x for planes y and z [mm]
+    :param vs: numpy.array | values of the second axis of the plane: z for planes x and y, y for a plane z [mm]
+    :param collections: dict | the magnets setup to be studied arranged like {'name':magpylib.Collection}
+    :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
+    :param BF: str | 'B' to calculate B; 'F' to calculate F; 'BF' for both
+    :param grid: bool | True to get F from B evaluated once on the grid (and one node around it) with numpy.gradient,
+                 instead of 6 auxiliar points around each point
+    :param gradient: str | 'numeric' or 'analytic' (see gradB_batch), when grid is False
+    :param axisymmetric: bool | False to evaluate every point, None to evaluate B (and F when grid is False) once
+                         for each distinct (r, z) of the points and rotate them back when all magnets are Cylinder
+                         magnetized along one axis parallel to z, True to require it. F then differs slightly from
+                         evaluating every point (about 1e-6 N), its central differences being taken on the half plane
+    :param n_jobs: int | number of worker processes, 1 to evaluate in this process, -1 for all the cores (see getBF_parallel)
+    :param executor: concurrent.futures.Executor | executor to evaluate the points with, instead of n_jobs
+    :param cache: DiskCache | cache to load the result from, or to store it in when it is not there yet
+    :return: FieldResult
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import linspace, pi
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magforce.compute import compute_plane
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # calculation of B on a plane z = 1
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> result = compute_plane('z', 1, linspace(-5, 5, 3), linspace(-5, 5, 3), {'z-20': m1}, sample, BF='B')
+        >>> result.positions[:4]
+        array([[-5., -5.,  1.],
+               [ 0., -5.,  1.],
+               [ 5., -5.,  1.],
+               [-5.,  0.,  1.]])
+        >>> result.F
+        {}
+    """
+    if cache is not None:
+        parameters = dict(axis=axis, value=value, us=us, vs=vs, BF=BF, grid=grid, gradient=gradient,
+                          axisymmetric=axisymmetric)
+        return _cached(cache, 'plane', collections, sample, parameters,
+                       lambda: compute_plane(axis, value, us, vs, collections, sample, BF, grid, gradient, axisymmetric,
+                                             n_jobs, executor))
+
+    i = _AXES.index(axis)
+    first, second = [name for name in _AXES if name != axis]
+
+    us = asarray(us, dtype=float64).ravel()
+    vs = asarray(vs, dtype=float64).ravel()
+
+    # generate points for B and F calculation, us varying fastest
+    with stage('points'):
+        U, V = meshgrid(us, vs)
+        coordinates = {axis: 0 * U + value, first: U, second: V}
+        POS = stack([coordinates[name].ravel() for name in _AXES], axis=1)
+
+    axes = {axis: array([float(value)]), first: us, second: vs}
+
+    def F_grid(collections, sample, n_jobs, executor):
+        # F on the (x, y, z) grid, axis of a single value taken out and (u, v) transposed to (v, u) like the points
+        F_grids = _F_grid(axes['x'], axes['y'], axes['z'], collections, sample, n_jobs, executor)
+        return {name: F.take(0, axis=i).transpose(1, 0, 2).reshape(-1, 3) for name, F in F_grids.items()}
+
+    B_fields, F_fields = _fields(POS, collections, sample, BF, gradient, F_grid if grid else None, n_jobs, executor,
+                                 axisymmetric)
+
+    return FieldResult('plane', axis, axes, (len(vs), len(us)), POS, B_fields, F_fields)
+
+
+@stage('compute')
+def compute_volume(xs=array([]), ys=array([]), zs=array([]), collections={}, sample={}, BF='BF', grid=False,
+                   gradient='numeric', axisymmetric=False, n_jobs=1, executor=None, cache=None):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Calculates B and F generated by collections of magnets into a ferromagnetic sample on a 3D grid
+    the computation behind plot_3D
+
+    Points are ordered with z varying fastest, for shape (len(xs), len(ys), len(zs))
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param xs: numpy.array | x values of the grid [mm]
+    :param ys: numpy.array | y values of the grid [mm]
+    :param zs: numpy.array | z values of the grid [mm]
+    :param collections: dict | the magnets setup to be studied arranged like {'name':magpylib.Collection}
+    :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
+    :param BF: str | 'B' to calculate B; 'F' to calculate F; 'BF' for both
+    :param grid: bool | True to get F from B evaluated once on the grid (and one node around it) with numpy.gradient,
+                 instead of 6 auxiliar points around each point
+    :param gradient: str | 'numeric' or 'analytic' (see gradB_batch), when grid is False
+    :param axisymmetric: bool | False to evaluate every point, None to evaluate B (and F when grid is False) once
+                         for each distinct (r, z) of the points and rotate them back when all magnets are Cylinder
+                         magnetized along one axis parallel to z, True to require it. F then differs slightly from
+                         evaluating every point (about 1e-6 N), its central differences being taken on the half plane
+    :param n_jobs: int | number of worker processes, 1 to evaluate in this process, -1 for all the cores (see getBF_parallel)
+    :param executor: concurrent.futures.Executor | executor to evaluate the points with, instead of n_jobs
+    :param cache: DiskCache | cache to load the result from, or to store it in when it is not there yet
+    :return: FieldResult
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import linspace, pi
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magforce.compute import compute_volume
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # calculation
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> every = compute_volume(linspace(-5, 5, 3), linspace(-5, 5, 4), linspace(0, 5, 5), {'z-20': m1}, sample)
+        >>> every.shape, every.reshape(every.B['z-20']).shape
+        ((3, 4, 5), (3, 4, 5, 3))
+
+    # m1 being axisymmetric, with axisymmetric=None only the 4 distinct (r, z) of each z are evaluated,
+    # for nearly the same result
+        >>> result = compute_volume(linspace(-5, 5, 3), linspace(-5, 5, 4), linspace(0, 5, 5), {'z-20': m1}, sample,
+        ...                         axisymmetric=None)
+        >>> abs(result.F['z-20'] - every.F['z-20']).max() < 1e-6
+        True
+    """
+    if cache is not None:
+        parameters = dict(xs=xs, ys=ys, zs=zs, BF=BF, grid=grid, gradient=gradient, axisymmetric=axisymmetric)
+        return _cached(cache, 'volume', collections, sample, parameters,
+                       lambda: compute_volume(xs, ys, zs, collections, sample, BF, grid, gradient, axisymmetric,
+                                              n_jobs, executor))
+
+    xs = asarray(xs, dtype=float64).ravel()
+    ys = asarray(ys, dtype=float64).ravel()
+    zs = asarray(zs, dtype=float64).ravel()
+
+    # generate points for B and F calculation, z varying fastest
+    with stage('points'):
+        POS = stack([a.ravel() for a in meshgrid(xs, ys, zs, indexing='ij')], axis=1)
+
+    axes = {'x': xs, 'y': ys, 'z': zs}
+
+    def F_grid(collections, sample, n_jobs, executor):
+        F_grids = _F_grid(xs, ys, zs, collections, sample, n_jobs, executor)
+        return {name: F.reshape(-1, 3) for name, F in F_grids.items()}
+
+    B_fields, F_fields = _fields(POS, collections, sample, BF, gradient, F_grid if grid else None, n_jobs, executor,
+                                 axisymmetric)
+
+    return FieldResult('volume', None, axes, (len(xs), len(ys), len(zs)), POS, B_fields, F_fields)
+
+
+def _bytes_per_point(collections, BF):
+    """
+    Approximate memory used per point when evaluating B and F asked by BF: the positions and results,
+    and the temporary arrays of the field of the most demanding magnet, on the 7 points of the central differences for F
+    the field of a Cylinder with a radial magnetization is integrated numerically with iterDia steps and costs more,
+    the field of a Coil is the sum of up to 24 current sheets on each point
+    """
+    distinct = {id(source): source for collection in collections.values() for source in _sources(collection)}
+
+    def source_bytes(source):
+        if isinstance(source, Cylinder) and any(source.magnetization[:2]):
+            return 160 * getattr(source, 'iterDia', 50)
+        if isinstance(source, Coil):
+            return 160 * 24
+        return 768
+
+    evaluation = max([source_bytes(source) for source in distinct.values()] or [0])
+    evaluation += 3 * 8 * (len(distinct) + len(collections))              # field of each magnet and collection
+
+    quantities = sum(quantity in BF.upper() for quantity in 'BF')
+    memory = 3 * 8 * (1 + quantities * len(collections))                  # positions and results
+
+    return memory + (7 if 'F' in BF.upper() else 1) * evaluation
+
+
+def compute_volume_chunks(xs=array([]), ys=array([]), zs=array([]), collections={}, sample={}, BF='BF',
+                          gradient='numeric', axisymmetric=False, max_memory=256, chunk_size=None, n_jobs=1,
+                          executor=None):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Calculates B and F generated by collections of magnets into a ferromagnetic sample on a 3D grid chunk by chunk,
+    like compute_volume but yielding blocks of (positions, B, F) instead of holding the whole grid in memory
+
+    The points of each block are generated from their index, z varying fastest like compute_volume,
+    and blocks are yielded in that order. Their size keeps the memory used by one block under max_memory,
+    so that blocks can be fed one after the other into writers, reducers or plots for grids of any size
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param xs: numpy.array | x values of the grid [mm]
+    :param ys: numpy.array | y values of the grid [mm]
+    :param zs: numpy.array | z values of the grid [mm]
+    :param collections: dict | the magnets setup to be studied arranged like {'name':magpylib.Collection}
+    :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
+    :param BF: str | 'B' to calculate B; 'F' to calculate F; 'BF' for both
+    :param gradient: str | 'numeric' or 'analytic' (see gradB_batch)
+    :param axisymmetric: bool | False to evaluate every point, None to evaluate B and F once for each distinct (r, z)
+                         of the points and rotate them back when all magnets are Cylinder magnetized along one axis
+                         parallel to z, True to require it. F then differs slightly from evaluating every point
+                         (about 1e-6 N), its central differences being taken on the half plane
+    :param max_memory: float | approximate memory used by the evaluation of one block [MB]
+    :param chunk_size: int | number of points of each block, instead of deriving it from max_memory
+    :param n_jobs: int | number of worker processes for each block, 1 to evaluate in this process (see getBF_parallel)
+    :param executor: concurrent.futures.Executor | executor to evaluate the blocks with, instead of n_jobs
+    :return: generator | tuples (positions, B, F) of numpy.array (n,3) [mm] and dicts {'name': numpy.array (n,3)}
+             of B [mT] and F [N], empty when not asked
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import linspace, pi
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magforce.compute import compute_volume_chunks
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # largest force on the grid, without holding its 64000 points
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> grid = linspace(-5, 5, 40), linspace(-5, 5, 40), linspace(0, 5, 40)
+        >>> largest = 0
+        >>> for positions, B, F in compute_volume_chunks(*grid, {'z-20': m1}, sample, BF='F', chunk_size=10000):
+        ...     largest = max(largest, abs(F['z-20']).max())
+        >>> round(largest, 5)
+        0.42249
+    """
+    xs = asarray(xs, dtype=float64).ravel()
+    ys = asarray(ys, dtype=float64).ravel()
+    zs = asarray(zs, dtype=float64).ravel()
+
+    N = len(xs) * len(ys) * len(zs)
+
+    if chunk_size is None:
+        chunk_size = max(1, int(max_memory * 1e6 // _bytes_per_point(collections, BF)))
+
+    for start in range(0, N, chunk_size):
+        # generate points of the block from their index, z varying fastest
+        with stage('points'):
+            i, j, k = unravel_index(arange(start, min(start + chunk_size, N)), (len(xs), len(ys), len(zs)))
+            POS = stack((xs[i], ys[j], zs[k]), axis=1)
+
+        B_fields, F_fields = _fields(POS, collections, sample, BF, gradient, None, n_jobs, executor, axisymmetric)
+
+        yield POS, B_fields, F_fields
@@ -0,0 +1,279 @@
+from numpy import array, asarray, ascontiguousarray, arange, empty, zeros, ones, stack, floor, clip, diff, allclose, abs, \
+    isnan, meshgrid, random, float64
+
+from magforce.calculation import getB_batch, getM_from_B, getF_from_B, _jacB
+
+
+class FieldMap:
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Samples the magnetic field B of a collection of magnets once on a regular 3D grid, and optionally its jacobian,
+    and then answers getB, gradB, getM and getF queries on any array of points inside the grid by interpolation
+    instead of evaluating the collection again. Meant for the many repeated queries of trajectory studies
+    and design loops on a fixed collection.
+
+    The grid is extended with one cell on each side (halo) so that tricubic interpolation is available up to its border.
+    Without a sampled jacobian, the jacobian is the derivative of the tricubic interpolation of B.
+
+    The error of the interpolation is estimated when the map is built, by comparing interpolated and direct values
+    on n_check random points of the grid (cell centers are not used: for a field satisfying Laplace equation
+    the second order errors of the three directions cancel there). It is stored in the attribute error,
+    as the largest difference relative to the largest direct value, like {'B': 1e-4, 'gradB': 1e-3},
+    or None when n_check is 0.
+    Fields with discontinuities (grids crossing magnets) give large errors. Nodes lying on a magnet surface
+    (halo included) have no defined field and raise a ValueError naming them: shift or resize the grid.
+
+    Fastest queries are obtained with a sampled jacobian and method='linear' (8 neighbours per point instead of 64),
+    at the cost of a finer grid for the same error.
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param collection: magpylib.Collection
+    :param xs: numpy.array | x values of the grid, equally spaced [mm]
+    :param ys: numpy.array | y values of the grid, equally spaced [mm]
+    :param zs: numpy.array | z values of the grid, equally spaced [mm]
+    :param gradient: str | None to differentiate the interpolation of B, 'numeric' or 'analytic' to sample the jacobian
+                     on the grid too, with the given method (see getF)
+    :param method: str | 'cubic' for tricubic (Catmull-Rom) interpolation, 'linear' for trilinear
+    :param n_check: int | number of points used to estimate the error, 0 not to estimate it
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import linspace, pi, array
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magpylib import Collection
+        >>> from magforce import FieldMap, getF_batch
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # magnet collection definition
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> m2 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, 20])
+        >>> both = Collection(m1, m2)
+
+    # field map between the magnets
+        >>> field_map = FieldMap(both, linspace(-5, 5, 21), linspace(-5, 5, 21), linspace(-8, 8, 33), gradient='analytic')
+        >>> field_map.error['B'] < 1e-3, field_map.error['gradB'] < 1e-2
+        (True, True)
+
+    # calculation
+        >>> points = array([(0.3, 0.7, 1.9), (-2.1, 1.3, -4.6)])
+        >>> field_map.getF(points, sample)
+        array([[-0.07472731, -0.17429521,  0.90468633],
+               [ 1.07451842, -0.66529485, -3.67462854]])
+        >>> getF_batch(points, both, sample, gradient='analytic')
+        array([[-0.07471189, -0.17432773,  0.90484636],
+               [ 1.07455337, -0.66519971, -3.67418925]])
+    """
+
+    def __init__(self, collection, xs, ys, zs, gradient=None, method='cubic', n_check=1000):
+        if method not in ('cubic', 'linear'):
+            raise ValueError(f"method must be 'cubic' or 'linear', not {method!r}")
+        if n_check < 0:
+            raise ValueError(f'n_check must be positive or 0, got {n_check}')
+
+        self.collection = collection
+        self.gradient = gradient
+        self.method = method
+
+        # origin, step and number of nodes of the grid, checking it is regular
+        self.origin = zeros(3)
+        self.step = zeros(3)
+        self.shape = zeros(3, dtype=int)
+        for i, values in enumerate((xs, ys, zs)):
+            values = asarray(values, dtype=float64)
+            if len(values) < 2 or not allclose(diff(values), values[1] - values[0]):
+                raise ValueError('xs, ys and zs need to be equally spaced with at least 2 values')
+            self.origin[i] = values[0]
+            self.step[i] = values[1] - values[0]
+            self.shape[i] = len(values)
+
+        # grid nodes with the halo, in the order x, y, z like plot_3D
+        axes = [self.origin[i] + self.step[i] * arange(-1, self.shape[i] + 1) for i in range(3)]
+        nodes = stack([a.ravel() for a in meshgrid(*axes, indexing='ij')], axis=1)
+
+        # sampling, table of (3, nodes) B values or (12, nodes) B and jacobian values
+        if gradient is None:
+            self.table = ascontiguousarray(getB_batch(nodes, collection).T)
+        else:
+            dd, B = _jacB(nodes, collection, gradient)
+            self.table = empty((12, len(nodes)))
+            self.table[:3] = B.T
+            self.table[3:] = dd.reshape(-1, 9).T
+
+        # nodes on magnet surfaces are NaN, which the interpolation would spread to the cells around them
+        undefined = isnan(self.table).any(axis=0)
+        if undefined.any():
+            shown = ', '.join(str(tuple(node)) for node in nodes[undefined][:5].tolist())
+            raise ValueError(f'{undefined.sum()} nodes of the FieldMap grid (halo included) lie on a magnet surface, '
+                             f'where the field is not defined: {shown}{", ..." if undefined.sum() > 5 else ""}')
+
+        self.error = self._estimate_error(n_check) if n_check > 0 else None
+
+    def getB(self, points):
+        """
+        Gets the interpolated magnetic field on N points
+
+        :param points: numpy.array (N,3) [mm]
+        :return: numpy.array (N,3) [mT]
+        """
+        values = self._interpolate(points, derivatives=False)
+        return values[:, 0, :3]
+
+    def gradB(self, points):
+        """
+        Gets the interpolated jacobian of the magnetic field on N points, together with the field, like gradB_batch
+
+        :param points: numpy.array (N,3) [mm]
+        :return: tuple | (N,3,3) array of jacobians [mT/mm] and (N,3) array of B [mT]
+        """
+        if self.gradient is None:
+            values = self._interpolate(points, derivatives=True)
+            B = values[:, 0, :]
+            dd = values[:, 1:, :].transpose(0, 2, 1)          # [n, j, i] dBi/dj to [n, i, j]
+        else:
+            values = self._interpolate(points, derivatives=False)
+            B = values[:, 0, :3]
+            dd = values[:, 0, 3:].reshape(-1, 3, 3)
+
+        return dd, B
+
+    def getM(self, points, sample):
+        """
+        Gets the magnetization of a sample on N points from the interpolated field, like getM_batch
+
+        :param points: numpy.array (N,3) [mm]
+        :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
+        :return: numpy.array (N,3) [A/m]
+        """
+        return getM_from_B(self.getB(points), sample)
+
+    def getF(self, points, sample):
+        """
+        Gets the magnetic force on a ferromagnetic sphere on N points from the interpolated field, like getF_batch
+
+        :param points: numpy.array (N,3) [mm]
+        :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
+        :return: numpy.array (N,3) [N]
+        """
+        dd, B = self.gradB(points)
+        return getF_from_B(B, dd, sample)
+
+    def _interpolate(self, points, derivatives, chunk_size=2048):
+        """
+        Interpolates the table on (N,3) points, in chunks to bound the memory used by the gathered neighbours
+        returns (N,1,C) values, or (N,4,C) values and x, y, z derivatives when derivatives is True
+        """
+        POS = asarray(points, dtype=float64).reshape(-1, 3)
+
+        # position in cells of the grid without halo
+        cells = (POS - self.origin) / self.step
+        if ((cells < -1e-9) | (cells > self.shape - 1 + 1e-9)).any():
+            raise ValueError('points outside of the FieldMap grid')
+
+        base = clip(floor(cells), 0, self.shape - 2).astype(int)
+        t = cells - base
+
+        result = empty((len(POS), 4 if derivatives else 1, len(self.table)))
+
+        for start in range(0, len(POS), chunk_size):
+            stop = start + chunk_size
+            result[start:stop] = self._contract(base[start:stop], t[start:stop], derivatives)
+
+        return result
+
+    def _contract(self, base, t, derivatives):
+        """
+        Gathers the K**3 neighbours (K = 4 cubic, 2 linear) of each cell and contracts them one axis after the other
+        with the interpolation weights (and their derivatives for the jacobian)
+        """
+        n = len(base)
+
+        if self.method == 'cubic':
+            offsets = arange(-1, 3)
+            w = [_catmull_rom(t[:, i]) for i in range(3)]
+            dw = [_catmull_rom_derivative(t[:, i]) / self.step[i] for i in range(3)]
+        else:
+            offsets = arange(0, 2)
+            w = [stack((1 - t[:, i], t[:, i])) for i in range(3)]
+            dw = [ones((2, n)) * array([[-1.], [1.]]) / self.step[i] for i in range(3)]
+
+        # flat index in the table (the halo shifts indices by 1), contracted axes first and points last
+        ny, nz = self.shape[1] + 2, self.shape[2] + 2
+        ix = base[:, 0] + 1 + offsets[:, None]
+        iy = base[:, 1] + 1 + offsets[:, None]
+        iz = base[:, 2] + 1 + offsets[:, None]
+        index = (ix[None, None, :, :] * ny + iy[None, :, None, :]) * nz + iz[:, None, None, :]
+
+        values = self.table.take(index, axis=1)                    # (C, z, y, x, n)
+
+        v_z = _contract(values, w[2])                              # (C, y, x, n)
+        v_yz = _contract(v_z, w[1])                                # (C, x, n)
+        value = _contract(v_yz, w[0])                              # (C, n)
+
+        if not derivatives:
+            return value.T[:, None, :]
+
+        dx = _contract(v_yz, dw[0])
+        dy = _contract(_contract(v_z, dw[1]), w[0])
+        dz = _contract(_contract(_contract(values, dw[2]), w[1]), w[0])
+
+        return stack((value, dx, dy, dz)).transpose(2, 0, 1)
+
+    def _estimate_error(self, n_check):
+        """
+        Compares interpolated and direct values on n_check random points of the grid
+        """
+        end = self.origin + (self.shape - 1) * self.step
+        points = random.RandomState(0).uniform(self.origin, end, (n_check, 3))
+
+        dd, B = self.gradB(points)
+        dd_direct, B_direct = _jacB(points, self.collection, self.gradient or 'numeric')
+
+        def relative(interpolated, direct):
+            scale = abs(direct).max()
+            return float(abs(interpolated - direct).max() / scale) if scale > 0 else 0.
+
+        return {'B': relative(B, B_direct), 'gradB': relative(dd, dd_direct)}
+
+
+def _contract(values, weights):
+    """
+    Contracts the second axis (K neighbours) of values with weights (K,N), N points being the last axis
+    """
+    result = values[:, 0] * weights[0]
+    for k in range(1, len(weights)):
+        result += values[:, k] * weights[k]
+    return result
+
+
+def _catmull_rom(t):
+    """
+    Catmull-Rom cubic weights (4,N) of the nodes -1, 0, 1, 2 for positions t in [0, 1]
+    """
+    t2 = t * t
+    t3 = t2 * t
+    return stack(((-t3 + 2*t2 - t) / 2,
+                  (3*t3 - 5*t2 + 2) / 2,
+                  (-3*t3 + 4*t2 + t) / 2,
+                  (t3 - t2) / 2))
+
+
+def _catmull_rom_derivative(t):
+    """
+    Derivatives of the Catmull-Rom weights with respect to t
+    """
+    t2 = t * t
+    return stack(((-3*t2 + 4*t - 1) / 2,
+                  (9*t2 - 10*t) / 2,
+                  (-9*t2 + 8*t + 1) / 2,
+                  (3*t2 - 2*t) / 2))
@@ -0,0 +1,333 @@
+from copy import deepcopy
+from hashlib import blake2b
+from warnings import warn
+
+from numpy import asarray, zeros, zeros_like, repeat, einsum, where, nan, float64
+from magpylib import Collection
+from magpylib.source.magnet import Box, Cylinder, Sphere
+from magpylib.vector import getBv_magnet
+
+from magforce.kernels import rotation_matrix, gradB_box, gradB_cylinder, gradB_sphere, _on_cylinder
+from magforce.memo import _ATTRIBUTES, _version
+
+
+# largest number of (magnet, point) pairs evaluated at once, bounding the memory of the vectorized calls
+_PAIRS = 2**16
+
+
+class _Group:
+    """
+    Magnets of one type of a FrozenCollection, as read-only arrays: magnetizations [mT] and dimensions [mm]
+    in the coordinate system of each magnet, positions [mm] and rotation matrices from it to the global one
+    cylinders are grouped by iterDia and by direction of magnetization, axial or not
+    """
+
+    def __init__(self, kind, iterDia, axial, magnetization, dimension, position, rotation):
+        self.kind = kind
+        self.iterDia = iterDia
+        self.axial = axial
+
+        self.magnetization = asarray(magnetization, dtype=float64)
+        self.dimension = asarray(dimension, dtype=float64)
+        self.position = asarray(position, dtype=float64)
+        self.rotation = asarray(rotation, dtype=float64)
+
+        for values in (self.magnetization, self.dimension, self.position, self.rotation):
+            values.flags.writeable = False
+
+    def __len__(self):
+        return len(self.position)
+
+    def _blocks(self, N):
+        """
+        Slices of magnets and of points, so that each block has at most _PAIRS (magnet, point) pairs
+        """
+        magnets = min(len(self), _PAIRS)
+        points = max(1, _PAIRS // magnets)
+
+        for k in range(0, len(self), magnets):
+            for n in range(0, N, points):
+                yield slice(k, k + magnets), slice(n, n + points)
+
+    def _local(self, POS, k):
+        """
+        Points POS in the coordinate system of the magnets k, (K,N,3), and the parameters of the magnets repeated
+        for each point, as asked by magpylib vector functions
+        """
+        local = einsum('kji,knj->kni', self.rotation[k], POS[None, :, :] - self.position[k, None, :])
+        N = len(POS)
+
+        return local.reshape(-1, 3), repeat(self.magnetization[k], N, axis=0), repeat(self.dimension[k], N, axis=0)
+
+    def _field(self, POS_local, MAG, DIM):
+        """
+        Field of magnets in their own coordinate system, one magnet for each point
+        NaN on the surface of cylinders, like their own getB
+        """
+        if self.kind != 'cylinder':
+            return getBv_magnet(self.kind, MAG, DIM, zeros_like(POS_local), POS_local, Nphi0=self.iterDia)
+
+        # points on the surface evaluated at the center instead
+        surface = _on_cylinder(POS_local, DIM)
+        if surface.any():
+            warn('Warning: getB Position directly on magnet surface', RuntimeWarning)
+            POS_local = where(surface[:, None], 0., POS_local)
+
+        B = getBv_magnet(self.kind, MAG, DIM, zeros_like(POS_local), POS_local, Nphi0=self.iterDia)
+        B[surface] = nan
+        return B
+
+    def getB(self, POS):
+        """
+        Field of the magnets on (N,3) points POS [mT]
+        """
+        B = zeros((len(POS), 3))
+
+        for k, n in self._blocks(len(POS)):
+            POS_local, MAG, DIM = self._local(POS[n], k)
+            B_local = self._field(POS_local, MAG, DIM).reshape(-1, len(POS[n]), 3)
+            B[n] += einsum('kij,knj->ni', self.rotation[k], B_local)
+
+        return B
+
+    def gradB(self, POS):
+        """
+        Jacobian [mT/mm] and field [mT] of Box, axially magnetized Cylinder and Sphere magnets on (N,3) points POS
+        in closed form, a Sphere being a dipole outside of it and having a uniform field inside
+        """
+        dd = zeros((len(POS), 3, 3))
+        B = zeros((len(POS), 3))
+
+        for k, n in self._blocks(len(POS)):
+            POS_local, MAG, DIM = self._local(POS[n], k)
+            B_local = self._field(POS_local, MAG, DIM)
+
+            if self.kind == 'box':
+                dd_local = gradB_box(POS_local, MAG, DIM)
+            elif self.kind == 'cylinder':
+                dd_local = gradB_cylinder(POS_local, MAG, DIM, B_local)
+            else:
+                dd_local = gradB_sphere(POS_local, MAG, DIM)
+
+            # back to the global coordinate system
+            shape = (-1, len(POS[n]), 3)
+            R = self.rotation[k]
+            B[n] += einsum('kij,knj->ni', R, B_local.reshape(shape))
+            dd[n] += einsum('kia,knab,kjb->nij', R, dd_local.reshape(shape + (3,)), R)
+
+        return dd, B
+
+
+class FrozenCollection:
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Immutable snapshot of a magpylib Collection or source, made by freeze, accepted by all the functions of magforce
+    in place of a collection (getB_batch, gradB_batch, getF_batch, the *_collections, compute and plot functions)
+
+    Box, Cylinder and Sphere magnets are stored as read-only arrays grouped by type, magnetizations and dimensions
+    in the coordinate system of each magnet, positions and rotation matrices resolved once. Each group is evaluated
+    at once with the vectorized magpylib functions on all its magnets and points, without reading the source
+    objects again, so repeated evaluations of an unchanged setup pay no python cost per magnet
+    The jacobian of Box, axially magnetized Cylinder and Sphere magnets is in closed form, other magnets fall back
+    to central differences. Other sources are copied and evaluated like in gradB_batch
+    Changing the collection afterwards does not change the snapshot: freeze it again
+
+    ----------
+    ATTRIBUTES
+    ----------
+
+    :attr groups: tuple | groups of magnets of one type, with arrays magnetization, dimension, position and rotation
+    :attr others: tuple | copies of the sources that are not Box, Cylinder or Sphere magnets
+    :attr version: bytes | hash of the content of the snapshot
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import array, pi
+        >>> from magpylib.source.magnet import Box, Cylinder
+        >>> from magpylib import Collection
+        >>> from magforce import getF_batch
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # a collection, its snapshot, and F of both on a few points
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> m2 = Box(mag=[0, 0, 1000], dim=[4, 4, 4], pos=[0, 10, 10], angle=30, axis=[1, 0, 0])
+        >>> both = Collection(m1, m2)
+        >>> frozen = freeze(both)
+        >>> len(frozen), [group.kind for group in frozen.groups]
+        (2, ['box', 'cylinder'])
+        >>> points = array([(0, 0, 1), (1, 2, 3)])
+        >>> bool(abs(getF_batch(points, frozen, sample) - getF_batch(points, both, sample)).max() < 1e-9)
+        True
+
+    # moving a magnet of the collection does not change the snapshot
+        >>> m2.move([0, 0, 5])
+        >>> bool(abs(getF_batch(points, frozen, sample) - getF_batch(points, both, sample)).max() > 1e-6)
+        True
+    """
+
+    def __init__(self, groups, others):
+        self.groups = tuple(groups)
+        self.others = tuple(others)
+
+        digest = blake2b(digest_size=16)
+        for group in self.groups:
+            digest.update(f'{group.kind} {group.iterDia} {group.axial}'.encode())
+            for values in (group.magnetization, group.dimension, group.position, group.rotation):
+                digest.update(values.tobytes())
+        for source in self.others:
+            digest.update(repr(_version(source)).encode())
+        self.version = digest.digest()
+
+    def __len__(self):
+        return sum(len(group) for group in self.groups) + len(self.others)
+
+    def getB(self, points):
+        """
+        Gets the magnetic field of the snapshot on points
+
+        :param points: numpy.array (3) or (N,3) [mm]
+        :return: numpy.array (3) or (N,3) [mT]
+        """
+        shape = asarray(points).shape
+        POS = asarray(points, dtype=float64).reshape(-1, 3)
+
+        B = zeros((len(POS), 3))
+        for group in self.groups:
+            B += group.getB(POS)
+        for source in self.others:
+            B += asarray(source.getB(POS)).reshape(-1, 3)
+
+        return B.reshape(shape)
+
+    def gradB(self, points):
+        """
+        Gets the jacobian of the magnetic field of the snapshot on N points, together with the field, like gradB_batch
+
+        :param points: numpy.array (N,3) [mm]
+        :return: tuple | (N,3,3) array of jacobians [mT/mm] and (N,3) array of B [mT]
+        """
+        from magforce.calculation import jac_batch, _gradB_source     # calculation itself uses this module
+
+        POS = asarray(points, dtype=float64).reshape(-1, 3)
+
+        dd = zeros((len(POS), 3, 3))
+        B = zeros((len(POS), 3))
+        for group in self.groups:
+            if group.kind == 'cylinder' and not group.axial:
+                dd_group, B_group = jac_batch(group.getB, POS)
+            else:
+                dd_group, B_group = group.gradB(POS)
+            dd += dd_group
+            B += B_group
+        for source in self.others:
+            dd_source, B_source = _gradB_source(POS, source)
+            dd += dd_source
+            B += B_source
+
+        return dd, B
+
+    def describe(self):
+        """
+        Type and parameters of each source of the snapshot, rotations given as matrices
+
+        :return: list | [{'type': str, 'parameter': list}]
+        """
+        sources = []
+        for group in self.groups:
+            for k in range(len(group)):
+                description = {'type': {'box': 'Box', 'cylinder': 'Cylinder', 'sphere': 'Sphere'}[group.kind],
+                               'magnetization': group.magnetization[k].tolist(),
+                               'dimension': group.dimension[k].tolist(),
+                               'position': group.position[k].tolist(),
+                               'rotation': group.rotation[k].tolist()}
+                if group.kind == 'cylinder':
+                    description['iterDia'] = group.iterDia
+                sources.append(description)
+
+        for source in self.others:
+            description = {'type': type(source).__name__}
+            for attribute in _ATTRIBUTES:
+                if hasattr(source, attribute):
+                    description[attribute] = asarray(getattr(source, attribute)).tolist()
+            sources.append(description)
+
+        return sources
+
+
+def freeze(collection):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Makes an immutable snapshot of a collection of magnets, evaluated by all the functions of magforce
+    without going through its sources again, see FrozenCollection
+    Nested collections and snapshots are flattened
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param collection: magpylib.Collection, magpylib source or FrozenCollection
+    :return: FrozenCollection
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magpylib import Collection
+
+    # three cylinders, one of them magnetized across its axis
+        >>> magnets = [Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, z]) for z in (-20, 20)]
+        >>> magnets.append(Cylinder(mag=[1300, 0, 0], dim=[10, 20], pos=[0, 0, 60]))
+        >>> frozen = freeze(Collection(*magnets))
+        >>> [(group.kind, group.axial, len(group)) for group in frozen.groups]
+        [('cylinder', False, 1), ('cylinder', True, 2)]
+    """
+    sources = []
+
+    def gather(source):
+        if isinstance(source, Collection):
+            for item in source.sources:
+                gather(item)
+        else:
+            sources.append(source)
+
+    gather(collection)
+
+    # parameters of the magnets by type, iterDia and axial magnetization, other sources copied
+    grouped = {}
+    others = []
+    for source in sources:
+        if isinstance(source, FrozenCollection):
+            for group in source.groups:
+                parameters = grouped.setdefault((group.kind, group.iterDia, group.axial), ([], [], [], []))
+                for values, part in zip(parameters, (group.magnetization, group.dimension, group.position,
+                                                     group.rotation)):
+                    values.extend(part)
+            others.extend(source.others)
+        elif isinstance(source, (Box, Cylinder, Sphere)):
+            kind = 'box' if isinstance(source, Box) else 'cylinder' if isinstance(source, Cylinder) else 'sphere'
+            iterDia = getattr(source, 'iterDia', 50)
+            axial = kind == 'cylinder' and source.magnetization[0] == 0 and source.magnetization[1] == 0
+            parameters = grouped.setdefault((kind, iterDia, bool(axial)), ([], [], [], []))
+            for values, part in zip(parameters, (source.magnetization, source.dimension, source.position,
+                                                 rotation_matrix(source.angle, source.axis))):
+                values.append(part)
+        else:
+            others.append(deepcopy(source))
+
+    groups = [_Group(kind, iterDia, axial, *parameters)
+              for (kind, iterDia, axial), parameters in sorted(grouped.items(), key=lambda item: item[0])]
+
+    return FrozenCollection(groups, others)
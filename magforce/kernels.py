@@ -0,0 +1,902 @@
+from numpy import array, asarray, zeros, ones_like, empty, sqrt, hypot, where, errstate, broadcast_arrays, cos, sin, \
+    radians, pi, linalg, eye, einsum, outer, trace, broadcast_to, clip, concatenate, log1p, float64
+from numpy.polynomial.legendre import leggauss
+
+
+# helpers
+
+def rotation_matrix(angle, axis):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the rotation matrix of a rotation of angle degrees around axis, like the angle and axis of magpylib sources
+    a vector v given in the source coordinate system is R @ v in the global one
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param angle: float [deg]
+    :param axis: numpy.array | rotation axis, any norm
+    :return: numpy.array 3x3
+
+    -------
+    EXAMPLE
+    -------
+
+    >>> rotation_matrix(90, [0, 0, 1]).round(10)
+    array([[ 0., -1.,  0.],
+           [ 1.,  0.,  0.],
+           [ 0.,  0.,  1.]])
+    """
+    axis = asarray(axis, dtype=float64)
+    norm = linalg.norm(axis)
+
+    if angle == 0 or norm == 0:
+        return array([[1., 0., 0.], [0., 1., 0.], [0., 0., 1.]])
+
+    ux, uy, uz = axis / norm
+    c = cos(radians(angle))
+    s = sin(radians(angle))
+    t = 1 - c
+
+    # Rodrigues rotation formula
+    return array([[t*ux*ux + c,    t*ux*uy - s*uz, t*ux*uz + s*uy],
+                  [t*ux*uy + s*uz, t*uy*uy + c,    t*uy*uz - s*ux],
+                  [t*ux*uz - s*uy, t*uy*uz + s*ux, t*uz*uz + c]])
+
+
+def ellipke(m):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Complete elliptic integrals of first and second kind K(m) and E(m), with parameter m = k**2
+    vectorized, computed with the arithmetic-geometric mean
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param m: numpy.array | parameters in [0, 1)
+    :return: tuple | (K, E) numpy.arrays with same shape as m
+
+    -------
+    EXAMPLE
+    -------
+
+    >>> K, E = ellipke(array([0, 0.5]))
+    >>> K.round(8), E.round(8)
+    (array([1.57079633, 1.85407468]), array([1.57079633, 1.35064388]))
+    """
+    m = asarray(m, dtype=float64)
+
+    a = ones_like(m)
+    b = sqrt(1 - m)
+    c = sqrt(m)
+    power = 0.5
+    total = power * c**2                       # sum of 2**(n-1) * c_n**2
+
+    for _ in range(30):                        # quadratic convergence, never more than a few iterations
+        a, b, c = (a + b) / 2, sqrt(a * b), (a - b) / 2
+        power *= 2
+        total += power * c**2
+        if (abs(c) <= 1e-16 * a).all():
+            break
+
+    K = pi / (2 * a)
+    E = K * (1 - total)
+
+    return K, E
+
+
+def _cel(kc, p, c, s):
+    """
+    Generalized complete elliptic integral of Bulirsch, vectorized, for p > 0:
+    integral over [0, pi/2] of (c cos^2 + s sin^2) / ((cos^2 + p sin^2) sqrt(cos^2 + kc^2 sin^2))
+    """
+    k, p, c, s = broadcast_arrays(abs(asarray(kc, dtype=float64)), sqrt(p), c, s)
+    s = s / p
+    kk = k
+    em = ones_like(k)
+
+    for _ in range(40):                        # quadratic convergence, never more than a few iterations
+        f = c
+        c = s / p + c
+        g = kk / p
+        s = 2 * (s + f * g)
+        p = g + p
+        g = em
+        em = k + em
+        if (abs(g - k) <= 1e-15 * g).all():
+            break
+        k = 2 * sqrt(kk)
+        kk = k * em
+
+    return pi / 2 * (s + c * em) / (em * (em + p))
+
+
+def _divide(numerator, denominator):
+    """
+    Divides, returning 0 where denominator is 0 (the numerator then goes to 0 as well in the kernels below)
+    """
+    with errstate(divide='ignore', invalid='ignore'):
+        return where(denominator == 0, 0., numerator / denominator)
+
+
+def _on_cylinder(POS, dimension):
+    """
+    Mask of the (N,3) points POS on the surface of cylinders of dimension (D, H), (2) or (N,2), centered on the origin
+    with axis z, within 1e-12 mm: there magpylib Cylinder getB returns NaN, while its vectorized elliptic integrals
+    never converge on the edges
+    """
+    D, H = broadcast_to(dimension, (len(POS), 2)).T
+    Rmr = D / 2 - hypot(POS[:, 0], POS[:, 1])
+    z = POS[:, 2]
+
+    side = (abs(Rmr) < 1e-12) & (abs(z) < H / 2 + 1e-12)
+    faces = ((abs(z + H / 2) < 1e-12) | (abs(z - H / 2) < 1e-12)) & (Rmr > -1e-12)
+
+    return side | faces
+
+
+# gradient kernels, all in the source coordinate system (source centered on origin, not rotated)
+
+def gradB_box(points, mag, dim):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the jacobian of the B field of a homogeneously magnetized box on N points
+    closed form, from the third derivatives of the newtonian potential of the box summed over its 8 corners
+    the box is centered on the origin with sides along x, y, z (coordinate system of the magpylib Box)
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param mag: numpy.array | magnetization [mT], like magpylib Box mag, or (N,3) one for each point
+    :param dim: numpy.array | side lengths [mm], like magpylib Box dim, or (N,3) ones for each point
+    :return: numpy.array (N,3,3) [mT/mm] like [n, i, j] for dBi/dj
+
+    -------
+    EXAMPLE
+    -------
+
+    >>> gradB_box(array([(0, 0, 10)]), [0, 0, 1000], [4, 4, 4]).round(5)
+    array([[[ 1.50886,  0.     ,  0.     ],
+            [ 0.     ,  1.50886,  0.     ],
+            [ 0.     ,  0.     , -3.01773]]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+    a, b, c = asarray(dim, dtype=float64).T / 2
+
+    x, y, z = POS[:, 0], POS[:, 1], POS[:, 2]
+
+    # coordinates of the point relative to the 8 corners, shape (N,2,2,2)
+    # sign is + for the lower corner and - for the upper one on each axis
+    U = array([x + a, x - a]).T[:, :, None, None]
+    V = array([y + b, y - b]).T[:, None, :, None]
+    W = array([z + c, z - c]).T[:, None, None, :]
+    U, V, W = broadcast_arrays(U, V, W)
+
+    sign = array([1., -1.])
+    S = sign[:, None, None] * sign[None, :, None] * sign[None, None, :]
+
+    R = sqrt(U**2 + V**2 + W**2)
+    q = (U, V, W)
+
+    # T[i,j,k] = d3 Phi / di dj dk, fully symmetric, Phi the newtonian potential of the box
+    T = zeros((len(POS), 3, 3, 3))
+
+    for i in range(3):
+        j, k = (i + 1) % 3, (i + 2) % 3
+        qi, qj, qk = q[i], q[j], q[k]
+
+        T[:, i, i, i] = (S * _divide(qj * qk * (R**2 + qi**2), R * (qi**2 + qj**2) * (qi**2 + qk**2))).sum(axis=(1, 2, 3))
+
+        for jj, kk in ((j, k), (k, j)):
+            Tiij = (S * _divide(-qi * q[kk], (qi**2 + q[jj]**2) * R)).sum(axis=(1, 2, 3))
+            T[:, i, i, jj] = T[:, i, jj, i] = T[:, jj, i, i] = Tiij
+
+    Txyz = (S / R).sum(axis=(1, 2, 3))
+    for i, j, k in ((0, 1, 2), (0, 2, 1), (1, 0, 2), (1, 2, 0), (2, 0, 1), (2, 1, 0)):
+        T[:, i, j, k] = Txyz
+
+    # dBi/dj = 1/(4 pi) sum_k mag_k T[i,j,k]
+    return einsum('nijk,nk->nij', T, broadcast_to(asarray(mag, dtype=float64), (len(POS), 3))) / (4 * pi)
+
+
+def _loop(r, z, radius):
+    """
+    Gets Br and Bz of a circular loop of radius radius in the plane z = 0, divided by mu0*I/(2*pi)
+    r and z are numpy.arrays of same shape
+    """
+    D = (radius + r)**2 + z**2
+    Q = (radius - r)**2 + z**2
+    m = _divide(4 * radius * r, D)
+
+    K, E = ellipke(m)
+
+    sqrtD = sqrt(D)
+
+    Bz = (K + (radius**2 - r**2 - z**2) / Q * E) / sqrtD
+    Br = _divide(z * (-K + (radius**2 + r**2 + z**2) / Q * E), r * sqrtD)   # 0 on the axis
+
+    return Br, Bz
+
+
+def _grad_axisymmetric(POS, Br, dBrdr, dBrdz, dBzdr, dBzdz):
+    """
+    Assembles the (N,3,3) cartesian jacobian of an axisymmetric field around the z axis
+    out of its cylindrical components, Br being given divided by r (limit value on the axis)
+    """
+    x, y = POS[:, 0], POS[:, 1]
+    r = hypot(x, y)
+    on_axis = r == 0
+
+    cos_phi = where(on_axis, 1., _divide(x, r))
+    sin_phi = _divide(y, r)
+
+    dd = empty((len(POS), 3, 3))
+
+    dd[:, 0, 0] = dBrdr * cos_phi**2 + Br * sin_phi**2
+    dd[:, 1, 1] = dBrdr * sin_phi**2 + Br * cos_phi**2
+    dd[:, 0, 1] = dd[:, 1, 0] = (dBrdr - Br) * sin_phi * cos_phi
+    dd[:, 0, 2] = dBrdz * cos_phi
+    dd[:, 1, 2] = dBrdz * sin_phi
+    dd[:, 2, 0] = dBzdr * cos_phi
+    dd[:, 2, 1] = dBzdr * sin_phi
+    dd[:, 2, 2] = dBzdz
+
+    return dd
+
+
+def gradB_cylinder(points, mag, dim, B):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the jacobian of the B field of an axially magnetized cylinder on N points
+    the z derivatives of B are the fields of two current loops on the cylinder faces (equivalent surface current),
+    dBr/dr follows from div B = 0 with the field B itself
+    the cylinder is centered on the origin with axis along z (coordinate system of the magpylib Cylinder)
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param mag: numpy.array | magnetization [mT], like magpylib Cylinder mag, or (N,3) one for each point,
+                only its z component is used
+    :param dim: numpy.array | diameter and height [mm], like magpylib Cylinder dim, or (N,2) ones for each point
+    :param B: numpy.array (N,3) [mT] | field of the cylinder on the points
+    :return: numpy.array (N,3,3) [mT/mm] like [n, i, j] for dBi/dj
+
+    -------
+    EXAMPLE
+    -------
+
+    >>> from magpylib.source.magnet import Cylinder
+    >>> points = array([(0, 0, 1)])
+    >>> B = Cylinder(mag=[0, 0, 1300], dim=[10, 20]).getB(points)
+    >>> gradB_cylinder(points, [0, 0, 1300], [10, 20], B).round(5)
+    array([[[ 2.83931,  0.     ,  0.     ],
+            [ 0.     ,  2.83931,  0.     ],
+            [ 0.     ,  0.     , -5.67863]]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+    B = asarray(B, dtype=float64).reshape(-1, 3)
+
+    radius, half_height = asarray(dim, dtype=float64).T / 2
+    prefactor = asarray(mag, dtype=float64).T[2] / (2 * pi)  # mu0*K/(2*pi), K = M the equivalent surface current
+
+    x, y, z = POS[:, 0], POS[:, 1], POS[:, 2]
+    r = hypot(x, y)
+
+    # dB/dz = field of loop on bottom face - field of loop on top face
+    Br_bottom, Bz_bottom = _loop(r, z + half_height, radius)
+    Br_top, Bz_top = _loop(r, z - half_height, radius)
+
+    dBrdz = prefactor * (Br_bottom - Br_top)
+    dBzdz = prefactor * (Bz_bottom - Bz_top)
+    dBzdr = dBrdz                              # curl B = 0
+
+    # Br/r, tending to -dBz/dz / 2 on the axis
+    Br_r = where(r == 0, -dBzdz / 2, _divide(B[:, 0] * x + B[:, 1] * y, r**2))
+
+    dBrdr = -dBzdz - Br_r                      # div B = 0
+
+    return _grad_axisymmetric(POS, Br_r, dBrdr, dBrdz, dBzdr, dBzdz)
+
+
+def _loop_gradient(r, z, radius):
+    """
+    Gets Br/r and the derivatives dBr/dr, dBr/dz, dBz/dr, dBz/dz of a circular loop of radius radius
+    in the plane z = 0, divided by mu0*I/(2*pi), from the derivatives of K(m) and E(m) along m = 4*radius*r/D
+    r and z are numpy.arrays of same shape
+    """
+    D = (radius + r)**2 + z**2
+    Q = (radius - r)**2 + z**2
+    m = 4 * radius * r / D
+
+    K, E = ellipke(m)
+
+    # dK/dm and dE/dm, by their series near the axis where the closed forms lose their precision
+    series = m < 1e-4
+    with errstate(divide='ignore', invalid='ignore'):
+        dK = where(series, pi / 2 * (1 / 4 + 9 * m / 32 + 75 * m**2 / 256), (E - (1 - m) * K) / (2 * m * (1 - m)))
+        dE = where(series, -pi / 2 * (1 / 4 + 3 * m / 32 + 15 * m**2 / 256), (E - K) / (2 * m))
+
+    sqrtD = sqrt(D)
+    g = (radius**2 - r**2 - z**2) / Q
+    Bz = (K + g * E) / sqrtD
+
+    # Bz = (K + g E) / sqrt(D), derived along z and r
+    dmdz, dmdr = -2 * z * m / D, 4 * radius * (radius**2 - r**2 + z**2) / D**2
+    dgdz = -4 * radius * z * (radius - r) / Q**2
+    dgdr = (2 * (radius - r) * (radius**2 - r**2 - z**2) - 2 * r * Q) / Q**2
+
+    dBzdz = ((dK + g * dE) * dmdz + dgdz * E) / sqrtD - Bz * z / D
+    dBzdr = ((dK + g * dE) * dmdr + dgdr * E) / sqrtD - Bz * (radius + r) / D
+    dBrdz = dBzdr                              # curl B = 0
+
+    # Br/r, tending to -dBz/dz / 2 on the axis, where its closed form loses its precision
+    with errstate(divide='ignore', invalid='ignore'):
+        Br_r = where(m < 1e-5, -dBzdz / 2, z * (-K + (radius**2 + r**2 + z**2) / Q * E) / (r**2 * sqrtD))
+
+    dBrdr = -dBzdz - Br_r                      # div B = 0
+
+    return Br_r, dBrdr, dBrdz, dBzdr, dBzdz
+
+
+def loop_B(points, current, diameter):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the B field of a circular current loop on N points, with complete elliptic integrals
+    the loop is centered on the origin in the plane z = 0 (coordinate system of the magpylib Circular)
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param current: float | current, positive counterclockwise around z [A]
+    :param diameter: float | diameter of the loop [mm]
+    :return: numpy.array (N,3) [mT]
+
+    -------
+    EXAMPLE
+    -------
+
+    >>> loop_B(array([(0, 0, 0), (3, 4, 2)]), 10, 10).round(5)
+    array([[0.     , 0.     , 1.25664],
+           [0.52364, 0.69819, 0.38952]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+    x, y, z = POS[:, 0], POS[:, 1], POS[:, 2]
+    r = hypot(x, y)
+
+    radius = diameter / 2
+    Br, Bz = _loop(r, z, radius)
+
+    # Br/r, by its value on the axis where the closed form loses its precision
+    near_axis = 4 * radius * r < 1e-5 * ((radius + r)**2 + z**2)
+    Br_r = where(near_axis, 3 * pi * radius**2 * z / (2 * (radius**2 + z**2)**2.5), _divide(Br, r))
+
+    # mu0*I/(2*pi) = 0.2 * I in mT*mm
+    return 0.2 * current * array([Br_r * x, Br_r * y, Bz]).T
+
+
+def gradB_loop(points, current, diameter):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the jacobian of the B field of a circular current loop on N points, closed form,
+    from the derivatives of the complete elliptic integrals
+    the loop is centered on the origin in the plane z = 0 (coordinate system of the magpylib Circular)
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param current: float | current, positive counterclockwise around z [A]
+    :param diameter: float | diameter of the loop [mm]
+    :return: numpy.array (N,3,3) [mT/mm] like [n, i, j] for dBi/dj
+
+    -------
+    EXAMPLE
+    -------
+
+    >>> gradB_loop(array([(3, 4, 2)]), 10, 10).round(5)
+    array([[[ 0.08717, -0.1165 , -0.31917],
+            [-0.1165 ,  0.01922, -0.42556],
+            [-0.31917, -0.42556, -0.10639]]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+    r = hypot(POS[:, 0], POS[:, 1])
+
+    return 0.2 * current * _grad_axisymmetric(POS, *_loop_gradient(r, POS[:, 2], diameter / 2))
+
+
+# dipole kernels, far field of a magnet of moment m centered on the origin
+
+def dipole_B(points, moment):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the B field of a magnetic dipole on N points: B = (3 (m.r) r / r^5 - m / r^3) / (4 pi)
+    with the moment given like magpylib magnetizations, as mu0 * magnetic moment
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param moment: numpy.array | magnetization times volume of the magnet [mT*mm3], or (N,3) one for each point
+    :return: numpy.array (N,3) [mT]
+
+    -------
+    EXAMPLE
+    -------
+
+    >>> dipole_B(array([(0, 0, 10)]), [0, 0, 1000 * 64]).round(5)
+    array([[ 0.     ,  0.     , 10.18592]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+    m = broadcast_to(asarray(moment, dtype=float64), POS.shape)
+
+    r2 = (POS**2).sum(axis=1)
+    r = sqrt(r2)
+    mr = (POS * m).sum(axis=1)
+
+    return (3 * mr[:, None] * POS / (r2 * r2 * r)[:, None] - m / (r2 * r)[:, None]) / (4 * pi)
+
+
+def gradB_dipole(points, moment):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the jacobian of the B field of a magnetic dipole on N points:
+    dBi/dj = 3 ((m_j r_i + m_i r_j + (m.r) delta_ij) / r^5 - 5 (m.r) r_i r_j / r^7) / (4 pi)
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param moment: numpy.array | magnetization times volume of the magnet [mT*mm3], or (N,3) one for each point
+    :return: numpy.array (N,3,3) [mT/mm] like [n, i, j] for dBi/dj
+
+    -------
+    EXAMPLE
+    -------
+
+    >>> gradB_dipole(array([(0, 0, 10)]), [0, 0, 1000 * 64]).round(5)
+    array([[[ 1.52789,  0.     ,  0.     ],
+            [ 0.     ,  1.52789,  0.     ],
+            [ 0.     ,  0.     , -3.05577]]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+    m = broadcast_to(asarray(moment, dtype=float64), POS.shape)
+
+    r2 = (POS**2).sum(axis=1)
+    r5 = r2 * r2 * sqrt(r2)
+    mr = (POS * m).sum(axis=1)
+
+    dd = POS[:, :, None] * m[:, None, :] + m[:, :, None] * POS[:, None, :]
+    dd += mr[:, None, None] * eye(3)
+    dd -= 5 * (mr / r2)[:, None, None] * POS[:, :, None] * POS[:, None, :]
+
+    return 3 * dd / (4 * pi * r5[:, None, None])
+
+
+# sphere kernels, dipole outside of the sphere and uniform field inside
+
+def sphere_B(points, mag, diameter):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the B field of a homogeneously magnetized sphere on N points:
+    the field of its dipole, of moment mag * volume, outside of it and 2/3 mag inside
+    the sphere is centered on the origin (coordinate system of the magpylib Sphere)
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param mag: numpy.array | magnetization [mT], like magpylib Sphere mag, or (N,3) one for each point
+    :param diameter: float | diameter [mm], like magpylib Sphere dim, or (N) one for each point
+    :return: numpy.array (N,3) [mT]
+
+    -------
+    EXAMPLE
+    -------
+
+    >>> sphere_B(array([(0, 0, 1), (0, 0, 10)]), [0, 0, 1000], 4).round(5)
+    array([[  0.     ,   0.     , 666.66667],
+           [  0.     ,   0.     ,   5.33333]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+    MAG = broadcast_to(asarray(mag, dtype=float64), POS.shape)
+    diameter = broadcast_to(asarray(diameter, dtype=float64), POS.shape[:1])
+
+    inside = linalg.norm(POS, axis=1) <= diameter / 2
+
+    B = empty((len(POS), 3))
+    B[inside] = 2 / 3 * MAG[inside]
+    B[~inside] = dipole_B(POS[~inside], MAG[~inside] * (pi * diameter[~inside, None]**3 / 6))
+
+    return B
+
+
+def gradB_sphere(points, mag, diameter):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the jacobian of the B field of a homogeneously magnetized sphere on N points:
+    the jacobian of its dipole outside of it and 0 inside
+    the sphere is centered on the origin (coordinate system of the magpylib Sphere)
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param mag: numpy.array | magnetization [mT], like magpylib Sphere mag, or (N,3) one for each point
+    :param diameter: float | diameter [mm], like magpylib Sphere dim, or (N) one for each point
+    :return: numpy.array (N,3,3) [mT/mm] like [n, i, j] for dBi/dj
+
+    -------
+    EXAMPLE
+    -------
+
+    >>> gradB_sphere(array([(0, 0, 10)]), [0, 0, 1000], 4).round(5)
+    array([[[ 0.8,  0. ,  0. ],
+            [ 0. ,  0.8,  0. ],
+            [ 0. ,  0. , -1.6]]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+    MAG = broadcast_to(asarray(mag, dtype=float64), POS.shape)
+    diameter = broadcast_to(asarray(diameter, dtype=float64), POS.shape[:1])
+
+    outside = linalg.norm(POS, axis=1) > diameter / 2
+
+    dd = zeros((len(POS), 3, 3))
+    dd[outside] = gradB_dipole(POS[outside], MAG[outside] * (pi * diameter[outside, None]**3 / 6))
+
+    return dd
+
+
+# coil kernels, thick solenoid of uniform current density as current sheets integrated over their radius
+
+# Gauss-Legendre nodes and weights on [-1, 1] for the integration over the radius: the whole winding
+# for points farther from it than its thickness, each side of the radius of the point for nearer ones
+_FAR = leggauss(6)
+_NEAR = leggauss(12)
+
+
+def _sheet(r, z, radius, half_length):
+    """
+    Gets Br and Bz of a cylindrical current sheet of radius radius from z = -half_length to z = half_length,
+    divided by mu0*K/pi, K the current per unit length (Derby and Olbert, Am. J. Phys. 78, 2010)
+    r, z and radius are numpy.arrays broadcast together
+    """
+    r, z, radius = broadcast_arrays(r, z, radius)
+    gamma = (radius - r) / (radius + r)
+    Br = zeros(r.shape)
+    Bz = zeros(r.shape)
+
+    for sign, zz in ((1, z + half_length), (-1, z - half_length)):
+        D = sqrt(zz**2 + (radius + r)**2)
+        kc = sqrt(zz**2 + (radius - r)**2) / D
+
+        Br += sign * radius / D * _cel(kc, 1, 1, -1)
+        Bz += sign * zz / D * _cel(kc, gamma**2, 1, gamma)
+
+    return Br, radius / (radius + r) * Bz
+
+
+def _coil_quadrature(r, z, inner, outer, length):
+    """
+    Groups of points at distance r of the axis and height z, as (index, radii, weights), radii (n,M) or (1,M)
+    of the sheets standing for a winding from inner to outer radius seen from each point and their weights,
+    summing to 1
+    far points (and all points of a single sheet) take Gauss nodes on the whole winding, near ones Gauss nodes
+    on each side of their radius, where the field of a sheet is discontinuous, gathered logarithmically toward it
+    within the distance of the point to the nearest end of the sheets, where their fields peak
+    """
+    rc = clip(r, inner, outer)
+    ends = abs(abs(z) - length / 2)
+    far = (hypot(r - rc, (abs(z) - length / 2).clip(min=0)) > outer - inner) | (outer == inner)
+
+    nodes, weights = _FAR
+    index = far.nonzero()[0]
+    yield index, inner + (outer - inner) * (1 + nodes[None, :]) / 2, weights[None, :] / 2
+
+    # a = rc -+ x, x = e ((1 + d/e)**s - 1) for s in [0, 1], dx = (x + e) log(1 + d/e) ds
+    nodes, weights = _NEAR
+    s = (1 + nodes[None, :]) / 2
+
+    index = (~far).nonzero()[0]
+    rc = rc[index, None]
+    e = hypot(r[index, None] - rc, ends[index, None]).clip(min=1e-9 * (outer - inner))
+
+    radii, parts = [], []
+    for sign, d in ((-1, rc - inner), (1, outer - rc)):
+        x = e * ((1 + d / e)**s - 1)
+        radii.append(rc + sign * x)
+        parts.append(weights / 2 * (x + e) * log1p(d / e) / (outer - inner))
+
+    yield index, concatenate(radii, axis=1), concatenate(parts, axis=1)
+
+
+def coil_B(points, current, turns, inner, outer, length):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the B field of a coil (thick solenoid) of uniform current density on N points: the field of the cylindrical
+    current sheets it is made of, in closed form with generalized complete elliptic integrals,
+    integrated over their radius by Gauss-Legendre quadrature on each side of the point
+    the coil is centered on the origin with axis along z
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param current: float | current in each turn, positive counterclockwise around z [A]
+    :param turns: float | number of turns
+    :param inner: float | inner radius of the winding [mm]
+    :param outer: float | outer radius of the winding [mm]
+    :param length: float | length of the winding along z [mm]
+    :return: numpy.array (N,3) [mT]
+
+    -------
+    EXAMPLE
+    -------
+
+    >>> coil_B(array([(0, 0, 0), (3, 4, 20)]), 1, 500, 10, 20, 100).round(5)
+    array([[0.     , 0.     , 6.01129],
+           [0.02431, 0.03241, 5.88484]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+    x, y, z = POS[:, 0], POS[:, 1], POS[:, 2]
+    r = hypot(x, y)
+
+    Br, Bz = zeros(len(POS)), zeros(len(POS))
+    for index, radii, weights in _coil_quadrature(r, z, inner, outer, length):
+        Br_sheets, Bz_sheets = _sheet(r[index, None], z[index, None], radii, length / 2)
+        Br[index], Bz[index] = (weights * Br_sheets).sum(axis=1), (weights * Bz_sheets).sum(axis=1)
+
+    # mu0*K/pi = 0.4 * K in mT, K = turns * current / length in A/mm
+    Br_r = _divide(Br, r)
+    return 0.4 * turns * current / length * array([Br_r * x, Br_r * y, Bz]).T
+
+
+def gradB_coil(points, current, turns, inner, outer, length, B):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the jacobian of the B field of a coil (thick solenoid) of uniform current density on N points
+    the z derivatives of B are the fields of the current loops at both ends of its sheets, integrated over their radius
+    like in coil_B, dBz/dr follows from curl B = mu0 J and dBr/dr from div B = 0 with the field B itself
+    the coil is centered on the origin with axis along z
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param current: float | current in each turn, positive counterclockwise around z [A]
+    :param turns: float | number of turns
+    :param inner: float | inner radius of the winding [mm]
+    :param outer: float | outer radius of the winding [mm]
+    :param length: float | length of the winding along z [mm]
+    :param B: numpy.array (N,3) [mT] | field of the coil on the points
+    :return: numpy.array (N,3,3) [mT/mm] like [n, i, j] for dBi/dj
+
+    -------
+    EXAMPLE
+    -------
+
+    >>> points = array([(3, 4, 20)])
+    >>> B = coil_B(points, 1, 500, 10, 20, 100)
+    >>> gradB_coil(points, 1, 500, 10, 20, 100, B).round(5)
+    array([[[ 0.00795, -0.0002 ,  0.00223],
+            [-0.0002 ,  0.00783,  0.00297],
+            [ 0.00223,  0.00297, -0.01579]]])
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+    B = asarray(B, dtype=float64).reshape(-1, 3)
+    x, y, z = POS[:, 0], POS[:, 1], POS[:, 2]
+    r = hypot(x, y)
+
+    # dB/dz = field of the loops at the bottom - field of the loops at the top, mu0*K/(2*pi) = 0.2 * K
+    dBrdz, dBzdz = zeros(len(POS)), zeros(len(POS))
+    for index, radii, weights in _coil_quadrature(r, z, inner, outer, length):
+        Br_bottom, Bz_bottom = _loop(r[index, None], z[index, None] + length / 2, radii)
+        Br_top, Bz_top = _loop(r[index, None], z[index, None] - length / 2, radii)
+        dBrdz[index] = (weights * (Br_bottom - Br_top)).sum(axis=1)
+        dBzdz[index] = (weights * (Bz_bottom - Bz_top)).sum(axis=1)
+
+    prefactor = 0.2 * turns * current / length
+    dBrdz, dBzdz = prefactor * dBrdz, prefactor * dBzdz
+
+    # curl B = mu0 J inside the winding, J = turns * current / (length * (outer - inner)), mu0 = 0.4*pi mT*mm/A
+    winding = (r > inner) & (r < outer) & (abs(z) < length / 2)
+    dBzdr = dBrdz - 0.4 * pi * turns * current / length * _divide(winding, outer - inner)
+
+    # Br/r, tending to -dBz/dz / 2 on the axis
+    Br_r = where(r == 0, -dBzdz / 2, _divide(B[:, 0] * x + B[:, 1] * y, r**2))
+
+    dBrdr = -dBzdz - Br_r                      # div B = 0
+
+    return _grad_axisymmetric(POS, Br_r, dBrdr, dBrdz, dBzdr, dBzdz)
+
+
+# cluster kernels, far field of a group of dipoles around the origin, to the second order in their distance to it
+
+def _cluster_terms(POS, second):
+    """
+    Contractions of the second moment O[l, n, j] of a group of dipoles with the points x: v[j] = O[l, n, j] x_l x_n,
+    u[l] = O[l, n, j] x_n x_j, c = O[l, n, j] x_l x_n x_j, a[n] = O[n, j, j] and b[j] = O[l, l, j]
+    """
+    v = einsum('lnj,Nl,Nn->Nj', second, POS, POS)
+    u = einsum('lnj,Nn,Nj->Nl', second, POS, POS)
+    c = (v * POS).sum(axis=1)
+    a = einsum('njj->n', second)
+    b = einsum('llj->j', second)
+
+    return v, u, c, a, b
+
+
+def cluster_B(points, moment, first, second):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the B field of a group of dipoles m_k at d_k on N points, from their total moment M = sum(m_k),
+    first moment Q = sum(d_k m_k) and second moment O = sum(d_k d_k m_k) around the origin:
+    B = (T2 M - T3 Q + T4 O / 2) / (4 pi) with Tn the derivatives of 1/r,
+    exact to the second order in d_k / r, so that groups of opposed dipoles, whose total moment cancels, are kept
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param moment: numpy.array (3) | total moment of the dipoles [mT*mm3]
+    :param first: numpy.array (3,3) | first moment of the dipoles, Q[l, j] = sum(d_k[l] * m_k[j]) [mT*mm4]
+    :param second: numpy.array (3,3,3) | second moment, O[l, n, j] = sum(d_k[l] * d_k[n] * m_k[j]) [mT*mm5]
+    :return: numpy.array (N,3) [mT]
+
+    -------
+    EXAMPLE
+    -------
+
+    # two opposed dipoles at z = -1 and z = 1, far from them, against their sum
+        >>> m1, m2 = array([0, 0, 64000]), array([0, 0, -64000])
+        >>> d1, d2 = array([0, 0, -1]), array([0, 0, 1])
+        >>> P = array([(10, 20, 100)])
+        >>> first = outer(d1, m1) + outer(d2, m2)
+        >>> second = einsum('l,n,j->lnj', d1, d1, m1) + einsum('l,n,j->lnj', d2, d2, m2)
+        >>> group = cluster_B(P, m1 + m2, first, second)
+        >>> exact = dipole_B(P - d1, m1) + dipole_B(P - d2, m2)
+        >>> bool(abs(group - exact).max() < 1e-3 * abs(exact).max())
+        True
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+    M = asarray(moment, dtype=float64)
+    Q = asarray(first, dtype=float64)
+    O = asarray(second, dtype=float64)
+
+    r2 = (POS**2).sum(axis=1)[:, None]
+    r = sqrt(r2)
+    xM = POS @ M
+    xQx = einsum('ni,ij,nj->n', POS, Q, POS)[:, None]
+    s = POS @ (Q + Q.T)                              # (Q + Q^T) x, Q + Q^T being symmetric
+    v, u, c, a, b = _cluster_terms(POS, O)
+    g = (POS @ (2 * a + b))[:, None]
+
+    T2M = 3 * xM[:, None] * POS / r**5 - M / r**3
+    T3Q = -15 * xQx * POS / r**7 + 3 * (trace(Q) * POS + s) / r**5
+    T4O = 105 * c[:, None] * POS / r**9 - 15 * (v + 2 * u + g * POS) / r**7 + 3 * (b + 2 * a) / r**5
+
+    return (T2M - T3Q + T4O / 2) / (4 * pi)
+
+
+def gradB_cluster(points, moment, first, second):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets the jacobian of the B field of a group of dipoles on N points from their total, first and second moments,
+    like cluster_B: dBi/dn = (T3 M - T4 Q + T5 O / 2)[i, n] / (4 pi)
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param moment: numpy.array (3) | total moment of the dipoles [mT*mm3]
+    :param first: numpy.array (3,3) | first moment of the dipoles, Q[l, j] = sum(d_k[l] * m_k[j]) [mT*mm4]
+    :param second: numpy.array (3,3,3) | second moment, O[l, n, j] = sum(d_k[l] * d_k[n] * m_k[j]) [mT*mm5]
+    :return: numpy.array (N,3,3) [mT/mm] like [n, i, j] for dBi/dj
+
+    -------
+    EXAMPLE
+    -------
+
+    # two opposed dipoles at z = -1 and z = 1, far from them, against their sum
+        >>> m1, m2 = array([0, 0, 64000]), array([0, 0, -64000])
+        >>> d1, d2 = array([0, 0, -1]), array([0, 0, 1])
+        >>> P = array([(10, 20, 100)])
+        >>> first = outer(d1, m1) + outer(d2, m2)
+        >>> second = einsum('l,n,j->lnj', d1, d1, m1) + einsum('l,n,j->lnj', d2, d2, m2)
+        >>> group = gradB_cluster(P, m1 + m2, first, second)
+        >>> exact = gradB_dipole(P - d1, m1) + gradB_dipole(P - d2, m2)
+        >>> bool(abs(group - exact).max() < 1e-3 * abs(exact).max())
+        True
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+    M = asarray(moment, dtype=float64)
+    Q = asarray(first, dtype=float64)
+    O = asarray(second, dtype=float64)
+    S = Q + Q.T
+
+    r2 = (POS**2).sum(axis=1)[:, None, None]
+    r = sqrt(r2)
+    xM = (POS @ M)[:, None, None]
+    xQx = einsum('ni,ij,nj->n', POS, Q, POS)[:, None, None]
+    s = POS @ S
+    xx = POS[:, :, None] * POS[:, None, :]
+
+    T3M = -15 * xx * xM / r**7 + 3 * (POS[:, :, None] * M[None, None, :] + xM * eye(3)
+                                      + M[None, :, None] * POS[:, None, :]) / r**5
+    T4Q = 105 * xx * xQx / r**9 \
+        - 15 * (s[:, :, None] * POS[:, None, :] + POS[:, :, None] * s[:, None, :] + xQx * eye(3)
+                + trace(Q) * xx) / r**7 \
+        + 3 * (S + trace(Q) * eye(3)) / r**5
+
+    # T5 O as the derivative of T4 O of cluster_B
+    v, u, c, a, b = _cluster_terms(POS, O)
+    g = (POS @ (2 * a + b))[:, None, None]
+    W = einsum('kni,Nn->Nik', O, POS)                # derivative of v / 2
+    U = einsum('ikj,Nj->Nik', O, POS) + einsum('ink,Nn->Nik', O, POS)      # derivative of u
+    c = c[:, None, None]
+    x_i, x_k = POS[:, :, None], POS[:, None, :]
+
+    T5O = 105 * (c * eye(3) + x_i * (2 * u + v)[:, None, :] - 9 * c * xx / r2) / r**9 \
+        - 15 * (2 * W + 2 * U + g * eye(3) + x_i * (2 * a + b)) / r**7 \
+        + 105 * ((v + 2 * u)[:, :, None] + g * x_i) * x_k / r**9 \
+        - 15 * (b + 2 * a)[None, :, None] * x_k / r**7
+
+    return (T3M - T4Q + T5O / 2) / (4 * pi)
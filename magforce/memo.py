@@ -0,0 +1,133 @@
+from collections import OrderedDict
+from hashlib import blake2b
+
+from numpy import asarray, round, float64
+
+
+# source attributes a field depends on, when the source has them
+_ATTRIBUTES = ['magnetization', 'moment', 'current', 'dimension', 'position', 'angle', 'axis', 'iterDia',
+               'turns', 'inner', 'outer', 'length']
+
+# FieldMemo in use, set by its with statement
+_active = None
+
+
+def _version(source):
+    """
+    State of a source: type and values of its attributes, changing whenever the source is moved, rotated or modified
+    or its own version for immutable sources like FrozenCollection
+    """
+    if hasattr(source, 'version'):
+        return type(source), source.version
+
+    return (type(source),) + tuple(asarray(getattr(source, attribute), dtype=float64).tobytes()
+                                   for attribute in _ATTRIBUTES if hasattr(source, attribute))
+
+
+class FieldMemo:
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    In memory LRU cache of the field of each source on arrays of points, used by all the functions of magforce
+    evaluating B (getB_batch and everything built on it) inside a with statement
+
+    Fields are keyed by the identity and state of the source (moving, rotating or modifying it gives a new key)
+    and by the points rounded to decimals, so that B evaluated twice on the same points, as when B and F
+    are both asked, is only calculated once. The least recently used fields are dropped above capacity entries
+    The cache belongs to the process using it: worker processes of n_jobs do not share it
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param capacity: int | maximum number of fields kept
+    :param decimals: int | decimals the points are rounded to for the keys [mm]
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import linspace, pi, stack, zeros_like
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magforce import getB_collections, getF_collections
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # B then F on the same points, the field on the points themselves being calculated once
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> zs = linspace(-5, 5, 11)
+        >>> points = stack((zeros_like(zs), zeros_like(zs), zs), axis=1)
+        >>> with FieldMemo() as memo:
+        ...     B = getB_collections(points, {'z-20': m1})
+        ...     F = getF_collections(points, {'z-20': m1}, sample)
+        >>> memo.hits, memo.misses
+        (1, 2)
+    """
+
+    def __init__(self, capacity=128, decimals=12):
+        self.capacity = capacity
+        self.decimals = decimals
+        self.hits = 0
+        self.misses = 0
+
+        self._fields = OrderedDict()
+        self._previous = []
+
+    def __enter__(self):
+        global _active
+        self._previous.append(_active)
+        _active = self
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = self._previous.pop()
+
+    def __len__(self):
+        return len(self._fields)
+
+    def key(self, source, POS, mode=None):
+        """
+        Key of the field of source on the (N,3) points POS, mode being anything else the field depends on
+        (like the error of a FarField)
+
+        :return: tuple
+        """
+        digest = blake2b(round(POS, self.decimals).tobytes(), digest_size=16).digest()
+
+        return id(source), _version(source), POS.shape, digest, mode
+
+    def getB(self, POS, source, evaluate, mode=None):
+        """
+        Field of source on the (N,3) points POS, from the cache or calculated with evaluate(POS, source) and kept
+
+        :return: numpy.array (N,3) [mT], not to be modified
+        """
+        key = self.key(source, POS, mode)
+
+        if key in self._fields:
+            self._fields.move_to_end(key)
+            self.hits += 1
+            return self._fields[key]
+
+        self.misses += 1
+        B = evaluate(POS, source)
+        B.flags.writeable = False
+
+        self._fields[key] = B
+        while len(self._fields) > self.capacity:
+            self._fields.popitem(last=False)             # least recently used
+
+        return B
+
+    def clear(self):
+        """
+        Removes all the fields of the cache and resets the counters
+        """
+        self._fields.clear()
+        self.hits = 0
+        self.misses = 0
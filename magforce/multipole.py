@@ -0,0 +1,330 @@
+from numpy import array, asarray, zeros, arange, sqrt, cos, sin, clip, prod, linalg, pi, inf, eye, float64
+from magpylib.source.magnet import Box, Cylinder, Sphere
+
+from magforce.kernels import rotation_matrix, dipole_B, gradB_dipole
+from magforce.memo import _version
+
+
+# FarField in use, set by its with statement
+_active = None
+
+# width of the shell beyond the switching distance where exact and dipole fields are blended, relative to the distance
+_SHELL = 0.25
+
+
+def _directions(n):
+    """
+    Gets n unit vectors spread evenly on the sphere (Fibonacci lattice)
+    """
+    k = arange(n) + 0.5
+    z = 1 - 2 * k / n
+    phi = pi * (1 + sqrt(5)) * k
+    r = sqrt(1 - z**2)
+
+    return array([r * cos(phi), r * sin(phi), z]).T
+
+
+_DIRECTIONS = _directions(200)
+
+
+def _volume(source):
+    """
+    Volume of a Box, Cylinder or Sphere magnet [mm3]
+    """
+    dim = asarray(source.dimension, dtype=float64)
+    if isinstance(source, Box):
+        return prod(dim)
+    elif isinstance(source, Cylinder):
+        return pi * dim[0]**2 / 4 * dim[1]
+    else:
+        return pi * dim**3 / 6
+
+
+def _radius(source):
+    """
+    Radius of the smallest sphere around a Box, Cylinder or Sphere magnet, centered on it [mm]
+    """
+    dim = asarray(source.dimension, dtype=float64)
+    if isinstance(source, Box):
+        return linalg.norm(dim) / 2
+    elif isinstance(source, Cylinder):
+        return linalg.norm(dim[:2]) / 2
+    else:
+        return dim / 2
+
+
+def _moment(source):
+    """
+    Dipole moment of a Box, Cylinder or Sphere magnet, magnetization times volume in global coordinates [mT*mm3]
+    """
+    R = rotation_matrix(source.angle, source.axis)
+
+    return R @ asarray(source.magnetization, dtype=float64) * _volume(source)
+
+
+def _weight(POS, center, distance):
+    """
+    Weight of the dipole field on (N,3) points POS, 0 up to distance from center, 1 beyond the shell, smooth between,
+    and its gradient [1/mm]
+    """
+    D = POS - center
+    r = linalg.norm(D, axis=1)
+    width = _SHELL * distance
+
+    t = clip((r - distance) / width, 0, 1)
+    s = t * t * (3 - 2 * t)
+
+    ds = 6 * t * (1 - t) / width                     # ds/dr, 0 outside of the shell where r > 0
+    grad_s = ds[:, None] * D / r[:, None].clip(min=distance)
+
+    return s, grad_s
+
+
+class FarField:
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Far field approximation of Box, Cylinder and Sphere magnets, used by all the functions of magforce evaluating B
+    and its jacobian (getB_batch, gradB_batch and everything built on them, getF included) inside a with statement
+
+    Beyond a switching distance from its center, a magnet is replaced by its dipole, of moment magnetization x volume.
+    For these homogeneously magnetized magnets, symmetric through their center, the quadrupole around the center
+    is zero, so the dipole is already the expansion to the quadrupole order, with an error going as (size/distance)^2
+
+    The switching distance of each magnet shape is found once, as the distance beyond which B and its jacobian
+    of the dipole are within error/4 of the exact ones (relative to their norms) in 200 directions around it,
+    for the shape magnetized along each of its axes
+    Dipole and exact fields are blended smoothly over a shell of a quarter of that distance, so that B
+    and its numeric or analytic jacobian stay within error everywhere. Other sources are always evaluated exactly
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param error: float | largest relative error of B and of its jacobian
+
+    ----------
+    ATTRIBUTES
+    ----------
+
+    :attr near: int | number of points where a magnet was evaluated exactly (blended ones included)
+    :attr far: int | number of points where its dipole was used (blended ones included)
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import array, pi
+        >>> from magpylib.source.magnet import Box
+        >>> from magforce import getF_batch
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # a small magnet, evaluated near it and far from it
+        >>> box = Box(mag=[0, 0, 1000], dim=[2, 2, 2])
+        >>> points = array([(0, 0, 3), (0, 0, 40), (30, 0, 30)])
+        >>> exact = getF_batch(points, box, sample)
+        >>> with FarField(error=1e-3) as far:
+        ...     approximate = getF_batch(points, box, sample)
+        >>> far.distance(box) < 40
+        True
+        >>> (abs(approximate - exact) <= 1e-3 * abs(exact).max(axis=1, keepdims=True)).all()
+        True
+    """
+
+    def __init__(self, error=1e-3):
+        self.error = error
+        self.near = 0
+        self.far = 0
+
+        self._distances = {}
+        self._expansions = {}
+        self._previous = []
+
+    def __enter__(self):
+        global _active
+        self._previous.append(_active)
+        _active = self
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = self._previous.pop()
+
+    def expansion(self, source):
+        """
+        Center [mm], dipole moment [mT*mm3] and switching distance [mm] of source, None for sources other than
+        Box, Cylinder and Sphere and for those whose dipole does not reach error
+
+        :return: tuple
+        """
+        if not isinstance(source, (Box, Cylinder, Sphere)):
+            return None
+
+        key = _version(source)
+        if key not in self._expansions:
+            moment = _moment(source)
+            distance = self.distance(source)
+            # without a distance where the dipole is precise enough, the source is always evaluated exactly
+            self._expansions[key] = None if distance == inf else (asarray(source.position, dtype=float64), moment,
+                                                                  distance)
+
+        return self._expansions[key]
+
+    def distance(self, source):
+        """
+        Switching distance of source, found once for each shape (type, dimension and iterDia) [mm],
+        inf when the dipole does not reach error
+
+        :return: float
+        """
+        shape = (type(source), asarray(source.dimension, dtype=float64).tobytes(), getattr(source, 'iterDia', None))
+
+        if shape not in self._distances:
+            self._distances[shape] = self._calibrate(source)
+
+        return self._distances[shape]
+
+    def _calibrate(self, source):
+        """
+        Smallest distance where the dipole is within error/4 of the exact field and jacobian for the shape of source
+        magnetized along each of its axes, doubled from 1.25 times its radius then bisected, inf when it is not
+        reached within 1000 radii
+        """
+        global _active
+
+        radius = _radius(source)
+        target = self.error / 4
+        kwargs = {} if getattr(source, 'iterDia', None) is None else {'iterDia': source.iterDia}
+        magnets = [type(source)(mag=axis, dim=source.dimension, **kwargs) for axis in 1000 * eye(3)]
+
+        def relative_error(distance):
+            return max(self._relative_error(magnet, distance) for magnet in magnets)
+
+        # exact evaluations while calibrating
+        previous, _active = _active, None
+        try:
+            low, high = None, 1.25 * radius
+            while relative_error(high) > target:
+                low, high = high, 2 * high
+                if high > 1000 * radius:
+                    return inf
+
+            if low is not None:
+                for _ in range(8):
+                    middle = sqrt(low * high)
+                    if relative_error(middle) > target:
+                        low = middle
+                    else:
+                        high = middle
+        finally:
+            _active = previous
+
+        return high
+
+    @staticmethod
+    def _relative_error(magnet, distance):
+        """
+        Largest relative difference of B and of its jacobian between the dipole and a magnet centered on the origin
+        and not rotated, at distance of it
+        """
+        from magforce.calculation import getB_batch      # calculation itself uses this module
+
+        moment = _moment(magnet)
+
+        POS = distance * _DIRECTIONS
+        N = len(POS)
+
+        # exact jacobian by central differences, with a step small against distance but far from round off
+        step = 1e-4 * distance
+        offsets = zeros((7, 3))
+        for j in range(3):
+            offsets[1 + 2 * j, j] = -step
+            offsets[2 + 2 * j, j] = step
+        f = getB_batch((offsets[:, None, :] + POS).reshape(-1, 3), magnet).reshape(7, N, 3)
+        B = f[0]
+        dd = ((f[2::2] - f[1::2]) / (2 * step)).transpose(1, 2, 0)
+
+        B_error = linalg.norm(dipole_B(POS, moment) - B, axis=1) / linalg.norm(B, axis=1)
+        dd_error = linalg.norm(gradB_dipole(POS, moment) - dd, axis=(1, 2)) / linalg.norm(dd, axis=(1, 2))
+
+        return max(B_error.max(), dd_error.max())
+
+    @staticmethod
+    def _exact(evaluate, POS, source):
+        """
+        evaluate(POS, source) with the FarField off, for evaluations going through getB_batch again
+        """
+        global _active
+
+        previous, _active = _active, None
+        try:
+            return evaluate(POS, source)
+        finally:
+            _active = previous
+
+    def getB(self, POS, source, evaluate):
+        """
+        Field of source on (N,3) points POS, exact with evaluate(POS, source) near it and from its dipole far from it
+
+        :return: numpy.array (N,3) [mT]
+        """
+        expansion = self.expansion(source)
+        if expansion is None:
+            return evaluate(POS, source)
+
+        center, moment, distance = expansion
+        s, _ = _weight(POS, center, distance)
+        far, near = s > 0, s < 1
+
+        self.far += int(far.sum())
+        self.near += int(near.sum())
+
+        if not far.any():
+            return evaluate(POS, source)
+
+        B = zeros((len(POS), 3))
+        B[far] = s[far, None] * dipole_B(POS[far] - center, moment)
+        if near.any():
+            B[near] += (1 - s[near, None]) * evaluate(POS[near], source)
+
+        return B
+
+    def gradB(self, POS, source, evaluate):
+        """
+        Jacobian and field of source on (N,3) points POS, exact with evaluate(POS, source) near it
+        and from its dipole far from it
+
+        :return: tuple | numpy.array (N,3,3) [mT/mm] and numpy.array (N,3) [mT]
+        """
+        expansion = self.expansion(source)
+        if expansion is None:
+            return self._exact(evaluate, POS, source)
+
+        center, moment, distance = expansion
+        s, grad_s = _weight(POS, center, distance)
+        far, near = s > 0, s < 1
+
+        self.far += int(far.sum())
+        self.near += int(near.sum())
+
+        if not far.any():
+            return self._exact(evaluate, POS, source)
+
+        dd_dipole, B_dipole = zeros((len(POS), 3, 3)), zeros((len(POS), 3))
+        dd_dipole[far], B_dipole[far] = gradB_dipole(POS[far] - center, moment), dipole_B(POS[far] - center, moment)
+
+        dd_exact, B_exact = zeros((len(POS), 3, 3)), zeros((len(POS), 3))
+        if near.any():
+            dd_exact[near], B_exact[near] = self._exact(evaluate, POS[near], source)
+
+        # blend, with the derivative of the weight in the shell
+        B = s[:, None] * B_dipole + (1 - s[:, None]) * B_exact
+        dd = s[:, None, None] * dd_dipole + (1 - s[:, None, None]) * dd_exact
+        dd += (B_dipole - B_exact)[:, :, None] * grad_s[:, None, :]
+
+        return dd, B
@@ -0,0 +1,366 @@
+from datetime import datetime
+from json import dumps, loads
+from os import mkdir, path as os_path
+
+from numpy import array, asarray, hstack, savetxt, savez, savez_compressed, load
+from numpy.lib.format import open_memmap
+
+from magforce.calculation import _sources
+from magforce.frozen import FrozenCollection
+from magforce.memo import _ATTRIBUTES
+from magforce.compute import FieldResult
+from magforce.profiling import stage
+
+
+# units of the stored arrays
+_UNITS = {'positions': 'mm', 'B': 'mT', 'F': 'N'}
+
+
+def _format(filename, format):
+    """
+    Output format given, or deduced from the extension of filename: 'npz', 'hdf5' or 'npy'
+    """
+    if format is None:
+        extension = os_path.splitext(filename)[1].lower()
+        format = {'.npz': 'npz', '.h5': 'hdf5', '.hdf5': 'hdf5', '.npy': 'npy', '': 'npy'}.get(extension)
+
+    if format not in ('npz', 'hdf5', 'npy'):
+        raise ValueError(f"format must be 'npz', 'hdf5' or 'npy', not {format!r}")
+
+    return format
+
+
+def _describe(collection):
+    """
+    Provenance of a collection: type and parameters of each of its sources
+    """
+    sources = []
+    for source in _sources(collection):
+        if isinstance(source, FrozenCollection):
+            sources.extend(source.describe())
+            continue
+
+        description = {'type': type(source).__name__}
+        for attribute in _ATTRIBUTES:
+            if hasattr(source, attribute):
+                description[attribute] = asarray(getattr(source, attribute)).tolist()
+        sources.append(description)
+
+    return sources
+
+
+def _metadata(result, collections, sample):
+    """
+    Units, arrangement and provenance of a FieldResult, as a dict that can be written in JSON
+    """
+    names = list(result.B) or list(result.F)
+
+    metadata = {'units': _UNITS,
+                'kind': result.kind,
+                'axis': result.axis,
+                'axes': {key: asarray(values).tolist() for key, values in result.axes.items()},
+                'shape': list(result.shape),
+                'collections': names,
+                'BF': ('B' if result.B else '') + ('F' if result.F else ''),
+                'created': str(datetime.now())}
+
+    if collections is not None:
+        metadata['sources'] = {name: _describe(collections[name]) for name in names}
+    if sample is not None:
+        metadata['sample'] = {key: float(value) for key, value in sample.items()}
+
+    return metadata
+
+
+def _datasets(result):
+    """
+    Arrays of a FieldResult by dataset name: positions, then B_i and F_i for the i-th collection
+    """
+    names = list(result.B) or list(result.F)
+
+    datasets = {'positions': result.positions}
+    for quantity, fields in (('B', result.B), ('F', result.F)):
+        for i, name in enumerate(names):
+            if name in fields:
+                datasets[f'{quantity}_{i}'] = fields[name]
+
+    return datasets
+
+
+@stage('export')
+def save_result(result, filename, format=None, dtype='float64', collections=None, sample=None, compression=True):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Saves the positions, B and F of a FieldResult as binary float arrays, with units and provenance as metadata
+    much smaller and faster to write and read than the CSV files of the plot functions
+
+    Formats:
+        'npz': one numpy .npz file, compressed when compression is True
+        'hdf5': one HDF5 file, datasets chunked and gzip compressed when compression is True (needs h5py)
+        'npy': a directory of .npy files, one per array, and metadata.json, to be loaded as memory-mapped arrays
+
+    Datasets are named positions, B_0, F_0, B_1, F_1, ... in the order of the collections,
+    whose names are kept in the metadata
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param result: FieldResult | results of compute_line, compute_plane or compute_volume
+    :param filename: str | file to write, or directory for 'npy'
+    :param format: str | 'npz', 'hdf5' or 'npy', None to deduce it from the extension (.npz, .h5/.hdf5, .npy or none)
+    :param dtype: str | 'float64' or 'float32' for the stored arrays
+    :param collections: dict | the collections of the result, to keep their sources as provenance
+    :param sample: dict | the sample of the result, kept as provenance
+    :param compression: bool | True to compress npz and hdf5 files
+    :return: str | filename
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from os import path
+        >>> from tempfile import mkdtemp
+        >>> from numpy import linspace, pi
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magforce.compute import compute_plane
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # calculation and saving
+        >>> collections = {'z-20': Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])}
+        >>> result = compute_plane('x', 0, linspace(-10, 10, 5), linspace(-5, 5, 3), collections, sample)
+        >>> filename = save_result(result, path.join(mkdtemp(), 'plane.npz'), collections=collections, sample=sample)
+
+    # loading
+        >>> loaded = load_result(filename)
+        >>> (loaded.F['z-20'] == result.F['z-20']).all(), loaded.shape
+        (True, (3, 5))
+        >>> loaded.metadata['units'], loaded.metadata['sources']['z-20'][0]['type']
+        ({'positions': 'mm', 'B': 'mT', 'F': 'N'}, 'Cylinder')
+    """
+    format = _format(filename, format)
+
+    metadata = _metadata(result, collections, sample)
+    metadata['dtype'] = dtype
+    datasets = {key: asarray(values, dtype=dtype) for key, values in _datasets(result).items()}
+
+    if format == 'npz':
+        save = savez_compressed if compression else savez
+        save(filename, metadata=array(dumps(metadata)), **datasets)
+
+    elif format == 'hdf5':
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError("saving in HDF5 needs h5py, installed with 'pip install h5py'")
+
+        with h5py.File(filename, 'w') as file:
+            file.attrs['metadata'] = dumps(metadata)
+            for key, values in datasets.items():
+                file.create_dataset(key, data=values, chunks=(min(len(values), 65536), 3) if len(values) else None,
+                                    compression='gzip' if compression else None)
+                file[key].attrs['units'] = _UNITS[key.split('_')[0]]
+
+    else:
+        try:
+            mkdir(filename)
+        except FileExistsError:
+            pass
+
+        with open(os_path.join(filename, 'metadata.json'), 'w') as file:
+            file.write(dumps(metadata))
+
+        for key, values in datasets.items():
+            stored = open_memmap(os_path.join(filename, f'{key}.npy'), mode='w+', dtype=dtype, shape=values.shape)
+            stored[:] = values
+            stored.flush()
+            del stored
+
+    return filename
+
+
+def load_result(filename, format=None, mmap=True):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Loads a FieldResult saved by save_result, its metadata (units, provenance, ...) in the attribute metadata
+    arrays of the 'npy' format are memory-mapped read only when mmap is True, the other formats are read in memory
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param filename: str | file, or directory for 'npy'
+    :param format: str | 'npz', 'hdf5' or 'npy', None to deduce it from the extension
+    :param mmap: bool | True to memory map the arrays of the 'npy' format
+    :return: FieldResult
+
+    -------
+    EXAMPLE
+    -------
+
+    see save_result
+    """
+    format = _format(filename, format)
+
+    if format == 'npz':
+        with load(filename) as file:
+            metadata = loads(str(file['metadata']))
+            datasets = {key: file[key] for key in file.files if key != 'metadata'}
+
+    elif format == 'hdf5':
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError("loading HDF5 files needs h5py, installed with 'pip install h5py'")
+
+        with h5py.File(filename, 'r') as file:
+            metadata = loads(file.attrs['metadata'])
+            datasets = {key: file[key][()] for key in file.keys()}
+
+    else:
+        with open(os_path.join(filename, 'metadata.json')) as file:
+            metadata = loads(file.read())
+
+        keys = ['positions'] + [f'{quantity}_{i}' for quantity in metadata['BF']
+                                for i in range(len(metadata['collections']))]
+        datasets = {key: load(os_path.join(filename, f'{key}.npy'), mmap_mode='r' if mmap else None) for key in keys}
+
+    names = metadata['collections']
+    fields = {quantity: {name: datasets[f'{quantity}_{i}'] for i, name in enumerate(names)
+                         if f'{quantity}_{i}' in datasets} for quantity in 'BF'}
+
+    result = FieldResult(metadata['kind'], metadata['axis'],
+                         {key: array(values) for key, values in metadata['axes'].items()},
+                         tuple(metadata['shape']), datasets['positions'], fields['B'], fields['F'])
+    result.metadata = metadata
+
+    return result
+
+
+class CSVWriter:
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Writes positions, B and F in the semicolon separated CSV layout of the plot functions, row by row
+    from numeric arrays: a '# title | date' line, a line of column titles (x, y, z, then Bx name, By name, Bz name,
+    Fx name, Fy name, Fz name for each collection), a line of units, then one line per point
+
+    Rows are formatted chunk by chunk from the float arrays, without building a matrix of strings,
+    and the file is flushed after each write, so that memory stays flat and an interrupted run leaves
+    the rows written so far. The default format '%.9g' writes 9 significant digits, shorter and faster to write
+    than the full repr of the floats ('%s'), which the plot functions wrote before
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param filename: str | CSV file to write
+    :param title: str | title of the first line, like 'Simulation 3D'
+    :param names: list | names of the collections, in the order of the columns
+    :param BF: str | 'B' for B columns; 'F' for F columns; 'BF' for both
+    :param fmt: str | format of the values
+    :param chunk_size: int | number of rows formatted at once
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from os import path
+        >>> from tempfile import mkdtemp
+        >>> from numpy import linspace, pi
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magforce.compute import compute_volume_chunks
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # streaming a grid into the CSV file, block by block
+        >>> collections = {'z-20': Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])}
+        >>> grid = linspace(-5, 5, 20), linspace(-5, 5, 20), linspace(0, 5, 20)
+        >>> filename = path.join(mkdtemp(), 'BF_3D.csv')
+        >>> with CSVWriter(filename, 'Simulation 3D', collections.keys(), 'BF') as writer:
+        ...     for positions, B, F in compute_volume_chunks(*grid, collections, sample, chunk_size=1000):
+        ...         writer.write(positions, B, F)
+        >>> with open(filename) as file:
+        ...     lines = file.readlines()
+        >>> len(lines), lines[1]
+        (8003, 'x;y;z;Bx z-20;By z-20;Bz z-20;Fx z-20;Fy z-20;Fz z-20\\n')
+    """
+
+    def __init__(self, filename, title, names, BF='BF', fmt='%.9g', chunk_size=65536):
+        self.names = list(names)
+        self.BF = BF.upper()
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+
+        titles, units = ['x', 'y', 'z'], ['[mm]', '[mm]', '[mm]']
+        for name in self.names:
+            if 'B' in self.BF:
+                titles += [f'Bx {name}', f'By {name}', f'Bz {name}']
+                units += ['[mT]', '[mT]', '[mT]']
+            if 'F' in self.BF:
+                titles += [f'Fx {name}', f'Fy {name}', f'Fz {name}']
+                units += ['[N]', '[N]', '[N]']
+
+        self.file = open(filename, 'w')
+        self.file.write(f'# {title} | {datetime.now()}\n')
+        self.file.write(';'.join(titles) + '\n')
+        self.file.write(';'.join(units) + '\n')
+        self.file.flush()
+
+    @stage('export')
+    def write(self, positions, B={}, F={}):
+        """
+        Appends the rows of N points
+
+        :param positions: numpy.array (N,3) [mm]
+        :param B: dict | {'name': numpy.array (N,3) [mT]}, when B columns are written
+        :param F: dict | {'name': numpy.array (N,3) [N]}, when F columns are written
+        """
+        arrays = [positions]
+        for name in self.names:
+            if 'B' in self.BF:
+                arrays.append(B[name])
+            if 'F' in self.BF:
+                arrays.append(F[name])
+
+        for start in range(0, len(positions), self.chunk_size):
+            rows = hstack([asarray(values)[start:start + self.chunk_size] for values in arrays])
+            savetxt(self.file, rows, fmt=self.fmt, delimiter=';')
+
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+def csv_output(filename, dirname='CSV_output'):
+    """
+    Path of filename in the CSV output directory of the plot functions, created if needed
+    """
+    try:
+        # Create target Directory
+        mkdir(dirname)
+        print(f"Directory {dirname} created, saving CSV file there")
+    except FileExistsError:
+        print(f"Directory {dirname} already exists, saving CSV file there")
+
+    return os_path.join(dirname, filename)
@@ -0,0 +1,313 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from os import cpu_count
+from weakref import finalize
+
+from numpy import asarray, ndarray, prod, diff, abs, float64
+
+from magforce.calculation import getB_collections, getF_collections, getF_grid_collections
+
+
+# payload (collections, sample, ...) of the worker processes, set once per worker by _set_payload
+_payload = None
+
+
+def _set_payload(payload):
+    """
+    Initializer of the worker processes: keeps the payload shipped once per worker
+    """
+    global _payload
+    _payload = payload
+
+
+def _call(function, *task):
+    """
+    Runs function(payload, *task) in a worker with the payload it received at start
+    """
+    return function(_payload, *task)
+
+
+def _call_with(payload, function, *task):
+    """
+    Runs function(payload, *task) in a worker of an executor given by the user, the payload coming with the task
+    """
+    return function(payload, *task)
+
+
+def _workers(n_jobs):
+    """
+    Number of worker processes for n_jobs: None or -1 for all the cores, -2 for all but one, ...
+    """
+    cores = cpu_count() or 1
+
+    if n_jobs is None:
+        return cores
+    if n_jobs < 0:
+        return max(1, cores + 1 + n_jobs)
+    return max(1, n_jobs)
+
+
+def _chunks(N, workers, chunk_size=None):
+    """
+    Slices splitting N points in chunks, 4 per worker by default to balance the load
+    """
+    if chunk_size is None:
+        chunk_size = max(1, -(-N // (4 * workers)))
+
+    return [slice(start, min(start + chunk_size, N)) for start in range(0, N, chunk_size)]
+
+
+def _shared_empty(shape):
+    """
+    Allocates an array of float in a new shared memory block, returns the array and the block
+    the block is closed when the array (and so all its views) is garbage collected, the caller unlinking it
+    once the workers are done
+    """
+    from multiprocessing.shared_memory import SharedMemory
+
+    block = SharedMemory(create=True, size=max(8, int(prod(shape)) * 8))
+    array = ndarray(shape, dtype=float64, buffer=block.buf)
+    finalize(array, block.close)
+
+    return array, block
+
+
+def _attach(name, shape):
+    """
+    Attaches a worker to the shared memory block name of the parent, returns the array and the block
+    """
+    from multiprocessing.shared_memory import SharedMemory
+
+    block = SharedMemory(name=name)
+
+    return ndarray(shape, dtype=float64, buffer=block.buf), block
+
+
+def _map(function, payload, tasks, n_jobs=None, executor=None):
+    """
+    Runs function(payload, *task) for each task on worker processes and yields (task, result) as they complete
+    with its own ProcessPoolExecutor the payload is shipped once per worker, with the executor given by the user
+    it is shipped with each task
+    """
+    if executor is not None:
+        futures = {executor.submit(_call_with, payload, function, *task): task for task in tasks}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+        return
+
+    with ProcessPoolExecutor(max_workers=_workers(n_jobs), initializer=_set_payload, initargs=(payload,)) as pool:
+        futures = {pool.submit(_call, function, *task): task for task in tasks}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def _evaluate_chunk(payload, chunk):
+    """
+    B and F of all collections on a chunk of the points, read from and written into the shared buffer
+    buffer[0] holds the points, then B and F of each collection
+    """
+    collections, sample, BF, gradient, name, shape = payload
+
+    buffer, block = _attach(name, shape)
+    try:
+        POS = buffer[0, chunk].copy()
+        k = 1
+
+        B_fields = None
+        if 'B' in BF:
+            B_fields = getB_collections(POS, collections)
+            for B in B_fields.values():
+                buffer[k, chunk] = B
+                k += 1
+
+        if 'F' in BF:
+            # from B calculated above when there is
+            for F in getF_collections(POS, collections, sample, gradient, B_fields).values():
+                buffer[k, chunk] = F
+                k += 1
+    finally:
+        del buffer
+        block.close()
+
+
+def getBF_parallel(points, collections, sample={}, BF='BF', gradient='numeric', n_jobs=None, executor=None,
+                   chunk_size=None):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets B and F of several collections of magnets on N points, like getB_collections and getF_collections,
+    the points being split in chunks evaluated on worker processes
+
+    By default a concurrent.futures.ProcessPoolExecutor with n_jobs workers is created, the collections and sample
+    being sent once to each worker. With an executor given instead (any concurrent.futures.Executor),
+    they are sent with each chunk
+
+    The points and the results are held in one block of shared memory (multiprocessing.shared_memory):
+    workers read their chunk of points there and write their results in place, nothing being sent back,
+    and the returned arrays are views of that block, without copy. An executor given needs to run on this machine
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param points: numpy.array (N,3) [mm]
+    :param collections: dict | the magnets setups arranged like {'name':magpylib.Collection}
+    :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
+    :param BF: str | 'B' to calculate B; 'F' to calculate F; 'BF' for both
+    :param gradient: str | 'numeric' or 'analytic' (see gradB_batch)
+    :param n_jobs: int | number of worker processes, None or -1 for all the cores, -2 for all but one, ...
+    :param executor: concurrent.futures.Executor | executor to use instead of creating one
+    :param chunk_size: int | number of points of each chunk, by default the points are split in 4 chunks per worker
+    :return: tuple | dicts {'name': numpy.array (N,3)} of B [mT] and of F [N], empty when not asked
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import linspace, pi, stack, zeros_like
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magforce import getF_collections
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # calculation on 2 processes
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> zs = linspace(-5, 5, 101)
+        >>> points = stack((zeros_like(zs), zeros_like(zs), zs), axis=1)
+        >>> B, F = getBF_parallel(points, {'z-20': m1}, sample, n_jobs=2)
+        >>> (F['z-20'] == getF_collections(points, {'z-20': m1}, sample)['z-20']).all()
+        True
+    """
+    POS = asarray(points, dtype=float64).reshape(-1, 3)
+    N = len(POS)
+
+    # pass BF to uppercase to avoid BF='bf' not returning anything
+    BF = BF.upper()
+
+    # one shared buffer for the points and the results: points, B of each collection, F of each collection
+    names = list(collections)
+    quantities = [quantity for quantity in 'BF' if quantity in BF]
+    shape = (1 + len(quantities) * len(names), N, 3)
+    buffer, block = _shared_empty(shape)
+
+    try:
+        buffer[0] = POS
+
+        payload = (collections, sample, BF, gradient, block.name, shape)
+        tasks = [(chunk,) for chunk in _chunks(N, _workers(n_jobs), chunk_size)]
+        # the workers write their results in place
+        for _ in _map(_evaluate_chunk, payload, tasks, n_jobs, executor):
+            pass
+    finally:
+        block.unlink()
+
+    # views of the buffer, without copy
+    fields = {quantity: {name: buffer[1 + q * len(names) + k] for k, name in enumerate(names)}
+              for q, quantity in enumerate(quantities)}
+    B_fields, F_fields = fields.get('B', {}), fields.get('F', {})
+
+    return B_fields, F_fields
+
+
+def _evaluate_slab(payload, axes, keep, chunk):
+    """
+    F of all collections on a slab of a grid, given with one neighbouring plane on each side when there is one,
+    keep being the slice of the slab without those planes and chunk its place in the grid along the split axis
+    F of each collection is written into the shared buffer
+    """
+    collections, sample, axis, step, name, shape = payload
+
+    F_grids = getF_grid_collections(*axes, collections, sample, step)
+
+    index, target = [slice(None)] * 3, [slice(None)] * 3
+    index[axis], target[axis] = keep, chunk
+
+    buffer, block = _attach(name, shape)
+    try:
+        for k, F in enumerate(F_grids.values()):
+            buffer[(k,) + tuple(target)] = F[tuple(index)]
+    finally:
+        del buffer
+        block.close()
+
+
+def getF_grid_parallel(xs, ys, zs, collections, sample, n_jobs=None, executor=None):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Gets F of several collections of magnets on all the points of a grid, like getF_grid_collections,
+    the grid being split in slabs along its longest axis evaluated on worker processes
+    each slab is evaluated with its neighbouring planes, so that the differences of numpy.gradient are the same
+    as on the whole grid
+    workers write F into shared memory and the returned arrays are views of it, like getBF_parallel
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param xs: numpy.array | x values of the grid [mm]
+    :param ys: numpy.array | y values of the grid [mm]
+    :param zs: numpy.array | z values of the grid [mm]
+    :param collections: dict | the magnets setups arranged like {'name':magpylib.Collection}
+    :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
+    :param n_jobs: int | number of worker processes, None or -1 for all the cores, -2 for all but one, ...
+    :param executor: concurrent.futures.Executor | executor to use instead of creating one
+    :return: dict | {'name': numpy.array (len(xs),len(ys),len(zs),3) [N]}
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import linspace, pi
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magforce import getF_grid_collections
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # calculation on 2 processes
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> xs, ys, zs = linspace(-5, 5, 11), linspace(-5, 5, 11), linspace(-1, 1, 21)
+        >>> F = getF_grid_parallel(xs, ys, zs, {'z-20': m1}, sample, n_jobs=2)
+        >>> abs(F['z-20'] - getF_grid_collections(xs, ys, zs, {'z-20': m1}, sample)['z-20']).max() < 1e-12
+        True
+    """
+    axes = [asarray(values, dtype=float64).ravel() for values in (xs, ys, zs)]
+    axis = max(range(3), key=lambda i: len(axes[i]))
+    n = len(axes[axis])
+
+    # shared buffer of the results, F of each collection
+    names = list(collections)
+    shape = (len(names),) + tuple(len(values) for values in axes) + (3,)
+    buffer, block = _shared_empty(shape)
+
+    tasks = []
+    for chunk in _chunks(n, _workers(n_jobs)):
+        # slab with one neighbouring plane on each side
+        start, stop = max(chunk.start - 1, 0), min(chunk.stop + 1, n)
+        slab_axes = list(axes)
+        slab_axes[axis] = axes[axis][start:stop]
+        tasks.append((slab_axes, slice(chunk.start - start, chunk.stop - start), chunk))
+
+    # step of the halo of axes of a single value, from the whole grid as slabs have other steps
+    steps = [abs(diff(values)).min() for values in axes if len(values) > 1]
+    step = min(steps) if steps else None
+
+    try:
+        payload = (collections, sample, axis, step, block.name, shape)
+        # the workers write their results in place
+        for _ in _map(_evaluate_slab, payload, tasks, n_jobs, executor):
+            pass
+    finally:
+        block.unlink()
+
+    # views of the buffer, without copy
+    F_fields = {name: buffer[k] for k, name in enumerate(names)}
+
+    return F_fields
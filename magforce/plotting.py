@@ -1,15 +1,17 @@
-from numpy import array, savetxt, vstack, hstack, round
+from numpy import array, asarray, round, concatenate, zeros, float64
 from matplotlib.pyplot import figure, show
 from mpl_toolkits.mplot3d import axes3d
-from datetime import datetime
-from os import mkdir
 
-from magforce import normalize, getF
+from magforce.calculation import normalize
+from magforce.compute import FieldResult, compute_line, compute_plane, compute_volume, compute_volume_chunks
+from magforce.output import save_result, CSVWriter, csv_output
+from magforce.profiling import stage
 
 
 # functions for plotting 1D
 
-def plot_1D_along_x(xs=array([]), y=0, z=0, collections={}, sample={}, BF='BF', saveCSV=False, showim=False):
+@stage('render')
+def plot_1D_along_x(xs=array([]), y=0, z=0, collections={}, sample={}, BF='BF', saveCSV=False, showim=False, *, n_jobs=1, executor=None, output=None, cache=None, axisymmetric=False):
     """
     -----------
     DESCRIPTION
@@ -30,6 +32,14 @@ def plot_1D_along_x(xs=array([]), y=0, z=0, collections={}, sample={}, BF='BF',
     :param BF: str | 'B' to plot Bx, By, Bz; 'F' to plot Fx, Fy, Fz; 'BF' for both
     :param saveCSV: bool | True for saving a CSV file with the data generated by the function
     :param showim: bool | True to show images after calculation, False to call yourself show() afterwards in the code
+    :param n_jobs: int | number of worker processes, 1 to calculate in this process, -1 for all the cores
+    :param executor: concurrent.futures.Executor | executor to calculate with, instead of n_jobs
+    :param output: str | file to save positions, B and F in as floats: .npz, .h5 (needs h5py) or .npy directory,
+                   see save_result
+    :param cache: DiskCache | cache to load the results from, or to store them in when they are not there yet
+    :param axisymmetric: bool | False to calculate every point, None to calculate once for each distinct (r, z)
+                         of the points and rotate back when all magnets are Cylinder magnetized along one axis
+                         parallel to z (see compute_line), True to require it. F then differs slightly (about 1e-6 N)
     :return: plots matplotlib graphs. show() needs to be called manually
 
     -------
@@ -77,15 +87,21 @@ def plot_1D_along_x(xs=array([]), y=0, z=0, collections={}, sample={}, BF='BF',
         ...                 showim=True)
     """
 
-    # generate points for B and F calculation
-    POS = array([(x, y, z) for x in xs])
+    # calculate B and F of all collections, points being generated by compute_line
+    result = compute_line('x', xs, (0, y, z), collections, sample, BF, axisymmetric=axisymmetric, n_jobs=n_jobs,
+                          executor=executor, cache=cache)
+    POS = result.positions
+
+    # save positions, B and F in a binary file
+    if output is not None:
+        save_result(result, output, collections=collections, sample=sample)
 
     # pass BF to uppercase to avoid BF='bf' not returning anything
     BF = BF.upper()
 
-    # dictionary to store all the calculated values that will generate the CSV file afterwards
+    # dictionaries of the calculated values that will be written in the CSV file afterwards
     if saveCSV:
-        CSVs = {key:[] for key in collections.keys()}
+        CSV_B, CSV_F = {}, {}
 
     # if user wants plotting of B
     if 'B' in BF:
@@ -108,7 +124,7 @@ def plot_1D_along_x(xs=array([]), y=0, z=0, collections={}, sample={}, BF='BF',
             name, collection = pair
 
             # calculate B in mT
-            B_field = array([collection.getB(pos) for pos in POS])
+            B_field = result.B[name]
 
             # split B into lists of Bx, By, Bz
             Bx = B_field[:, 0]
@@ -153,10 +169,7 @@ def plot_1D_along_x(xs=array([]), y=0, z=0, collections={}, sample={}, BF='BF',
 
             # adding data to CSV
             if saveCSV:
-                B_titles = array([[f'Bx {name}', f'By {name}', f'Bz {name}'],
-                                  ['[mT]', '[mT]', '[mT]']])
-                B_titled = vstack((B_titles, B_field))
-                CSVs[name].append(B_titled)
+                CSV_B[name] = B_field
 
     # if user wants plotting of F
     if 'F' in BF:
@@ -178,7 +191,7 @@ def plot_1D_along_x(xs=array([]), y=0, z=0, collections={}, sample={}, BF='BF',
         for i, pair in enumerate(collections.items()):
             name, collection = pair
             # calculate F in N
-            F_field = array([getF(pos, collection, sample) for pos in POS])
+            F_field = result.F[name]
 
             # split F into lists of Fx, Fy, Fz
             Fx = F_field[:, 0]
@@ -223,39 +236,19 @@ def plot_1D_along_x(xs=array([]), y=0, z=0, collections={}, sample={}, BF='BF',
 
             # adding data to CSV
             if saveCSV:
-                F_titles = array([[f'Fx {name}', f'Fy {name}', f'Fz {name}'],
-                                  ['[N]', '[N]', '[N]']])
-                F_titled = vstack((F_titles, F_field))
-                CSVs[name].append(F_titled)
+                CSV_F[name] = F_field
 
     if saveCSV:
-        dirname = "CSV_output"
-        try:
-            # Create target Directory
-            mkdir(dirname)
-            print(f"Directory {dirname} created, saving CSV file there")
-        except FileExistsError:
-            print(f"Directory {dirname} already exists, saving CSV file there")
-
-        # prepare CSV data with POS
-        POS_titles = array([['x', 'y', 'z'],
-                            ['[mm]', '[mm]', '[mm]']])
-        POS_titled = vstack((POS_titles, POS))
-        CSV_data = [POS_titled]
-
-        # append other data
-        for arr in list(CSVs.values()):
-            CSV_data.append(hstack(arr))
-
-        # save it
-        header = f'Simulation 1D along x | {datetime.now()}'
-        savetxt(f'CSV_output/{BF}_1D_along_x.csv', hstack(CSV_data), delimiter=';', fmt='%s', header=header)
+        # rows written from the numeric arrays, chunk by chunk
+        with CSVWriter(csv_output(f'{BF}_1D_along_x.csv'), 'Simulation 1D along x', collections.keys(), BF) as writer:
+            writer.write(POS, CSV_B, CSV_F)
 
     if showim:
         show()
 
 
-def plot_1D_along_y(x=0, ys=array([]), z=0, collections={}, sample={}, BF='BF', saveCSV=False, showim=False):
+@stage('render')
+def plot_1D_along_y(x=0, ys=array([]), z=0, collections={}, sample={}, BF='BF', saveCSV=False, showim=False, *, n_jobs=1, executor=None, output=None, cache=None, axisymmetric=False):
     """
     -----------
     DESCRIPTION
@@ -276,6 +269,14 @@ def plot_1D_along_y(x=0, ys=array([]), z=0, collections={}, sample={}, BF='BF',
     :param BF: str | 'B' to plot Bx, By, Bz; 'F' to plot Fx, Fy, Fz; 'BF' for both
     :param saveCSV: bool | True for saving a CSV file with the data generated by the function
     :param showim: bool | True to show images after calculation, False to call yourself show() afterwards in the code
+    :param n_jobs: int | number of worker processes, 1 to calculate in this process, -1 for all the cores
+    :param executor: concurrent.futures.Executor | executor to calculate with, instead of n_jobs
+    :param output: str | file to save positions, B and F in as floats: .npz, .h5 (needs h5py) or .npy directory,
+                   see save_result
+    :param cache: DiskCache | cache to load the results from, or to store them in when they are not there yet
+    :param axisymmetric: bool | False to calculate every point, None to calculate once for each distinct (r, z)
+                         of the points and rotate back when all magnets are Cylinder magnetized along one axis
+                         parallel to z (see compute_line), True to require it. F then differs slightly (about 1e-6 N)
     :return: plots matplotlib graphs. show() needs to be called manually
 
     -------
@@ -323,15 +324,21 @@ def plot_1D_along_y(x=0, ys=array([]), z=0, collections={}, sample={}, BF='BF',
         ...                 showim=True)
     """
 
-    # generate points for B and F calculation
-    POS = array([(x, y, z) for y in ys])
+    # calculate B and F of all collections, points being generated by compute_line
+    result = compute_line('y', ys, (x, 0, z), collections, sample, BF, axisymmetric=axisymmetric, n_jobs=n_jobs,
+                          executor=executor, cache=cache)
+    POS = result.positions
+
+    # save positions, B and F in a binary file
+    if output is not None:
+        save_result(result, output, collections=collections, sample=sample)
 
     # pass BF to uppercase to avoid BF='bf' not returning anything
     BF = BF.upper()
 
-    # dictionary to store all the calculated values that will generate the CSV file afterwards
+    # dictionaries of the calculated values that will be written in the CSV file afterwards
     if saveCSV:
-        CSVs = {key:[] for key in collections.keys()}
+        CSV_B, CSV_F = {}, {}
 
     # if user wants plotting of B
     if 'B' in BF:
@@ -354,7 +361,7 @@ def plot_1D_along_y(x=0, ys=array([]), z=0, collections={}, sample={}, BF='BF',
             name, collection = pair
 
             # calculate B in mT
-            B_field = array([collection.getB(pos) for pos in POS])
+            B_field = result.B[name]
 
             # split B into lists of Bx, By, Bz
             Bx = B_field[:, 0]
@@ -399,10 +406,7 @@ def plot_1D_along_y(x=0, ys=array([]), z=0, collections={}, sample={}, BF='BF',
 
             # adding data to CSV
             if saveCSV:
-                B_titles = array([[f'Bx {name}', f'By {name}', f'Bz {name}'],
-                                  ['[mT]', '[mT]', '[mT]']])
-                B_titled = vstack((B_titles, B_field))
-                CSVs[name].append(B_titled)
+                CSV_B[name] = B_field
 
     # if user wants plotting of F
     if 'F' in BF:
@@ -424,7 +428,7 @@ def plot_1D_along_y(x=0, ys=array([]), z=0, collections={}, sample={}, BF='BF',
         for i, pair in enumerate(collections.items()):
             name, collection = pair
             # calculate F in N
-            F_field = array([getF(pos, collection, sample) for pos in POS])
+            F_field = result.F[name]
 
             # split F into lists of Fx, Fy, Fz
             Fx = F_field[:, 0]
@@ -469,39 +473,19 @@ def plot_1D_along_y(x=0, ys=array([]), z=0, collections={}, sample={}, BF='BF',
 
             # adding data to CSV
             if saveCSV:
-                F_titles = array([[f'Fx {name}', f'Fy {name}', f'Fz {name}'],
-                                  ['[N]', '[N]', '[N]']])
-                F_titled = vstack((F_titles, F_field))
-                CSVs[name].append(F_titled)
+                CSV_F[name] = F_field
 
     if saveCSV:
-        dirname = "CSV_output"
-        try:
-            # Create target Directory
-            mkdir(dirname)
-            print(f"Directory {dirname} created, saving CSV file there")
-        except FileExistsError:
-            print(f"Directory {dirname} already exists, saving CSV file there")
-
-        # prepare CSV data with POS
-        POS_titles = array([['x', 'y', 'z'],
-                            ['[mm]', '[mm]', '[mm]']])
-        POS_titled = vstack((POS_titles, POS))
-        CSV_data = [POS_titled]
-
-        # append other data
-        for arr in list(CSVs.values()):
-            CSV_data.append(hstack(arr))
-
-        # save it
-        header = f'Simulation 1D along y | {datetime.now()}'
-        savetxt(f'CSV_output/{BF}_1D_along_y.csv', hstack(CSV_data), delimiter=';', fmt='%s', header=header)
+        # rows written from the numeric arrays, chunk by chunk
+        with CSVWriter(csv_output(f'{BF}_1D_along_y.csv'), 'Simulation 1D along y', collections.keys(), BF) as writer:
+            writer.write(POS, CSV_B, CSV_F)
 
     if showim:
         show()
 
 
-def plot_1D_along_z(x=0, y=0, zs=array([]), collections={}, sample={}, BF='BF', saveCSV=False, showim=False):
+@stage('render')
+def plot_1D_along_z(x=0, y=0, zs=array([]), collections={}, sample={}, BF='BF', saveCSV=False, showim=False, *, n_jobs=1, executor=None, output=None, cache=None, axisymmetric=False):
     """
     -----------
     DESCRIPTION
@@ -522,6 +506,14 @@ def plot_1D_along_z(x=0, y=0, zs=array([]), collections={}, sample={}, BF='BF',
     :param BF: str | 'B' to plot Bx, By, Bz; 'F' to plot Fx, Fy, Fz; 'BF' for both
     :param saveCSV: bool | True for saving a CSV file with the data generated by the function
     :param showim: bool | True to show images after calculation, False to call yourself show() afterwards in the code
+    :param n_jobs: int | number of worker processes, 1 to calculate in this process, -1 for all the cores
+    :param executor: concurrent.futures.Executor | executor to calculate with, instead of n_jobs
+    :param output: str | file to save positions, B and F in as floats: .npz, .h5 (needs h5py) or .npy directory,
+                   see save_result
+    :param cache: DiskCache | cache to load the results from, or to store them in when they are not there yet
+    :param axisymmetric: bool | False to calculate every point, None to calculate once for each distinct (r, z)
+                         of the points and rotate back when all magnets are Cylinder magnetized along one axis
+                         parallel to z (see compute_line), True to require it. F then differs slightly (about 1e-6 N)
     :return: plots matplotlib graphs. show() needs to be called manually
 
     -------
@@ -569,15 +561,21 @@ def plot_1D_along_z(x=0, y=0, zs=array([]), collections={}, sample={}, BF='BF',
         ...                 showim=True)
     """
 
-    # generate points for B and F calculation
-    POS = array([(x, y, z) for z in zs])
+    # calculate B and F of all collections, points being generated by compute_line
+    result = compute_line('z', zs, (x, y, 0), collections, sample, BF, axisymmetric=axisymmetric, n_jobs=n_jobs,
+                          executor=executor, cache=cache)
+    POS = result.positions
+
+    # save positions, B and F in a binary file
+    if output is not None:
+        save_result(result, output, collections=collections, sample=sample)
 
     # pass BF to uppercase to avoid BF='bf' not returning anything
     BF = BF.upper()
 
-    # dictionary to store all the calculated values that will generate the CSV file afterwards
+    # dictionaries of the calculated values that will be written in the CSV file afterwards
     if saveCSV:
-        CSVs = {key:[] for key in collections.keys()}
+        CSV_B, CSV_F = {}, {}
 
     # if user wants plotting of B
     if 'B' in BF:
@@ -600,7 +598,7 @@ def plot_1D_along_z(x=0, y=0, zs=array([]), collections={}, sample={}, BF='BF',
             name, collection = pair
 
             # calculate B in mT
-            B_field = array([collection.getB(pos) for pos in POS])
+            B_field = result.B[name]
 
             # split B into lists of Bx, By, Bz
             Bx = B_field[:, 0]
@@ -645,10 +643,7 @@ def plot_1D_along_z(x=0, y=0, zs=array([]), collections={}, sample={}, BF='BF',
 
             # adding data to CSV
             if saveCSV:
-                B_titles = array([[f'Bx {name}', f'By {name}', f'Bz {name}'],
-                                  ['[mT]', '[mT]', '[mT]']])
-                B_titled = vstack((B_titles, B_field))
-                CSVs[name].append(B_titled)
+                CSV_B[name] = B_field
 
     # if user wants plotting of F
     if 'F' in BF:
@@ -670,7 +665,7 @@ def plot_1D_along_z(x=0, y=0, zs=array([]), collections={}, sample={}, BF='BF',
         for i, pair in enumerate(collections.items()):
             name, collection = pair
             # calculate F in N
-            F_field = array([getF(pos, collection, sample) for pos in POS])
+            F_field = result.F[name]
 
             # split F into lists of Fx, Fy, Fz
             Fx = F_field[:, 0]
@@ -715,33 +710,12 @@ def plot_1D_along_z(x=0, y=0, zs=array([]), collections={}, sample={}, BF='BF',
 
             # adding data to CSV
             if saveCSV:
-                F_titles = array([[f'Fx {name}', f'Fy {name}', f'Fz {name}'],
-                                  ['[N]', '[N]', '[N]']])
-                F_titled = vstack((F_titles, F_field))
-                CSVs[name].append(F_titled)
+                CSV_F[name] = F_field
 
     if saveCSV:
-        dirname = "CSV_output"
-        try:
-            # Create target Directory
-            mkdir(dirname)
-            print(f"Directory {dirname} created, saving CSV file there")
-        except FileExistsError:
-            print(f"Directory {dirname} already exists, saving CSV file there")
-
-        # prepare CSV data with POS
-        POS_titles = array([['x', 'y', 'z'],
-                            ['[mm]', '[mm]', '[mm]']])
-        POS_titled = vstack((POS_titles, POS))
-        CSV_data = [POS_titled]
-
-        # append other data
-        for arr in list(CSVs.values()):
-            CSV_data.append(hstack(arr))
-
-        # save it
-        header = f'Simulation 1D along z | {datetime.now()}'
-        savetxt(f'CSV_output/{BF}_1D_along_z.csv', hstack(CSV_data), delimiter=';', fmt='%s', header=header)
+        # rows written from the numeric arrays, chunk by chunk
+        with CSVWriter(csv_output(f'{BF}_1D_along_z.csv'), 'Simulation 1D along z', collections.keys(), BF) as writer:
+            writer.write(POS, CSV_B, CSV_F)
 
     if showim:
         show()
@@ -749,7 +723,8 @@ def plot_1D_along_z(x=0, y=0, zs=array([]), collections={}, sample={}, BF='BF',
 
 # functions for plotting 2D
 
-def plot_2D_plane_x(x=0, ys=array([]), zs=array([]), collections={}, sample={}, modes=['stream'], BF='BF', rounding=10, saveCSV=False, showim=False):
+@stage('render')
+def plot_2D_plane_x(x=0, ys=array([]), zs=array([]), collections={}, sample={}, modes=['stream'], BF='BF', rounding=10, saveCSV=False, showim=False, *, grid=False, n_jobs=1, executor=None, output=None, cache=None, axisymmetric=False):
     """
     -----------
     DESCRIPTION
@@ -772,6 +747,16 @@ def plot_2D_plane_x(x=0, ys=array([]), zs=array([]), collections={}, sample={},
     :param rounding: int | decimal places to be left after rounding of final values. 'None' for no rouding.
     :param saveCSV: bool | True for saving a CSV file with the data generated by the function
     :param showim: bool | True to show images after calculation, False to call yourself show() afterwards in the code
+    :param grid: bool | True to get F from B evaluated once on the grid (and one node around it) with numpy.gradient,
+                 instead of 6 auxiliar points around each point
+    :param n_jobs: int | number of worker processes, 1 to calculate in this process, -1 for all the cores
+    :param executor: concurrent.futures.Executor | executor to calculate with, instead of n_jobs
+    :param output: str | file to save positions, B and F in as floats: .npz, .h5 (needs h5py) or .npy directory,
+                   see save_result
+    :param cache: DiskCache | cache to load the results from, or to store them in when they are not there yet
+    :param axisymmetric: bool | False to calculate every point, None to calculate once for each distinct (r, z)
+                         of the points and rotate back when all magnets are Cylinder magnetized along one axis
+                         parallel to z (see compute_line), True to require it. F then differs slightly (about 1e-6 N)
     :return: plots matplotlib graphs. show() needs to be called manually
 
     -------
@@ -823,8 +808,14 @@ def plot_2D_plane_x(x=0, ys=array([]), zs=array([]), collections={}, sample={},
     lenys = len(ys)
     lenzs = len(zs)
 
-    # generate points for B and F calculation, no reshape done yet, raw array
-    POS_raw = array([(x, y, z) for z in zs for y in ys])
+    # calculate B and F of all collections, points being generated by compute_plane, no reshape done yet, raw array
+    result = compute_plane('x', x, ys, zs, collections, sample, BF, grid, axisymmetric=axisymmetric, n_jobs=n_jobs,
+                           executor=executor, cache=cache)
+    POS_raw = result.positions
+
+    # save positions, B and F in a binary file
+    if output is not None:
+        save_result(result, output, collections=collections, sample=sample)
 
     # reshaping and splitting needed for matplotlib.pyplot.streamplot and plot_surface
     POS = POS_raw.reshape(lenys, lenzs, 3)
@@ -834,9 +825,9 @@ def plot_2D_plane_x(x=0, ys=array([]), zs=array([]), collections={}, sample={},
     # pass BF to uppercase to avoid BF='bf' not returning anything
     BF = BF.upper()
 
-    # dictionary to store all the calculated values that will generate the CSV file afterwards
+    # dictionaries of the calculated values that will be written in the CSV file afterwards
     if saveCSV:
-        CSVs = {key:[] for key in collections.keys()}
+        CSV_B, CSV_F = {}, {}
 
     # if user wants plotting of B
     if 'B' in BF:
@@ -844,7 +835,7 @@ def plot_2D_plane_x(x=0, ys=array([]), zs=array([]), collections={}, sample={},
             name, collection = pair
 
             # calculate B in mT, no reshape done yet, raw array
-            B_field_raw = array([collection.getB(pos) for pos in POS_raw])
+            B_field_raw = result.B[name]
 
             # rounding
             if rounding != None:
@@ -913,10 +904,7 @@ def plot_2D_plane_x(x=0, ys=array([]), zs=array([]), collections={}, sample={},
 
             # adding data to CSV
             if saveCSV:
-                B_titles = array([[f'Bx {name}', f'By {name}', f'Bz {name}'],
-                                  ['[mT]', '[mT]', '[mT]']])
-                B_titled = vstack((B_titles, B_field_raw))
-                CSVs[name].append(B_titled)
+                CSV_B[name] = B_field_raw
 
     # if user wants plotting of F
     if 'F' in BF:
@@ -924,7 +912,7 @@ def plot_2D_plane_x(x=0, ys=array([]), zs=array([]), collections={}, sample={},
             name, collection = pair
 
             # calculate F in N, no reshape done yet, raw array
-            F_field_raw = array([getF(pos, collection, sample) for pos in POS_raw])
+            F_field_raw = result.F[name]
 
             # rounding
             if rounding != None:
@@ -993,40 +981,20 @@ def plot_2D_plane_x(x=0, ys=array([]), zs=array([]), collections={}, sample={},
 
             # adding data to CSV
             if saveCSV:
-                F_titles = array([[f'Fx {name}', f'Fy {name}', f'Fz {name}'],
-                                  ['[N]', '[N]', '[N]']])
-                F_titled = vstack((F_titles, F_field_raw))
-                CSVs[name].append(F_titled)
+                CSV_F[name] = F_field_raw
 
     # if user wants to save data in CSV
     if saveCSV:
-        dirname = "CSV_output"
-        try:
-            # Create target Directory
-            mkdir(dirname)
-            print(f"Directory {dirname} created, saving CSV file there")
-        except FileExistsError:
-            print(f"Directory {dirname} already exists, saving CSV file there")
-
-        # prepare CSV data with POS
-        POS_titles = array([['x', 'y', 'z'],
-                            ['[mm]', '[mm]', '[mm]']])
-        POS_titled = vstack((POS_titles, POS_raw))
-        CSV_data = [POS_titled]
-
-        # append other data
-        for arr in list(CSVs.values()):
-            CSV_data.append(hstack(arr))
-
-        # save it
-        header = f'Simulation 2D plane x | {datetime.now()}'
-        savetxt(f'CSV_output/{BF}_2D_plane_x.csv', hstack(CSV_data), delimiter=';', fmt='%s', header=header)
+        # rows written from the numeric arrays, chunk by chunk
+        with CSVWriter(csv_output(f'{BF}_2D_plane_x.csv'), 'Simulation 2D plane x', collections.keys(), BF) as writer:
+            writer.write(POS_raw, CSV_B, CSV_F)
 
     if showim:
         show()
 
 
-def plot_2D_plane_y(xs=array([]), y=0, zs=array([]), collections={}, sample={}, modes=['stream'], BF='BF', rounding=10, saveCSV=False, showim=False):
+@stage('render')
+def plot_2D_plane_y(xs=array([]), y=0, zs=array([]), collections={}, sample={}, modes=['stream'], BF='BF', rounding=10, saveCSV=False, showim=False, *, grid=False, n_jobs=1, executor=None, output=None, cache=None, axisymmetric=False):
     """
     -----------
     DESCRIPTION
@@ -1049,6 +1017,16 @@ def plot_2D_plane_y(xs=array([]), y=0, zs=array([]), collections={}, sample={},
     :param rounding: int | decimal places to be left after rounding of final values. 'None' for no rouding.
     :param saveCSV: bool | True for saving a CSV file with the data generated by the function
     :param showim: bool | True to show images after calculation, False to call yourself show() afterwards in the code
+    :param grid: bool | True to get F from B evaluated once on the grid (and one node around it) with numpy.gradient,
+                 instead of 6 auxiliar points around each point
+    :param n_jobs: int | number of worker processes, 1 to calculate in this process, -1 for all the cores
+    :param executor: concurrent.futures.Executor | executor to calculate with, instead of n_jobs
+    :param output: str | file to save positions, B and F in as floats: .npz, .h5 (needs h5py) or .npy directory,
+                   see save_result
+    :param cache: DiskCache | cache to load the results from, or to store them in when they are not there yet
+    :param axisymmetric: bool | False to calculate every point, None to calculate once for each distinct (r, z)
+                         of the points and rotate back when all magnets are Cylinder magnetized along one axis
+                         parallel to z (see compute_line), True to require it. F then differs slightly (about 1e-6 N)
     :return: plots matplotlib graphs. show() needs to be called manually
 
     -------
@@ -1100,8 +1078,14 @@ def plot_2D_plane_y(xs=array([]), y=0, zs=array([]), collections={}, sample={},
     lenxs = len(xs)
     lenzs = len(zs)
 
-    # generate points for B and F calculation, no reshape done yet, raw array
-    POS_raw = array([(x, y, z) for z in zs for x in xs])
+    # calculate B and F of all collections, points being generated by compute_plane, no reshape done yet, raw array
+    result = compute_plane('y', y, xs, zs, collections, sample, BF, grid, axisymmetric=axisymmetric, n_jobs=n_jobs,
+                           executor=executor, cache=cache)
+    POS_raw = result.positions
+
+    # save positions, B and F in a binary file
+    if output is not None:
+        save_result(result, output, collections=collections, sample=sample)
 
     # reshaping and splitting needed for matplotlib.pyplot.streamplot and plot_surface
     POS = POS_raw.reshape(lenxs, lenzs, 3)
@@ -1111,9 +1095,9 @@ def plot_2D_plane_y(xs=array([]), y=0, zs=array([]), collections={}, sample={},
     # pass BF to uppercase to avoid BF='bf' not returning anything
     BF = BF.upper()
 
-    # dictionary to store all the calculated values that will generate the CSV file afterwards
+    # dictionaries of the calculated values that will be written in the CSV file afterwards
     if saveCSV:
-        CSVs = {key:[] for key in collections.keys()}
+        CSV_B, CSV_F = {}, {}
 
     # if user wants plotting of B
     if 'B' in BF:
@@ -1121,7 +1105,7 @@ def plot_2D_plane_y(xs=array([]), y=0, zs=array([]), collections={}, sample={},
             name, collection = pair
 
             # calculate B in mT, no reshape done yet, raw array
-            B_field_raw = array([collection.getB(pos) for pos in POS_raw])
+            B_field_raw = result.B[name]
 
             # rounding
             if rounding != None:
@@ -1190,10 +1174,7 @@ def plot_2D_plane_y(xs=array([]), y=0, zs=array([]), collections={}, sample={},
 
             # adding data to CSV
             if saveCSV:
-                B_titles = array([[f'Bx {name}', f'By {name}', f'Bz {name}'],
-                                  ['[mT]', '[mT]', '[mT]']])
-                B_titled = vstack((B_titles, B_field_raw))
-                CSVs[name].append(B_titled)
+                CSV_B[name] = B_field_raw
 
     # if user wants plotting of F
     if 'F' in BF:
@@ -1201,7 +1182,7 @@ def plot_2D_plane_y(xs=array([]), y=0, zs=array([]), collections={}, sample={},
             name, collection = pair
 
             # calculate F in N, no reshape done yet, raw array
-            F_field_raw = array([getF(pos, collection, sample) for pos in POS_raw])
+            F_field_raw = result.F[name]
 
             # rounding
             if rounding != None:
@@ -1270,40 +1251,20 @@ def plot_2D_plane_y(xs=array([]), y=0, zs=array([]), collections={}, sample={},
 
             # adding data to CSV
             if saveCSV:
-                F_titles = array([[f'Fx {name}', f'Fy {name}', f'Fz {name}'],
-                                  ['[N]', '[N]', '[N]']])
-                F_titled = vstack((F_titles, F_field_raw))
-                CSVs[name].append(F_titled)
+                CSV_F[name] = F_field_raw
 
     # if user wants to save data in CSV
     if saveCSV:
-        dirname = "CSV_output"
-        try:
-            # Create target Directory
-            mkdir(dirname)
-            print(f"Directory {dirname} created, saving CSV file there")
-        except FileExistsError:
-            print(f"Directory {dirname} already exists, saving CSV file there")
-
-        # prepare CSV data with POS
-        POS_titles = array([['x', 'y', 'z'],
-                            ['[mm]', '[mm]', '[mm]']])
-        POS_titled = vstack((POS_titles, POS_raw))
-        CSV_data = [POS_titled]
-
-        # append other data
-        for arr in list(CSVs.values()):
-            CSV_data.append(hstack(arr))
-
-        # save it
-        header = f'Simulation 2D plane y | {datetime.now()}'
-        savetxt(f'CSV_output/{BF}_2D_plane_y.csv', hstack(CSV_data), delimiter=';', fmt='%s', header=header)
+        # rows written from the numeric arrays, chunk by chunk
+        with CSVWriter(csv_output(f'{BF}_2D_plane_y.csv'), 'Simulation 2D plane y', collections.keys(), BF) as writer:
+            writer.write(POS_raw, CSV_B, CSV_F)
 
     if showim:
         show()
 
 
-def plot_2D_plane_z(xs=array([]), ys=array([]), z=0, collections={}, sample={}, modes=['stream'], BF='BF', rounding=10, saveCSV=False, showim=False):
+@stage('render')
+def plot_2D_plane_z(xs=array([]), ys=array([]), z=0, collections={}, sample={}, modes=['stream'], BF='BF', rounding=10, saveCSV=False, showim=False, *, grid=False, n_jobs=1, executor=None, output=None, cache=None, axisymmetric=False):
     """
     -----------
     DESCRIPTION
@@ -1326,6 +1287,16 @@ def plot_2D_plane_z(xs=array([]), ys=array([]), z=0, collections={}, sample={},
     :param rounding: int | decimal places to be left after rounding of final values. 'None' for no rouding.
     :param saveCSV: bool | True for saving a CSV file with the data generated by the function
     :param showim: bool | True to show images after calculation, False to call yourself show() afterwards in the code
+    :param grid: bool | True to get F from B evaluated once on the grid (and one node around it) with numpy.gradient,
+                 instead of 6 auxiliar points around each point
+    :param n_jobs: int | number of worker processes, 1 to calculate in this process, -1 for all the cores
+    :param executor: concurrent.futures.Executor | executor to calculate with, instead of n_jobs
+    :param output: str | file to save positions, B and F in as floats: .npz, .h5 (needs h5py) or .npy directory,
+                   see save_result
+    :param cache: DiskCache | cache to load the results from, or to store them in when they are not there yet
+    :param axisymmetric: bool | False to calculate every point, None to calculate once for each distinct (r, z)
+                         of the points and rotate back when all magnets are Cylinder magnetized along one axis
+                         parallel to z (see compute_line), True to require it. F then differs slightly (about 1e-6 N)
     :return: plots matplotlib graphs. show() needs to be called manually
 
     -------
@@ -1377,8 +1348,14 @@ def plot_2D_plane_z(xs=array([]), ys=array([]), z=0, collections={}, sample={},
     lenxs = len(xs)
     lenys = len(ys)
 
-    # generate points for B and F calculation, no reshape done yet, raw array
-    POS_raw = array([(x, y, z) for y in ys for x in xs])
+    # calculate B and F of all collections, points being generated by compute_plane, no reshape done yet, raw array
+    result = compute_plane('z', z, xs, ys, collections, sample, BF, grid, axisymmetric=axisymmetric, n_jobs=n_jobs,
+                           executor=executor, cache=cache)
+    POS_raw = result.positions
+
+    # save positions, B and F in a binary file
+    if output is not None:
+        save_result(result, output, collections=collections, sample=sample)
 
     # reshaping and splitting needed for matplotlib.pyplot.streamplot and plot_surface
     POS = POS_raw.reshape(lenxs, lenys, 3)
@@ -1388,9 +1365,9 @@ def plot_2D_plane_z(xs=array([]), ys=array([]), z=0, collections={}, sample={},
     # pass BF to uppercase to avoid BF='bf' not returning anything
     BF = BF.upper()
 
-    # dictionary to store all the calculated values that will generate the CSV file afterwards
+    # dictionaries of the calculated values that will be written in the CSV file afterwards
     if saveCSV:
-        CSVs = {key:[] for key in collections.keys()}
+        CSV_B, CSV_F = {}, {}
 
     # if user wants plotting of B
     if 'B' in BF:
@@ -1398,7 +1375,7 @@ def plot_2D_plane_z(xs=array([]), ys=array([]), z=0, collections={}, sample={},
             name, collection = pair
 
             # calculate B in mT, no reshape done yet, raw array
-            B_field_raw = array([collection.getB(pos) for pos in POS_raw])
+            B_field_raw = result.B[name]
 
             # rounding
             if rounding != None:
@@ -1467,10 +1444,7 @@ def plot_2D_plane_z(xs=array([]), ys=array([]), z=0, collections={}, sample={},
 
             # adding data to CSV
             if saveCSV:
-                B_titles = array([[f'Bx {name}', f'By {name}', f'Bz {name}'],
-                                  ['[mT]', '[mT]', '[mT]']])
-                B_titled = vstack((B_titles, B_field_raw))
-                CSVs[name].append(B_titled)
+                CSV_B[name] = B_field_raw
 
     # if user wants plotting of F
     if 'F' in BF:
@@ -1478,7 +1452,7 @@ def plot_2D_plane_z(xs=array([]), ys=array([]), z=0, collections={}, sample={},
             name, collection = pair
 
             # calculate F in N, no reshape done yet, raw array
-            F_field_raw = array([getF(pos, collection, sample) for pos in POS_raw])
+            F_field_raw = result.F[name]
 
             # rounding
             if rounding != None:
@@ -1547,34 +1521,13 @@ def plot_2D_plane_z(xs=array([]), ys=array([]), z=0, collections={}, sample={},
 
             # adding data to CSV
             if saveCSV:
-                F_titles = array([[f'Fx {name}', f'Fy {name}', f'Fz {name}'],
-                                  ['[N]', '[N]', '[N]']])
-                F_titled = vstack((F_titles, F_field_raw))
-                CSVs[name].append(F_titled)
+                CSV_F[name] = F_field_raw
 
     # if user wants to save data in CSV
     if saveCSV:
-        dirname = "CSV_output"
-        try:
-            # Create target Directory
-            mkdir(dirname)
-            print(f"Directory {dirname} created, saving CSV file there")
-        except FileExistsError:
-            print(f"Directory {dirname} already exists, saving CSV file there")
-
-        # prepare CSV data with POS
-        POS_titles = array([['x', 'y', 'z'],
-                            ['[mm]', '[mm]', '[mm]']])
-        POS_titled = vstack((POS_titles, POS_raw))
-        CSV_data = [POS_titled]
-
-        # append other data
-        for arr in list(CSVs.values()):
-            CSV_data.append(hstack(arr))
-
-        # save it
-        header = f'Simulation 2D plane z | {datetime.now()}'
-        savetxt(f'CSV_output/{BF}_2D_plane_z.csv', hstack(CSV_data), delimiter=';', fmt='%s', header=header)
+        # rows written from the numeric arrays, chunk by chunk
+        with CSVWriter(csv_output(f'{BF}_2D_plane_z.csv'), 'Simulation 2D plane z', collections.keys(), BF) as writer:
+            writer.write(POS_raw, CSV_B, CSV_F)
 
     if showim:
         show()
@@ -1582,7 +1535,8 @@ def plot_2D_plane_z(xs=array([]), ys=array([]), z=0, collections={}, sample={},
 
 # functions for plotting 3D
 
-def plot_3D(xs=array([]), ys=array([]), zs=array([]), collections={}, sample={}, BF='BF', saveCSV=False, showim=False):
+@stage('render')
+def plot_3D(xs=array([]), ys=array([]), zs=array([]), collections={}, sample={}, BF='BF', saveCSV=False, showim=False, *, grid=False, n_jobs=1, executor=None, output=None, cache=None, axisymmetric=False):
     """
     -----------
     DESCRIPTION
@@ -1600,8 +1554,19 @@ def plot_3D(xs=array([]), ys=array([]), zs=array([]), collections={}, sample={},
     :param collections: dict | the magnets setup to be studied arranged like {'name':magpylib.Collection}
     :param sample: dict | keys 'demagnetizing_factor' [], 'volume' [m3] and 'M_saturation' [A/m]
     :param BF: str | 'B' to plot Bx, By, Bz; 'F' to plot Fx, Fy, Fz; 'BF' for all
-    :param saveCSV: bool | True for saving a CSV file with the data generated by the function
+    :param saveCSV: bool | True for saving a CSV file with the data generated by the function, written chunk by chunk
+                    while calculating unless grid or cache is used
     :param showim: bool | True to show images after calculation, False to call yourself show() afterwards in the code
+    :param grid: bool | True to get F from B evaluated once on the grid (and one node around it) with numpy.gradient,
+                 instead of 6 auxiliar points around each point
+    :param n_jobs: int | number of worker processes, 1 to calculate in this process, -1 for all the cores
+    :param executor: concurrent.futures.Executor | executor to calculate with, instead of n_jobs
+    :param output: str | file to save positions, B and F in as floats: .npz, .h5 (needs h5py) or .npy directory,
+                   see save_result
+    :param cache: DiskCache | cache to load the results from, or to store them in when they are not there yet
+    :param axisymmetric: bool | False to calculate every point, None to calculate once for each distinct (r, z)
+                         of the points and rotate back when all magnets are Cylinder magnetized along one axis
+                         parallel to z (see compute_line), True to require it. F then differs slightly (about 1e-6 N)
     :return: plots matplotlib graphs. show() needs to be called manually
 
     -------
@@ -1656,12 +1621,23 @@ def plot_3D(xs=array([]), ys=array([]), zs=array([]), collections={}, sample={},
     # pass BF to uppercase to avoid BF='bf' not returning anything
     BF = BF.upper()
 
-    # dictionary to store all the calculated values that will generate the CSV file afterwards
+    # dictionaries of the calculated values that will be written in the CSV file afterwards
     if saveCSV:
-        CSVs = {key:[] for key in collections.keys()}
-
-    # generate points for B and F calculation, no reshape done yet, raw array
-    POS_raw = array([(x, y, z) for x in xs for y in ys for z in zs])
+        CSV_B, CSV_F = {}, {}
+
+    # calculate B and F of all collections, points being generated by compute_volume, no reshape done yet, raw array
+    # with the CSV file written chunk by chunk as they are calculated, when they are not taken from a cache or grid
+    streamed = saveCSV and not grid and cache is None
+    if streamed:
+        result = _volume_to_CSV(xs, ys, zs, collections, sample, BF, axisymmetric, n_jobs, executor)
+    else:
+        result = compute_volume(xs, ys, zs, collections, sample, BF, grid, axisymmetric=axisymmetric, n_jobs=n_jobs,
+                                executor=executor, cache=cache)
+    POS_raw = result.positions
+
+    # save positions, B and F in a binary file
+    if output is not None:
+        save_result(result, output, collections=collections, sample=sample)
 
     # reshaping and splitting needed for matplotlib 3D
     POS = POS_raw.reshape(lenx, leny, lenz, 3)
@@ -1677,7 +1653,7 @@ def plot_3D(xs=array([]), ys=array([]), zs=array([]), collections={}, sample={},
             name, collection = pair
 
             # calculate B in mT, no reshape done yet, raw array
-            B_field_raw = array([collection.getB(pos) for pos in POS_raw])
+            B_field_raw = result.B[name]
 
             # reshaping and splitting needed for matplotlib 3D
             B_field = B_field_raw.reshape(lenx, leny, lenz, 3)
@@ -1692,17 +1668,14 @@ def plot_3D(xs=array([]), ys=array([]), zs=array([]), collections={}, sample={},
 
             # adding data to CSV
             if saveCSV:
-                B_titles = array([[f'Bx {name}', f'By {name}', f'Bz {name}'],
-                                  ['[mT]', '[mT]', '[mT]']])
-                B_titled = vstack((B_titles, B_field_raw))
-                CSVs[name].append(B_titled)
+                CSV_B[name] = B_field_raw
 
     if 'F' in BF:
         for i, pair in enumerate(collections.items()):
             name, collection = pair
 
             # calculate F in N, no reshape done yet, raw array
-            F_field_raw = array([getF(pos, collection, sample) for pos in POS_raw])
+            F_field_raw = result.F[name]
 
             # reshaping and splitting needed for matplotlib 3D
             F_field = F_field_raw.reshape(lenx, leny, lenz, 3)
@@ -1717,34 +1690,39 @@ def plot_3D(xs=array([]), ys=array([]), zs=array([]), collections={}, sample={},
 
             # adding data to CSV
             if saveCSV:
-                F_titles = array([[f'Fx {name}', f'Fy {name}', f'Fz {name}'],
-                                  ['[N]', '[N]', '[N]']])
-                F_titled = vstack((F_titles, F_field_raw))
-                CSVs[name].append(F_titled)
+                CSV_F[name] = F_field_raw
 
-    # if user wants to save data in CSV
-    if saveCSV:
-        dirname = "CSV_output"
-        try:
-            # Create target Directory
-            mkdir(dirname)
-            print(f"Directory {dirname} created, saving CSV file there")
-        except FileExistsError:
-            print(f"Directory {dirname} already exists, saving CSV file there")
-
-        # prepare CSV data with POS
-        POS_titles = array([['x', 'y', 'z'],
-                            ['[mm]', '[mm]', '[mm]']])
-        POS_titled = vstack((POS_titles, POS_raw))
-        CSV_data = [POS_titled]
-
-        # append other data
-        for arr in list(CSVs.values()):
-            CSV_data.append(hstack(arr))
-
-        # save it
-        header = f'Simulation 3D | {datetime.now()}'
-        savetxt(f'CSV_output/{BF}_3D.csv', hstack(CSV_data), delimiter=';', fmt='%s', header=header)
+    # if user wants to save data in CSV, when not written while calculating
+    if saveCSV and not streamed:
+        # rows written from the numeric arrays, chunk by chunk
+        with CSVWriter(csv_output(f'{BF}_3D.csv'), 'Simulation 3D', collections.keys(), BF) as writer:
+            writer.write(POS_raw, CSV_B, CSV_F)
 
     if showim:
         show()
+
+
+def _volume_to_CSV(xs, ys, zs, collections, sample, BF, axisymmetric, n_jobs, executor):
+    """
+    compute_volume evaluated with compute_volume_chunks, each block being appended to the CSV file of plot_3D
+    as soon as it is calculated, so that an interrupted run leaves the rows calculated so far
+
+    :return: FieldResult
+    """
+    blocks = []
+    with CSVWriter(csv_output(f'{BF}_3D.csv'), 'Simulation 3D', collections.keys(), BF) as writer:
+        for positions, B, F in compute_volume_chunks(xs, ys, zs, collections, sample, BF, axisymmetric=axisymmetric,
+                                                     n_jobs=n_jobs, executor=executor):
+            writer.write(positions, B, F)
+            blocks.append((positions, B, F))
+
+    def gather(index, names):
+        return {name: concatenate([zeros((0, 3))] + [block[index][name] for block in blocks]) for name in names}
+
+    positions = concatenate([zeros((0, 3))] + [block[0] for block in blocks])
+    B = gather(1, collections.keys() if 'B' in BF else [])
+    F = gather(2, collections.keys() if 'F' in BF else [])
+    axes = {axis: asarray(values, dtype=float64).ravel() for axis, values in zip('xyz', (xs, ys, zs))}
+
+    return FieldResult('volume', None, axes, (len(xs), len(ys), len(zs)), positions, B, F)
+
@@ -0,0 +1,151 @@
+from contextlib import contextmanager
+from time import perf_counter
+
+
+# Stats of the profile in use, set by its with statement, None when profiling is off
+_active = None
+
+# stages in the order of a run, for the report
+_STAGES = ['points', 'B', 'F', 'BF', 'compute', 'render', 'export']
+
+
+class Stats:
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Counters and timers of a profile: number of evaluations of a source field (getB, or its jacobian and field
+    with gradient='analytic') and of points evaluated, time spent in those evaluations, and time of each stage of a run
+    stages are 'points' (point generation), 'B', 'F' ('BF' when both run together on worker processes),
+    'compute' (the rest of the compute functions), 'render' (matplotlib) and 'export' (CSV and binary files),
+    each time excluding the stages run inside it
+
+    ----------
+    ATTRIBUTES
+    ----------
+
+    :attr calls: int | number of evaluations of the field of a source, or of its jacobian and field
+    :attr points: int | number of points of those evaluations
+    :attr evaluation: float | time of those evaluations [s]
+    :attr times: dict | {'stage': time [s]}
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.points = 0
+        self.evaluation = 0.
+        self.times = {}
+
+        self._running = []
+        self._evaluating = False
+
+    @property
+    def points_per_second(self):
+        """
+        Points evaluated per second of evaluation, 0 when there were none
+        """
+        return self.points / self.evaluation if self.evaluation else 0.
+
+    def evaluate(self, function, POS, source):
+        """
+        Counts and times the evaluation function(POS, source) of the field of a source on (N,3) points POS,
+        or of its jacobian and field, the field evaluated by a jacobian being counted with it
+        """
+        if self._evaluating:
+            return function(POS, source)
+
+        self._evaluating = True
+        start = perf_counter()
+        try:
+            result = function(POS, source)
+        finally:
+            self._evaluating = False
+        self.evaluation += perf_counter() - start
+        self.calls += 1
+        self.points += len(POS)
+
+        return result
+
+    def report(self):
+        """
+        Summary of the counters and timers, one line each
+
+        :return: str
+        """
+        lines = [f'source evaluations: {self.calls}',
+                 f'points evaluated: {self.points}',
+                 f'evaluation: {self.evaluation:.6f} s, {self.points_per_second:.0f} points/s']
+        for name in sorted(self.times, key=lambda name: _STAGES.index(name) if name in _STAGES else len(_STAGES)):
+            lines.append(f'{name}: {self.times[name]:.6f} s')
+
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return self.report()
+
+
+@contextmanager
+def profile():
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Turns instrumentation on inside a with statement and gives its Stats: counts the evaluations of source fields
+    and the points evaluated, times them, and times each stage of the compute and plot functions
+    Outside of it, instrumentation costs one test per evaluation
+    Only evaluations of this process are counted, not those of worker processes of n_jobs
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import linspace, pi
+        >>> from magpylib.source.magnet import Cylinder
+        >>> from magpylib import Collection
+        >>> from magforce import compute_volume
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # B and F on a volume of 1000 points, each of the 2 magnets being evaluated on the points then around them
+        >>> m1 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, -20])
+        >>> m2 = Cylinder(mag=[0, 0, 1300], dim=[10, 20], pos=[0, 0, 20])
+        >>> with profile() as stats:
+        ...     result = compute_volume(*[linspace(-5, 5, 10)] * 3, {'both': Collection(m1, m2)}, sample,
+        ...                             axisymmetric=False)
+        >>> stats.calls, stats.points, sorted(stats.times)
+        (4, 14000, ['B', 'F', 'compute', 'points'])
+    """
+    global _active
+
+    previous, _active = _active, Stats()
+    try:
+        yield _active
+    finally:
+        _active = previous
+
+
+@contextmanager
+def stage(name):
+    """
+    Times what runs inside it as stage name of the active profile, without the stages run inside it
+    usable as a decorator
+    """
+    stats = _active
+    if stats is None:
+        yield
+        return
+
+    stats._running.append(0.)                       # time of the stages run inside
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = perf_counter() - start
+        inner = stats._running.pop()
+        stats.times[name] = stats.times.get(name, 0.) + elapsed - inner
+        if stats._running:
+            stats._running[-1] += elapsed
@@ -0,0 +1,256 @@
+from numpy import asarray, einsum, float64
+from magpylib.source import magnet, moment, current
+
+from magforce.kernels import rotation_matrix, dipole_B, gradB_dipole, sphere_B, gradB_sphere, loop_B, gradB_loop, \
+    coil_B, gradB_coil
+
+
+class _Vectorized:
+    """
+    getB and gradB of a magforce source on arrays of points, from its field and jacobian in its own coordinate system
+    given by _field and _gradient (which is given the field too), the source being moved and rotated
+    like any magpylib source
+    """
+
+    def _local(self, points):
+        """
+        (N,3) points in the coordinate system of the source, and the rotation matrix from it to the global one
+        """
+        R = rotation_matrix(self.angle, self.axis)
+        POS = asarray(points, dtype=float64).reshape(-1, 3)
+
+        return (POS - self.position) @ R, R
+
+    def getB(self, pos):
+        """
+        Gets the magnetic field of the source on points
+
+        :param pos: numpy.array (3) or (N,3) [mm]
+        :return: numpy.array (3) or (N,3) [mT]
+        """
+        POS_local, R = self._local(pos)
+        B = self._field(POS_local)
+
+        if self.angle != 0:
+            B = B @ R.T                        # back to the global coordinate system
+
+        return B.reshape(asarray(pos).shape)
+
+    def gradB(self, points):
+        """
+        Gets the jacobian of the magnetic field of the source on N points, together with the field, like gradB_batch
+
+        :param points: numpy.array (N,3) [mm]
+        :return: tuple | (N,3,3) array of jacobians [mT/mm] and (N,3) array of B [mT]
+        """
+        POS_local, R = self._local(points)
+        B = self._field(POS_local)
+        dd = self._gradient(POS_local, B)
+
+        if self.angle != 0:
+            dd, B = einsum('ia,nab,jb->nij', R, dd, R), B @ R.T
+
+        return dd, B
+
+
+class Dipole(_Vectorized, moment.Dipole):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Magnetic dipole, a magpylib Dipole (same parameters, accepted in a magpylib Collection, moved and rotated the same)
+    with B and its jacobian in closed form, vectorized on arrays of points
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param moment: numpy.array | magnetic moment, as mu0 * moment like magpylib [mT*mm3]
+    :param pos: numpy.array | position [mm]
+    :param angle: float | rotation angle [deg]
+    :param axis: numpy.array | rotation axis
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import array, pi
+        >>> from magpylib import Collection
+        >>> from magforce import getF_batch
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # two dipoles facing each other, and F between them
+        >>> dipoles = Collection(Dipole(moment=[0, 0, 1e6], pos=[0, 0, -20]), Dipole(moment=[0, 0, 1e6], pos=[0, 0, 20]))
+        >>> getF_batch(array([(0, 0, 1), (0, 0, -1)]), dipoles, sample, gradient='analytic').round(5)
+        array([[ 0.     ,  0.     ,  0.03124],
+               [ 0.     ,  0.     , -0.03124]])
+    """
+
+    def _field(self, POS):
+        return dipole_B(POS, self.moment)
+
+    def _gradient(self, POS, B):
+        return gradB_dipole(POS, self.moment)
+
+
+class Sphere(_Vectorized, magnet.Sphere):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Homogeneously magnetized sphere, a magpylib Sphere (same parameters, accepted in a magpylib Collection,
+    moved and rotated the same) with B and its jacobian in closed form, vectorized on arrays of points:
+    the field of its dipole outside of it and a uniform field inside
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param mag: numpy.array | magnetization [mT]
+    :param dim: float | diameter [mm]
+    :param pos: numpy.array | position [mm]
+    :param angle: float | rotation angle [deg]
+    :param axis: numpy.array | rotation axis
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import array
+
+    # field inside and outside of the sphere, and its jacobian outside
+        >>> sphere = Sphere(mag=[0, 0, 1000], dim=4, pos=[0, 0, -10])
+        >>> sphere.getB(array([(0, 0, -9), (0, 0, 0)])).round(5)
+        array([[  0.     ,   0.     , 666.66667],
+               [  0.     ,   0.     ,   5.33333]])
+        >>> dd, B = sphere.gradB(array([(0, 0, 0)]))
+        >>> dd.round(5)
+        array([[[ 0.8,  0. ,  0. ],
+                [ 0. ,  0.8,  0. ],
+                [ 0. ,  0. , -1.6]]])
+    """
+
+    def _field(self, POS):
+        return sphere_B(POS, self.magnetization, self.dimension)
+
+    def _gradient(self, POS, B):
+        return gradB_sphere(POS, self.magnetization, self.dimension)
+
+
+class Circular(_Vectorized, current.Circular):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Circular current loop, a magpylib Circular (same parameters, accepted in a magpylib Collection,
+    moved and rotated the same) with B and its jacobian in closed form from complete elliptic integrals,
+    vectorized on arrays of points
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param curr: float | current, positive counterclockwise around the loop axis [A]
+    :param dim: float | diameter [mm]
+    :param pos: numpy.array | position of the center [mm]
+    :param angle: float | rotation angle [deg]
+    :param axis: numpy.array | rotation axis, the loop being in the plane z = 0 before rotation
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import array, pi
+        >>> from magforce import getF
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # a loop of 1000 A, its field at its center and the force on its axis
+        >>> loop = Circular(curr=1000, dim=10)
+        >>> loop.getB((0, 0, 0)).round(5)
+        array([  0.     ,   0.     , 125.66371])
+        >>> getF((0, 0, 3), loop, sample, gradient='analytic')
+        array([ 0.        ,  0.        , -1.06352222])
+    """
+
+    def _field(self, POS):
+        return loop_B(POS, self.current, self.dimension)
+
+    def _gradient(self, POS, B):
+        return gradB_loop(POS, self.current, self.dimension)
+
+
+class Coil(_Vectorized, current.Circular):
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Coil (thick solenoid) of turns turns of current curr wound uniformly between an inner and an outer radius
+    over a length along its axis, centered on pos. It is a magpylib Circular of its mean diameter, accepted
+    in a magpylib Collection, moved and rotated the same and displayed as that loop, with B and its jacobian
+    from the current sheets it is made of, in closed form with elliptic integrals, integrated over their radius
+    (kernels.coil_B and gradB_coil), vectorized on arrays of points
+    inner equal to outer gives a single layer solenoid
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param curr: float | current in each turn, positive counterclockwise around the coil axis [A]
+    :param turns: float | number of turns
+    :param inner: float | inner radius of the winding [mm]
+    :param outer: float | outer radius of the winding [mm]
+    :param length: float | length of the winding along its axis [mm]
+    :param pos: numpy.array | position of the center [mm]
+    :param angle: float | rotation angle [deg]
+    :param axis: numpy.array | rotation axis, the coil axis being along z before rotation
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import array, pi
+        >>> from magforce import getF
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # a long coil has the field mu0 * turns * curr / length at its center, 62.83 mT here
+        >>> coil = Coil(curr=10, turns=1000, inner=5, outer=6, length=200)
+        >>> coil.getB((0, 0, 0)).round(2)
+        array([ 0.  ,  0.  , 62.74])
+
+    # a short coil and the force on its axis
+        >>> coil = Coil(curr=10, turns=500, inner=5, outer=15, length=10)
+        >>> getF((0, 0, 8), coil, sample, gradient='analytic')
+        array([ 0.        ,  0.        , -2.11915956])
+    """
+
+    def __init__(self, curr=0., turns=1, inner=0., outer=0., length=1., pos=(0., 0., 0.), angle=0., axis=(0., 0., 1.)):
+        if not 0 <= inner <= outer:
+            raise ValueError(f'inner and outer radii must satisfy 0 <= inner <= outer, got {inner} and {outer}')
+        if length <= 0:
+            raise ValueError(f'length must be positive, got {length}')
+
+        current.Circular.__init__(self, curr=curr, dim=inner + outer, pos=pos, angle=angle, axis=axis)
+        self.turns = float(turns)
+        self.inner = float(inner)
+        self.outer = float(outer)
+        self.length = float(length)
+
+    def _field(self, POS):
+        return coil_B(POS, self.current, self.turns, self.inner, self.outer, self.length)
+
+    def _gradient(self, POS, B):
+        return gradB_coil(POS, self.current, self.turns, self.inner, self.outer, self.length, B)
@@ -0,0 +1,238 @@
+from collections import OrderedDict
+
+from numpy import array, asarray, zeros, ones, arange, einsum, linalg, float64
+from magpylib.source.magnet import Box, Cylinder, Sphere
+
+from magforce.kernels import cluster_B, gradB_cluster
+from magforce.memo import _version
+from magforce.multipole import _moment, _radius, _weight
+
+
+# SourceTree in use, set by its with statement
+_active = None
+
+
+class _Node:
+    """
+    Group of magnets of a SourceTree: center [mm], radius of the sphere around them [mm], total moment [mT*mm3],
+    first [mT*mm4] and second [mT*mm5] moments around the center, with its two halves or its single magnet
+    """
+
+    def __init__(self, magnets, positions, moments, radii):
+        self.center = (positions.min(axis=0) + positions.max(axis=0)) / 2
+        self.size = (linalg.norm(positions - self.center, axis=1) + radii).max()
+        self.moment = moments.sum(axis=0)
+        self.first = einsum('kl,kj->lj', positions - self.center, moments)
+        self.second = einsum('kl,kn,kj->lnj', positions - self.center, positions - self.center, moments)
+
+        if len(magnets) == 1:
+            self.magnet = magnets[0]
+            self.children = []
+        else:
+            # halves along the largest extent of the positions
+            axis = (positions.max(axis=0) - positions.min(axis=0)).argmax()
+            order = positions[:, axis].argsort()
+            halves = order[:len(order) // 2], order[len(order) // 2:]
+
+            self.magnet = None
+            self.children = [_Node([magnets[k] for k in half], positions[half], moments[half], radii[half])
+                             for half in halves]
+
+
+class SourceTree:
+    """
+    -----------
+    DESCRIPTION
+    -----------
+
+    Barnes-Hut tree over the Box, Cylinder and Sphere magnets of a collection, used by all the functions of magforce
+    evaluating B and its jacobian (getB_batch, gradB_batch and everything built on them, getF included)
+    inside a with statement, for collections of hundreds of magnets
+
+    Magnets are split in halves recursively along their largest extent. Seen from a point farther than size / theta
+    from its center, size being the radius of the sphere around its magnets, a group is replaced by the expansion
+    of its dipoles to the second order in their distance to the center (kernels.cluster_B): the cost per point
+    grows as the logarithm of the number of magnets, the error of the field of a group as theta ** 3
+    Nearer groups are opened down to single magnets, evaluated exactly (or by a FarField when there is one)
+    Expansion and opened group are blended smoothly over a shell of a quarter of size / theta, as in FarField,
+    so that numeric jacobians stay continuous. Other sources are always evaluated exactly
+
+    Trees are built once for each state of the magnets of a collection. Like FieldMemo and FarField,
+    the tree belongs to the process using it: worker processes of n_jobs do not use it
+
+    ----------
+    PARAMETERS
+    ----------
+
+    :param theta: float | opening angle, size of a group over distance beyond which it is not opened
+
+    ----------
+    ATTRIBUTES
+    ----------
+
+    :attr exact: int | number of evaluations of single magnets on a point (blended ones included)
+    :attr approximate: int | number of evaluations of groups on a point by their expansion (blended ones included)
+
+    -------
+    EXAMPLE
+    -------
+
+    # imports
+        >>> from numpy import array, pi
+        >>> from magpylib.source.magnet import Box
+        >>> from magpylib import Collection
+        >>> from magforce import getF_batch
+
+    # sample Definition
+        >>> sample = {'demagnetizing_factor': 1/3, 'volume': 4 / 3 * pi * (4 / 1000) ** 3, 'M_saturation': 1.400e6}
+
+    # a 16 x 16 matrix of 2 mm cubes with alternating magnetizations, and points above it
+        >>> matrix = Collection(*[Box(mag=[0, 0, 1000 * (-1) ** (i + j)], dim=[2, 2, 2], pos=[3 * i, 3 * j, 0])
+        ...                       for i in range(16) for j in range(16)])
+        >>> points = array([(10.5, 11.5, 3), (22.5, 40.5, 4), (30.5, 20.5, 6)])
+        >>> exact = getF_batch(points, matrix, sample, gradient='analytic')
+        >>> with SourceTree(theta=0.3) as tree:
+        ...     approximate = getF_batch(points, matrix, sample, gradient='analytic')
+
+    # most of the magnets seen through groups, for an error small against the forces
+        >>> tree.exact < tree.approximate
+        True
+        >>> bool(abs(approximate - exact).max() < 1e-3 * abs(exact).max())
+        True
+    """
+
+    def __init__(self, theta=0.3):
+        if theta <= 0:
+            raise ValueError(f'theta must be positive, got {theta}')
+
+        self.theta = theta
+        self.exact = 0
+        self.approximate = 0
+
+        self._trees = OrderedDict()
+        self._previous = []
+
+    def __enter__(self):
+        global _active
+        self._previous.append(_active)
+        _active = self
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = self._previous.pop()
+
+    def tree(self, magnets):
+        """
+        Root of the tree of a list of Box, Cylinder and Sphere magnets, built once for each state of the magnets
+        the last 16 trees being kept
+
+        :return: _Node
+        """
+        key = tuple(_version(magnet) for magnet in magnets)
+
+        if key in self._trees:
+            self._trees.move_to_end(key)
+        else:
+            positions = array([magnet.position for magnet in magnets], dtype=float64)
+            moments = array([_moment(magnet) for magnet in magnets])
+            radii = array([_radius(magnet) for magnet in magnets])
+
+            self._trees[key] = _Node(magnets, positions, moments, radii)
+            while len(self._trees) > 16:
+                self._trees.popitem(last=False)
+
+        return self._trees[key]
+
+    def getB(self, POS, sources, evaluate):
+        """
+        Field of sources on (N,3) points POS, each single source being evaluated with evaluate(POS, source)
+
+        :return: numpy.array (N,3) [mT]
+        """
+        B = zeros((len(POS), 3))
+
+        magnets = [source for source in sources if isinstance(source, (Box, Cylinder, Sphere))]
+        for source in sources:
+            if len(magnets) < 2 or not isinstance(source, (Box, Cylinder, Sphere)):
+                B += evaluate(POS, source)
+
+        if len(magnets) >= 2:
+            self._getB(self.tree(magnets), POS, arange(len(POS)), ones(len(POS)), B, evaluate)
+
+        return B
+
+    def _getB(self, node, POS, index, w, B, evaluate):
+        """
+        Adds w times the field of the magnets of node on the points POS[index] to B[index]
+        """
+        if node.magnet is not None:
+            self.exact += len(index)
+            B[index] += w[:, None] * evaluate(POS[index], node.magnet)
+            return
+
+        s, _ = _weight(POS[index], node.center, node.size / self.theta)
+        far, near = s > 0, s < 1
+
+        if far.any():
+            self.approximate += int(far.sum())
+            D = POS[index[far]] - node.center
+            B[index[far]] += (w * s)[far, None] * cluster_B(D, node.moment, node.first, node.second)
+
+        if near.any():
+            for child in node.children:
+                self._getB(child, POS, index[near], (w * (1 - s))[near], B, evaluate)
+
+    def gradB(self, POS, sources, evaluate):
+        """
+        Jacobian and field of sources on (N,3) points POS, each single source being evaluated
+        with evaluate(POS, source)
+
+        :return: tuple | numpy.array (N,3,3) [mT/mm] and numpy.array (N,3) [mT]
+        """
+        dd = zeros((len(POS), 3, 3))
+        B = zeros((len(POS), 3))
+
+        magnets = [source for source in sources if isinstance(source, (Box, Cylinder, Sphere))]
+        for source in sources:
+            if len(magnets) < 2 or not isinstance(source, (Box, Cylinder, Sphere)):
+                dd_source, B_source = evaluate(POS, source)
+                dd += dd_source
+                B += B_source
+
+        if len(magnets) >= 2:
+            self._gradB(self.tree(magnets), POS, arange(len(POS)), ones(len(POS)), zeros((len(POS), 3)), dd, B,
+                        evaluate)
+
+        return dd, B
+
+    def _gradB(self, node, POS, index, w, grad_w, dd, B, evaluate):
+        """
+        Adds w times the field of the magnets of node on the points POS[index] to B[index] and its jacobian,
+        with the gradient grad_w of w, to dd[index]
+        """
+        if node.magnet is not None:
+            self.exact += len(index)
+            dd_node, B_node = evaluate(POS[index], node.magnet)
+        else:
+            s, grad_s = _weight(POS[index], node.center, node.size / self.theta)
+            far, near = s > 0, s < 1
+
+            dd_node, B_node = zeros((len(index), 3, 3)), zeros((len(index), 3))
+            if far.any():
+                self.approximate += int(far.sum())
+                D = POS[index[far]] - node.center
+                dd_node[far] = gradB_cluster(D, node.moment, node.first, node.second)
+                B_node[far] = cluster_B(D, node.moment, node.first, node.second)
+
+            # opened group, weighted by 1 - s
+            if near.any():
+                for child in node.children:
+                    self._gradB(child, POS, index[near], (w * (1 - s))[near],
+                                (grad_w * (1 - s)[:, None] - w[:, None] * grad_s)[near], dd, B, evaluate)
+
+            # expansion, weighted by s
+            w, grad_w = w * s, grad_w * s[:, None] + w[:, None] * grad_s
+
+        B[index] += w[:, None] * B_node
+        dd[index] += w[:, None, None] * dd_node + B_node[:, :, None] * grad_w[:, None, :]